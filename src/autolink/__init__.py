@@ -1,4 +1,5 @@
 from .tag_index import TagIndex
+from .query import query_index
 
 from .autolink import (
     get_tags_from_headers,
@@ -6,17 +7,28 @@ from .autolink import (
     get_origin,
     initialize_tagging,
     update_tags_on_file,
+    update_tags_on_files,
     rename_tag,
+    rename_tags,
+    convert_index,
+    collect_garbage,
+    watch_directory,
     terminal_operation,
 )
 
 __all__ = [
     "TagIndex",
+    "query_index",
     "get_tags_from_headers",
     "get_tags_from_comment",
     "get_origin",
     "initialize_tagging",
     "update_tags_on_file",
+    "update_tags_on_files",
     "rename_tag",
+    "rename_tags",
+    "convert_index",
+    "collect_garbage",
+    "watch_directory",
     "terminal_operation",
 ]
@@ -2,11 +2,29 @@ import os
 import sys
 import re
 import argparse
-from .tag_index import TagIndex
-
+import csv
+import hashlib
+from .tag_index import TagIndex, content_hash, file_fingerprint, find_reference_names
+from .cache import Document, documents
+from .instrument import Laps, count, count_read, count_write, instrumented, timed
+from .lexer import COMMENT, DEFINITION, HEADER, REFERENCE, TEXT, WIKILINK
+from .lexer import PieceLexer, comment_tags
+from .lexer import extract_tags, tokenize
+from .linker import Linker, get_linker, trie_pattern
+from .query import QUESTIONS, format_result, query_index
+from .sections import SectionMap, tag_scanner
+from .stream import StreamWriter, align_pieces, is_large_file, read_pieces
+from .stream import lstrip_pieces, rstrip_pieces, write_atomic
+from .vault import find_vault_root, relative_link, vault_path, walk_vault
+from .watch import DirectoryWatch
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
 from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
 
-from typing import Callable, Iterable, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 
 #! DEPRECATED, maybe useful... for future functionality
@@ -17,17 +35,11 @@ def get_tags_from_name(path: str) -> set[str]:
     Filenames are split by '_' and returned as lowercase tags.
     """
     tags = set()
-    for name in os.listdir(path):
-        item_path = os.path.join(path, name)
-        if (
-            os.path.isfile(item_path)
-            and os.path.splitext(item_path)[1].lower() == ".md"
-            and not item_path.endswith("linklist.md")
-        ):
-            text = os.path.splitext(name)[0].lower()
-            words = text.split("_")
-            for word in words:
-                tags.add(word)
+    for rel_path in walk_vault(path):
+        text = os.path.splitext(os.path.basename(rel_path))[0].lower()
+        words = text.split("_")
+        for word in words:
+            tags.add(word)
     return tags
 
 
@@ -35,10 +47,9 @@ def get_tags_from_headers(text: str) -> set[str]:
     """
     reads markdown formatted string and extracts tags from headers (#, ##, ###, …).
     The header text is converted to lowercase and returned as a set.
+    Headers inside code are skipped.
     """
-    return {
-        "".join(tag.split("# ")[1:]) for tag in re.findall(r"(?<!\S| )#{1,6} .+", text)
-    }
+    return _tags_from_tokens(text, (HEADER,))
 
 
 # ! not quite the intended Behavior, unused for now
@@ -53,9 +64,9 @@ def get_tags_from_bold(text: str) -> set[str]:
 def get_tags_from_wikilinks(text: str) -> set[str]:
     """
     reads markdown formatted string and extracts tags text formatted like wikilinks: [[tag]].
-    The text returned as a set.
+    The text returned as a set. Wikilinks inside code are skipped.
     """
-    return {tag for tag in re.findall(r"(?<=\[\[)[^\[\]]*(?=\]\])", text)}
+    return _tags_from_tokens(text, (WIKILINK,))
 
 
 def get_tags_from_comment(text: str) -> set[str]:
@@ -64,13 +75,20 @@ def get_tags_from_comment(text: str) -> set[str]:
     [tags]:# (tag1,tag2,...)
     Extracts the tags, removes extra spaces, and returns them as a set.
     """
-    tags = set()
-    m = re.search(r"(?<!\S| )\[tags\]:# \((.*)\)", text)
-    if m:
-        string = m.group(1).replace(", ", ",")
-        tags = set(string.split(","))
-        tags.discard("")
-    return tags
+    return _tags_from_tokens(text, (COMMENT,))
+
+
+def get_tags_from_text(text: str) -> set[str]:
+    """
+    The tags of a text from its headers, its wikilinks and its first
+    [tags]:# comment, found in one scan that skips code.
+    """
+    return _tags_from_tokens(text, (HEADER, WIKILINK, COMMENT))
+
+
+def _tags_from_tokens(text: str, kinds: tuple[str, ...]) -> set[str]:
+    count("regex_passes")
+    return extract_tags(tokenize(text), kinds)
 
 
 def add_tags(tags: set[str], text: str) -> str:
@@ -158,162 +176,322 @@ def add_links_from_list(text: str, linklist: str) -> str:
         return text + appendix
 
 
-def add_links_from_index(text: str, tag_index: TagIndex) -> str:
-    text = text.strip()
-    m = re.match(r"^(?<!\S| )\[tags\]:# \((.*)\)$", text, re.MULTILINE)
-    if not m:
-        return text  # Cannot proceed without a tags comment
-    tagstring = m.group(0)
-    print(tagstring, "add_links")
-    text = re.sub(
-        r"(?<!\S| )\[tags\]:# \((.*)\)", "@@-0-@@", text
-    )  # replace tag comment
-    tags: list = sorted(tag_index.get_all_tags())
-    placeholders: dict = {}
-    # strip actual tag references
-    for i, tag in enumerate(tags):
-        etag = re.escape(tag)
-        placeholder = rf"@@@{i}@@@"
-        placeholders[placeholder] = f"[{tag}][{tag}]"
-        text = re.sub(re.escape(placeholders[placeholder]), placeholder, text)
-        text = re.sub(rf"^\[{etag}\]: \S+ \(autolink\)$", "", text)
-        # "^\[.+\]: \S+ \(autolink\)$"mg
-        text = re.sub(
-            rf"(?i)(?<!#)(?<!# )(?<!\(|\[)\b{etag}(?![a-z,][ \)][\)\n]|\.md)|(?<=\[\[){etag}(?=\]\])",
-            placeholder,
-            text,
-        )
-        text = text.rstrip()
-        text = re.sub(rf"(?i)\[{etag}\]\[{etag}\]", placeholder, text)
-    # add references
-    for placeholder in placeholders.keys():
-        text = re.sub(rf"\[\[{placeholder}\]\]", placeholder, text)
-        text = re.sub(placeholder, placeholders[placeholder], text)
+def add_links_from_index(text: str, tag_index: TagIndex, rel_path: str = "") -> str:
+    """
+    Replaces occurrences of all indexed tags with [tag][tag] references in a
+    single scan and appends `[tag]: path (autolink)` definitions pointing
+    at the first defining location of each linked tag.
+    `rel_path` is the path of the text's file in the vault, the definitions
+    are made relative to it.
+    """
+    linker = get_linker(frozenset(tag_index.get_all_tags()))
+    return linker.link(text, _index_taglink(tag_index, rel_path))
 
-    # add taglinks
-    appendix: str = ""
-    for tag in tags:
-        text = re.sub(
-            rf"(?i)(?<!\S| )\[\S+\]: \S+ \(autolink\)",
-            "",
-            text,
-        )
-        etag = re.escape(tag)
-        taglink: str = sorted(tag_index.get_defining_files(tag).values())[0]
-        if re.search(rf"(?i)\[{etag}\]\[{etag}\]", text):
-            # if (
-            #     re.search(
-            #         rf"(?i)(?<!\S| )\[{etag}\]: {re.escape(taglink)} \(autolink\)",
-            #         text,
-            #     )
-            #     is None
-            # ):
-            appendix += f"[{tag}]: {taglink} (autolink)\n"
-    # re-add comment
-    text = re.sub(r"@@-0-@@", tagstring, text)
-    if appendix == "":
-        return text
-    else:
-        return text.strip() + "\n" + appendix.strip()
+
+def _index_taglink(
+    tag_index: TagIndex, rel_path: str
+) -> Callable[[str], Optional[str]]:
+    """Looks up the link target of a tag in the index, relative to `rel_path`."""
+    return _file_taglink(tag_index.get_tag_link, rel_path)
 
 
-def get_origin(tag: str, path: str) -> str:
+def _file_taglink(
+    taglink: Callable[[str], Optional[str]], rel_path: str
+) -> Callable[[str], Optional[str]]:
+    """
+    Wraps a lookup of link targets relative to the vault root into one
+    relative to the file at `rel_path`.
+    """
+    if "/" not in rel_path:
+        return taglink
+
+    def file_taglink(tag: str) -> Optional[str]:
+        link = taglink(tag)
+        return None if link is None else relative_link(link, rel_path)
+
+    return file_taglink
+
+
+def get_origin(tag: str, path: str, tag_index: Optional[TagIndex] = None) -> str:
     """
     Searches for a Markdown file in the directory that contains the tag
     inside its [tags]:# entry.
     Returns the path to the file where the tag is defined.
+    The tags of files unchanged since they were indexed come from the index,
+    only the other files are read.
     """
+    if tag_index is None and TagIndex.exists(path):
+        tag_index = TagIndex(path)
     rt = re.compile(r"(?i)(?<!\S| )\[tags\]:# \((.*)\)")
-    for file in os.listdir(path):
-        file_path = os.path.join(path, file)
-        if (
-            os.path.isfile(file_path)
-            and os.path.splitext(file_path)[1].lower() == ".md"
-            and not file_path.endswith("linklist.md")
-        ):
-            with open(os.path.realpath(file_path), encoding="utf-8") as f:
-                m = re.search(rt, f.read())
-                if m:
-                    tagstring = m.group(1)
-                    if tag in tagstring.split(", "):
-                        return file_path
+    for rel_path in walk_vault(path):
+        file_path = os.path.join(path, rel_path)
+        if tag_index is not None and tag_index.is_file_unchanged(rel_path):
+            if tag in tag_index.get_file_tags(rel_path):
+                return file_path
+            continue
+        m = re.search(rt, documents.get(os.path.realpath(file_path)).text)
+        if m:
+            tagstring = m.group(1)
+            if tag in tagstring.split(", "):
+                return file_path
     else:
         raise ValueError(f"no tag: {tag} was found in {path}")
 
 
-def add_taglinks_to_linklist(tags_with_paths: dict[str, str], text: str) -> str:
+def render_linklist(tag_links: dict[str, str]) -> str:
     """
-    Adds or updates tag definitions in the linklist content.
-    `tags_with_paths` is a dictionary where keys are tags and values are their paths.
+    Renders the content of linklist.md from the canonical link target of
+    every tag: a [tags]:# comment listing all tags, then one
+    `[tag](path); ` definition per tag, both sorted by tag.
     """
-    for tag, path in tags_with_paths.items():
-        # Remove existing definition for this tag
-        text = re.sub(
-            rf"\[{re.escape(tag)}\]\(.*\); \n\n", "", text, flags=re.IGNORECASE
-        )
-        # Add new definition in the correct format
-        text += f"[{tag}]({path}); \n\n"
-    return text
+    tags = sorted(tag_links)
+    tagstring = "".join(f"{tag}, " for tag in tags)
+    return f"[tags]:# ({tagstring})\n" + "".join(
+        f"[{tag}]({tag_links[tag]}); \n\n" for tag in tags
+    )
 
 
-def _remove_tag_references_from_file(tag: str, file_path: str) -> None:
+def save_linklist(
+    path: str, tag_index: TagIndex, old_links: Optional[dict[str, str]] = None
+) -> bool:
     """
-    Removes all references and definitions for a given tag from a file.
+    Writes linklist.md of a directory rendered from its index, atomically.
+    With `old_links`, the links of the index before the change, the file
+    is only rendered if a tag or a canonical path changed since then or the
+    file is missing; without, it is rendered and compared to the file.
+    Returns whether the file was written.
+    """
+    linklist_path = os.path.join(path, "linklist.md")
+    tag_links = tag_index.get_tag_links()
+    if old_links is not None:
+        if tag_links == old_links and os.path.exists(linklist_path):
+            return False
+        linklist = render_linklist(tag_links)
+    else:
+        linklist = render_linklist(tag_links)
+        try:
+            with open(linklist_path, "r", encoding="utf-8") as f:
+                if f.read() == linklist:
+                    return False
+        except FileNotFoundError:
+            pass
+    write_atomic(linklist_path, linklist)
+    count_write(linklist)
+    return True
+
+
+@lru_cache(maxsize=8)
+def _unlink_pattern(tags: frozenset[str]) -> tuple[re.Pattern, dict[str, str]]:
+    canonical: dict[str, str] = {}
+    for tag in sorted(tags):
+        canonical.setdefault(tag.lower(), tag)
+    alt = trie_pattern(canonical)
+    pattern = re.compile(
+        rf"\[(?P<ref>{alt})\]\[(?P=ref)\]|^\s*\[(?P<definition>{alt})\]: .*\n?",
+        re.IGNORECASE | re.MULTILINE,
+    )
+    return pattern, canonical
+
+
+def _remove_tags_references(tags: Iterable[str], text: str) -> str:
+    """
+    Removes all references and definitions for the given tags from a text
+    in one pass.
     - Replaces `[tag][tag]` with `tag`.
-    - Removes `[tag]: path/to/file.md#header` definition.
+    - Removes `[tag]: path/to/file.md#header` definitions.
+    """
+    pattern, canonical = _unlink_pattern(frozenset(tags))
+
+    def replace(match: re.Match) -> str:
+        if match.lastgroup == "ref":
+            # the reference-style link becomes the plain tag text
+            return canonical[match.group("ref").lower()]
+        return ""
+
+    count("regex_passes")
+    return pattern.sub(replace, text)
+
+
+def _remove_tags_references_from_file(
+    tags: Iterable[str], file_path: str
+) -> Optional[str]:
+    """
+    Removes all references and definitions for the given tags from a file
+    in one pass, see _remove_tags_references.
+    Returns the new content if the file was rewritten.
     """
     with open(file_path, "r+", encoding="utf-8") as f:
         content = f.read()
-        modified_content = content
-
-        # Replace the reference-style link `[tag][tag]` with the plain tag text.
-        modified_content = re.sub(
-            rf"\[{re.escape(tag)}\]\[{re.escape(tag)}\]",
-            tag,
-            modified_content,
-            flags=re.IGNORECASE,
-        )
-        # Remove the link definition from the appendix of the file.
-        modified_content = re.sub(
-            rf"^\s*\[{re.escape(tag)}\]: .*\n?",  # Match [tag]: ...\n
-            "",
-            modified_content,
-            flags=re.MULTILINE | re.IGNORECASE,
-        )
+        count_read(content)
+        modified_content = _remove_tags_references(tags, content)
 
         if modified_content != content:
             f.seek(0)
             f.write(modified_content.rstrip())
             f.truncate()
+            count_write(modified_content.rstrip())
+            return modified_content.rstrip()
+    return None
 
 
-def get_tag_headers(tags: set, text, rel_path):
-    tags = tags.copy()
-    hre = re.compile(r"^#{1,6} .*(?=\n)|(?<=\n)#{1,6} .*(?=\n|$)")
-    headers = re.findall(hre, text)
-    if (m := re.match(r"^\[tags\]:# .*\n\n", text)) is not None:
-        text = text[len(m.group(0)) :]
+# a wikilink that is still open at the end of a text
+OPEN_WIKILINK_RE = re.compile(r"\[\[[^\[\]]*\Z")
+HEADER_LINE_RE = re.compile(r"^#{1,6} .*", re.MULTILINE)
+
+
+def _scan_tags_stream(file_path: str) -> tuple[set[str], bool, bool, str]:
+    """
+    Streaming counterpart of extracting the tags of a file with the
+    get_tags_from_* functions, for files too large to read at once.
+    Returns the tags, whether the file has a [tags]:# comment, whether its
+    first line is one and the content hash of the file.
+    """
+    tags: set[str] = set()
+    comment_found = False
+    starts_with_comment = False
+    digest = hashlib.blake2b(digest_size=16)
+    lexer = PieceLexer()
+    unfinished = ""
+    for i, piece in enumerate(read_pieces(file_path)):
+        digest.update(piece.encode("utf-8"))
+        if i == 0:
+            starts_with_comment = (
+                re.match(r"^(?<!\S| )\[tags\]:# \((.*)\)\n", piece) is not None
+            )
+        text = unfinished + piece
+        tokens = list(lexer.tokenize(text))
+        # a wikilink may span lines, an open one is kept for the next piece
+        unfinished = ""
+        if tokens and tokens[-1].kind == TEXT:
+            m = OPEN_WIKILINK_RE.search(text, tokens[-1].start)
+            if m is not None:
+                unfinished = text[m.start() :]
+        for token in tokens:
+            if token.kind in (HEADER, WIKILINK):
+                tags.add(token.value)
+            elif token.kind == COMMENT and not comment_found:
+                comment_found = True
+                tags.update(comment_tags(token.value))
+    tags.update(get_tags_from_wikilinks(unfinished))
+    return tags, comment_found, starts_with_comment, digest.hexdigest()
+
+
+def _tagged_pieces(
+    file_path: str, tags: set[str], has_comment: bool, starts_with_comment: bool
+) -> Iterator[str]:
+    """
+    Streaming counterpart of add_tags: yields the file with its [tags]:#
+    comment set to `tags`, in pieces that end at line ends.
+    """
+    tagstring = "".join(f"{tag}, " for tag in sorted(tags))
+    rt = re.compile(r"^(?<!\S| )\[tags\]:# \((.*)\)$", re.MULTILINE)
+    if starts_with_comment:
+        for piece in read_pieces(file_path):
+            yield rt.sub(f"[tags]:# ({tagstring})", piece)
+        return
+    yield f"[tags]:# ({tagstring})\n"
+    pieces = read_pieces(file_path)
+    if has_comment:
+        pieces = (rt.sub("", piece) for piece in pieces)
+    yield from align_pieces(rstrip_pieces(lstrip_pieces(pieces)))
+
+
+class _TagHeaderScanner:
+    """
+    Streaming counterpart of get_tag_headers, fed with pieces of a text that
+    end at line ends. A tag that is not a header is located in the first
+    section that contains it.
+    """
+
+    def __init__(self, tags: set[str], rel_path: str):
+        self.tags = set(tags)
+        self.rel_path = rel_path
+        self.header_paths: dict[str, str] = {}
+        self.found: dict[str, str] = {}
+        self.current = rel_path
+        # the empty tag occurs everywhere
+        if "" in self.tags:
+            self.found[""] = rel_path
+        self.pattern: Optional[re.Pattern] = None
+        if self.tags - {""}:
+            self.pattern, self.lengths = tag_scanner(frozenset(self.tags - {""}))
+        # end of the current section, for tags split between pieces
+        self.overlap = max(map(len, self.tags), default=1) - 1
+        self.tail = ""
+        # the first two lines, until both are complete
+        self.head: Optional[str] = ""
+
+    def feed(self, piece: str):
+        if self.head is not None:
+            self.head += piece
+            if self.head.count("\n") >= 2:
+                self._feed_head()
+            return
+        self._feed(piece, False)
+
+    def _feed_head(self):
+        head, self.head = self.head, None
+        self._feed(head, True)
+
+    def _feed(self, piece: str, first: bool):
+        pos = 0
+        if first:
+            m = re.match(r"\[tags\]:# .*\n\n", piece)
+            pos = m.end() if m else 0
+        for m in HEADER_LINE_RE.finditer(piece, pos):
+            if first and m.start() == 0 and m.end() == len(piece):
+                continue  # a text of one line without line end has no header
+            self._search(piece[pos : m.start()])
+            header = m.group(0).split("# ")[1]
+            self.current = self.rel_path + "#" + header.replace(" ", "-")
+            self.header_paths[header] = self.current
+            self.tail = ""
+            pos = m.end()
+        self._search(piece[pos:])
+
+    def _search(self, segment: str):
+        window = self.tail + segment
+        if self.pattern is not None and len(self.found) < len(self.tags):
+            for m in self.pattern.finditer(window):
+                longest = m.group(1)
+                for length in self.lengths:
+                    if length > len(longest):
+                        break
+                    tag = longest[:length]
+                    if tag in self.tags and tag not in self.found:
+                        self.found[tag] = self.current
+                if len(self.found) == len(self.tags):
+                    break
+        self.tail = window[-self.overlap :] if self.overlap else ""
+
+    def result(self) -> dict[str, str]:
+        if self.head is not None:
+            self._feed_head()
+        tag_paths = dict(self.header_paths)
+        for tag in self.tags - tag_paths.keys():
+            tag_paths[tag] = self.found.get(tag, self.rel_path)
+        return tag_paths
+
+
+@timed("get_tag_headers")
+def get_tag_headers(
+    tags: set, text, rel_path, sections: Optional[SectionMap] = None
+) -> dict[str, str]:
+    """
+    Locates tags in a file: every header of the text maps to its own anchor,
+    other tags to the header section they first occur in, or to the file
+    itself if they occur before any header or not at all.
+    A SectionMap already built for the text can be passed as `sections`.
+    """
+    if sections is None:
+        sections = SectionMap(text)
+    count("regex_passes", 2)
     tag_paths = {
-        header.split("# ")[1]: rel_path + "#" + header.split("# ")[1].replace(" ", "-")
-        for header in headers
+        title: rel_path + "#" + anchor
+        for title, anchor in zip(sections.titles, sections.anchors)
     }
-    headers = [""] + headers
-    splt = re.split(hre, text)
-    tags.difference_update(tag_paths.keys())
-    for tag in tags:
-        for i, strng in enumerate(splt):
-            if tag in tag_paths.keys():
-                continue
-            if tag in strng:
-                if headers[i] == "":
-                    tag_paths[tag] = rel_path
-                else:
-                    tag_paths[tag] = (
-                        rel_path + "#" + headers[i].split("# ")[1].replace(" ", "-")
-                    )
-    for tag in tags:
-        if tag not in tag_paths.keys():
-            tag_paths[tag] = rel_path
+    for tag, index in sections.locate(set(tags) - tag_paths.keys()).items():
+        tag_paths[tag] = sections.link(rel_path, index)
     return tag_paths
 
 
@@ -334,58 +512,242 @@ def check_list_for_tags(tags: Iterable, path: str) -> set:
     return found_tags
 
 
-def find_links_to_tag(tag: str, path: str) -> list[str | None]:
+def find_links_to_tag(
+    tag: str, path: str, tag_index: Optional[TagIndex] = None
+) -> list[str | None]:
+    """
+    Returns the sorted links to the sections that hold a [tag][tag]
+    reference, one per reference. Reference locations are taken from the
+    index, only files changed since they were indexed are read and scanned.
+    """
+    if tag_index is None and TagIndex.exists(path):
+        tag_index = TagIndex(path)
+    lowered = tag.lower()
     links: list[str | None] = []
-    hre = re.compile(r"^#{1,6} .*(?=\n)|(?<=\n)#{1,6} .*(?=\n)")
-    tre = re.compile(rf"(?i)\[{tag}\]\[{tag}\]")
-    for name in os.listdir(path):
-        file_path = os.path.join(path, name)
-        if (
-            os.path.isfile(file_path)
-            and os.path.splitext(file_path)[1].lower() == ".md"
-            and not os.path.splitext(file_path)[0].endswith("linklist")
-        ):
-            with open(file_path, encoding="utf-8") as f:
-                text = f.read()
-
-            headers = [""] + re.findall(hre, text)
-            split = re.split(hre, text)
-            for i, strng in enumerate(split):
-                for m in re.findall(tre, strng):
-                    if m == "":
-                        continue
-                    if headers[i] == "":
-                        links.append(os.path.relpath(file_path, path))
-                    else:
-                        links.append(
-                            os.path.relpath(file_path, path)
-                            + "#"
-                            + headers[i].split("# ")[1].replace(" ", "-")
-                        )
-
-        links.sort()
+    for rel_path in walk_vault(path):
+        locations = (
+            tag_index.get_reference_locations(rel_path)
+            if tag_index is not None
+            else None
+        )
+        if locations is None:
+            document = documents.get(os.path.join(path, rel_path))
+            _, locations = document.references(rel_path)
+        links.extend(link for name, link, _ in locations if name.lower() == lowered)
+    links.sort()
     return links
 
 
-def _cleanup_dead_tag_in_project(
-    tag: str, directory_path: str, tag_index: TagIndex
+def _files_referencing(tags: Iterable[str], tag_index: TagIndex) -> dict[str, set]:
+    """Groups the given tags by the files that reference them."""
+    tags_by_file: dict[str, set] = {}
+    for tag in tags:
+        for name in tag_index.get_referenced_files(tag):
+            tags_by_file.setdefault(name, set()).add(tag)
+    return tags_by_file
+
+
+def _cleanup_dead_tags_in_project(
+    tags_by_file: dict[str, set], directory_path: str, tag_index: TagIndex
 ) -> None:
     """
-    When a tag is completely removed from the project, this function cleans up
-    any lingering references to it in all project files.
+    When tags are completely removed from the project, this function cleans up
+    any lingering references to them, rewriting every file at most once.
+    `tags_by_file` maps the files known to reference dead tags to those tags.
     """
-    # Only clean up files that are known to reference this tag from the index
-    for name in tag_index.get_referenced_files(tag):
+    for name, tags in sorted(tags_by_file.items()):
         other_file_path = os.path.join(directory_path, name)
         if (
             os.path.isfile(other_file_path)
             and os.path.splitext(other_file_path)[1].lower() == ".md"
             and not other_file_path.endswith("linklist.md")
         ):
-            _remove_tag_references_from_file(tag, other_file_path)
+            content = _remove_tags_references_from_file(tags, other_file_path)
+            if content is not None and tag_index.is_file_recorded(name):
+                # keep the fingerprint current, the file changed on our behalf
+                document = documents.put(other_file_path, content)
+                tag_index.record_file(name, content, tag_index.get_file_tags(name))
+                tag_index.set_reference_locations(
+                    name, document.hash, document.references(name)[1]
+                )
+
+
+def _markdown_files(path: str) -> list[str]:
+    """
+    Lists the paths of the Markdown files of a vault relative to its root,
+    linklist.md and ignored files excluded.
+    """
+    return sorted(walk_vault(path))
 
 
-def initialize_tagging(path: str) -> None:
+def _find_dependents(
+    path: str,
+    tag_index: TagIndex,
+    old_links: dict[str, str],
+    candidates: Iterable[str],
+) -> list[str]:
+    """
+    Returns the files among `candidates` that have to be relinked after the
+    tag set changed: files referencing a tag whose link target moved and
+    files mentioning a tag that did not exist before.
+    """
+    candidates = set(candidates)
+    new_links = tag_index.get_tag_links()
+    dependents = set()
+    for tag, link in new_links.items():
+        if tag in old_links and old_links[tag] != link:
+            dependents.update(tag_index.get_referenced_files(tag))
+    added_tags = new_links.keys() - old_links.keys()
+    if added_tags:
+        linker = Linker(added_tags)
+        for name in sorted(candidates - dependents):
+            file_path = os.path.join(path, name)
+            if is_large_file(file_path):
+                if linker.mentions_stream(read_pieces(file_path)):
+                    dependents.add(name)
+                continue
+            if linker.mentions(documents.get(file_path).text):
+                dependents.add(name)
+    return sorted(dependents & candidates)
+
+
+def _tag_text(document: Document) -> tuple[str, set[str]]:
+    """Writes the tags of a document into the [tags]:# comment of its text."""
+    tags = set(document.tags)
+    return add_tags(tags, document.text), tags
+
+
+def _scan_file(
+    path: str, name: str
+) -> tuple[str, set[str], dict[str, str], Optional[str], str]:
+    """
+    First phase of initialize_tagging for one file: extracts its tags, writes
+    them into its [tags]:# comment and locates them in the file.
+    Nothing is written, the tagged text is returned together with the hash
+    of the content on disk. Large files are streamed and their text is not
+    returned.
+    """
+    file_path = os.path.join(path, name)
+    if is_large_file(file_path):
+        tags, has_comment, starts_with_comment, digest = _scan_tags_stream(file_path)
+        scanner = _TagHeaderScanner(tags, name)
+        for piece in _tagged_pieces(file_path, tags, has_comment, starts_with_comment):
+            scanner.feed(piece)
+        return name, tags, scanner.result(), None, digest
+    document = documents.get(file_path)
+    text, tags = _tag_text(document)
+    tag_paths = get_tag_headers(tags, text, name)
+    return name, tags, tag_paths, text, document.hash
+
+
+def _link_file_stream(
+    file_path: str,
+    rel_path: str,
+    linker: Linker,
+    taglink: Callable[[str], Optional[str]],
+) -> tuple[set[str], set[str], str, dict[str, str]]:
+    """
+    Tags and links a large file in pieces, writing the result to a temporary
+    file that replaces the file if its content changed.
+    Returns the tags of the file, the reference names and the content hash
+    of the result and the tag locations in the result.
+    """
+    tags, has_comment, starts_with_comment, digest = _scan_tags_stream(file_path)
+    reference_names: set[str] = set()
+    scanner = _TagHeaderScanner(tags, rel_path)
+    lexer = PieceLexer()
+    with StreamWriter(
+        file_path,
+        digest,
+        on_lines=(
+            lambda piece: reference_names.update(find_reference_names(piece, lexer)),
+            scanner.feed,
+        ),
+    ) as out:
+        linker.link_stream(
+            _tagged_pieces(file_path, tags, has_comment, starts_with_comment),
+            taglink,
+            out.write,
+        )
+    return tags, reference_names, out.hash, scanner.result()
+
+
+def _link_file(
+    path: str,
+    name: str,
+    text: Optional[str],
+    original_hash: Optional[str],
+    linker: Linker,
+    tag_links: dict[str, str],
+    dead_tags: frozenset[str] = frozenset(),
+) -> tuple[str, set[str], dict[str, Any], Optional[list[list]]]:
+    """
+    Second phase of initialize_tagging for one file: links the tagged text of
+    phase one, or the file on disk if that text was not kept, and writes the
+    file only if the result differs from its content on disk. References to
+    `dead_tags` are removed from the text first; streamed files are left to
+    the cleanup on disk.
+    Returns the reference names found in the result, the new fingerprint
+    and the reference locations, which are not collected for streamed files.
+    """
+    file_path = os.path.join(path, name)
+    if text is None and is_large_file(file_path):
+        _, reference_names, digest, _ = _link_file_stream(
+            file_path, name, linker, _file_taglink(tag_links.get, name)
+        )
+        fingerprint = file_fingerprint(file_path, None, digest)
+        return name, reference_names, fingerprint, None
+    if text is None:
+        document = documents.get(file_path)
+        original_hash = document.hash
+        text, _ = _tag_text(document)
+    if dead_tags:
+        text = _remove_tags_references(dead_tags, text)
+    out = linker.link(text, _file_taglink(tag_links.get, name))
+    if content_hash(out) != original_hash:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(out)
+        count_write(out)
+        document = documents.put(file_path, out)
+    else:
+        document = Document(out)
+    reference_names, locations = document.references(name)
+    return name, reference_names, file_fingerprint(file_path, out), locations
+
+
+# linker state of a worker process, set up once by _init_link_worker
+_worker_state: dict[str, Any] = {}
+
+
+def _init_link_worker(
+    all_tags: frozenset[str], tag_links: dict[str, str], dead_tags: frozenset[str]
+) -> None:
+    _worker_state["linker"] = get_linker(all_tags)
+    _worker_state["tag_links"] = tag_links
+    _worker_state["dead_tags"] = dead_tags
+
+
+def _link_file_in_worker(
+    path: str, name: str, text: Optional[str], original_hash: Optional[str]
+) -> tuple[str, set[str], dict[str, Any], Optional[list[list]]]:
+    return _link_file(
+        path,
+        name,
+        text,
+        original_hash,
+        _worker_state["linker"],
+        _worker_state["tag_links"],
+        _worker_state["dead_tags"],
+    )
+
+
+@timed("initialize_tagging")
+def initialize_tagging(
+    path: str,
+    force: bool = False,
+    jobs: int = 1,
+    memory_budget: int = 256 * 1024 * 1024,
+) -> None:
     """
     Initializes tagging:
     - goes through all Markdown files in the directory
@@ -393,272 +755,584 @@ def initialize_tagging(path: str) -> None:
     - inserts them into [tags]:# comments
     - then creates cross-links between all files based on tags
     - builds and saves a tag index for faster lookups
+    Files whose fingerprint matches the index are skipped, unless `force` is set
+    or the tag set changed in a way that affects them.
+    With `jobs` > 1 both phases are spread over a pool of worker processes,
+    `jobs` < 1 uses one worker per CPU. Results are merged in file order.
+    Every file is read once and written at most once, when its content
+    changes; up to `memory_budget` characters of text are kept between the
+    phases, files beyond that are read again in the second phase.
+    Other processes are kept from changing the index from loading to saving
+    it, see update_tags_on_files.
     """
     drc = os.listdir(path)
     if len(drc) == 0:
         return
-    atags = set()
-    atag_paths: dict = {}
-    linklist = ""
+    with TagIndex.lock_for(path):
+        _initialize_tagging(path, force, jobs, memory_budget)
+
+
+def _initialize_tagging(path: str, force: bool, jobs: int, memory_budget: int):
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    laps = Laps("load")
     tag_index = TagIndex(path)
-    for name in drc:
-        file_path = os.path.join(path, name)
-        if (
-            os.path.isfile(file_path)
-            and os.path.splitext(file_path)[1].lower() == ".md"
-            and not file_path.endswith("linklist.md")
-        ):
-            with open(file_path, encoding="utf-8") as f:
-                text = f.read()
-            tags = get_tags_from_headers(text)
-            tags.update(get_tags_from_comment(text))
-            tags.update(get_tags_from_wikilinks(text))
-            text = add_tags(tags, text)
-            tag_paths = get_tag_headers(tags, text, os.path.relpath(file_path, path))
-            atags.update(tags)
-            atag_paths |= tag_paths
-            with open(file_path, mode="w", encoding="utf-8") as f:
-                f.write(text)
-    linklist = add_tags(atags, linklist)
-    linklist = add_taglinks_to_linklist(atag_paths, linklist)
-    # Populate tag index with definitions
-    for tag, path_info in atag_paths.items():
-        # The file_path for definition is just the file, not with #header
-        tag_index.add_definition(tag, path_info.split("#")[0], path_info)
-    for name in drc:
-        file_path = os.path.join(path, name)
-        if (
-            os.path.isfile(file_path)
-            and os.path.splitext(file_path)[1].lower() == ".md"
-            and not file_path.endswith("linklist.md")
-        ):
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-            out = add_links_from_index(text, tag_index)
-            tag_index.update_file_references(
-                os.path.relpath(file_path, path), tag_index.get_all_tags(), out
+    old_links = tag_index.get_tag_links()
+    names = _markdown_files(path)
+    for name in sorted(tag_index.get_files() - set(names)):
+        tag_index.remove_file(name)
+    file_tags: dict[str, set[str]] = {}
+    changed = [
+        name for name in names if force or not tag_index.is_file_unchanged(name)
+    ]
+    for name in set(names) - set(changed):
+        file_tags[name] = tag_index.get_file_tags(name)
+    kept_texts: dict[str, tuple[str, str]] = {}
+    kept_size = 0
+    laps.next("scan")
+    with ExitStack() as stack:
+        if jobs > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            scanned = executor.map(
+                _scan_file, repeat(path), changed, chunksize=_chunksize(changed, jobs)
             )
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(out)
-    tag_index.save()
-    with open(os.path.join(path, "linklist.md"), "w", encoding="utf-8") as fl:
-        fl.write(linklist)
+        else:
+            scanned = map(_scan_file, repeat(path), changed)
+        for name, tags, tag_paths, text, original_hash in scanned:
+            file_tags[name] = tags
+            if text is not None and kept_size + len(text) <= memory_budget:
+                kept_texts[name] = (text, original_hash)
+                kept_size += len(text)
+            # Populate tag index with definitions
+            for tag in tag_index.get_defined_tags(name) - tag_paths.keys():
+                tag_index.remove_definition(tag, name)
+            for tag, path_info in tag_paths.items():
+                tag_index.add_definition(tag, name, path_info)
+    laps.next("cleanup")
+    unchanged = set(names) - set(changed)
+    to_link = changed + _find_dependents(path, tag_index, old_links, unchanged)
+    # Tags that lost their last definition are unlinked everywhere: files to
+    # link in the link pass, on the text they are linked from, so each is
+    # written once; the other files and streamed ones on disk right away
+    dead_tags = frozenset(old_links.keys() - tag_index.get_tag_links().keys())
+    tags_by_file = _files_referencing(dead_tags, tag_index)
+    for name in to_link:
+        if name in kept_texts or not is_large_file(os.path.join(path, name)):
+            tags_by_file.pop(name, None)
+    _cleanup_dead_tags_in_project(tags_by_file, path, tag_index)
+    for tag in dead_tags:
+        tag_index.remove_tag_from_index(tag)
+    laps.next("link")
+    all_tags = tag_index.get_all_tags()
+    tag_links = tag_index.get_tag_links()
+    texts = [kept_texts.pop(name, (None, None)) for name in to_link]
+    if jobs > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_link_worker,
+            initargs=(frozenset(all_tags), tag_links, dead_tags),
+        ) as executor:
+            linked = list(
+                executor.map(
+                    _link_file_in_worker,
+                    repeat(path),
+                    to_link,
+                    *zip(*texts),
+                    chunksize=_chunksize(to_link, jobs),
+                )
+            )
+    else:
+        linker = get_linker(frozenset(all_tags))
+        linked = [
+            _link_file(path, name, text, original_hash, linker, tag_links, dead_tags)
+            for name, (text, original_hash) in zip(to_link, texts)
+        ]
+    for name, reference_names, fingerprint, locations in linked:
+        tag_index.set_file_references(name, all_tags, reference_names)
+        tag_index.set_fingerprint(name, fingerprint, file_tags[name])
+        if locations is not None:
+            tag_index.set_reference_locations(name, fingerprint["hash"], locations)
+    laps.next("save")
     tag_index.save()
+    save_linklist(path, tag_index)
+    laps.stop()
+
+
+def _chunksize(items: list, jobs: int) -> int:
+    """Hands every worker a few batches, so few processes idle at the end."""
+    return max(1, len(items) // (jobs * 4))
+
+
+@timed("update_file")
+def _update_file(
+    file_path: str,
+    dir_path: str,
+    tag_index: TagIndex,
+    dead_references: Optional[dict[str, set]] = None,
+) -> None:
+    """
+    Updates a single file against an already loaded TagIndex.
+    - Adds links to the file for any tags found in the index.
+    - Scans the file for new or removed tags and updates the index.
+    Persisting the index and the linklist is left to the caller.
+    Tags that lost their last definition are unlinked in the other files
+    right away, or collected in `dead_references`, see _remove_dead_tags.
+    """
+    rel_path = vault_path(dir_path, file_path)
+    old_tags = tag_index.get_defined_tags(rel_path)
+    if is_large_file(file_path):
+        laps = Laps("stream")
+        # streamed: tags, links and tag locations in one pass over the file
+        current_tags, reference_names, digest, streamed_tag_paths = _link_file_stream(
+            file_path,
+            rel_path,
+            get_linker(frozenset(tag_index.get_all_tags())),
+            _index_taglink(tag_index, rel_path),
+        )
+        tag_index.record_file(rel_path, None, current_tags, digest)
+        tag_index.set_file_references(rel_path, None, reference_names)
+    else:
+        laps = Laps("read")
+        document = documents.get(file_path)
+        laps.next("extract")
+
+        # Update the file's tags
+        file_content_with_updated_tags, current_tags = _tag_text(document)
+        laps.next("link")
+        # Add links from the master linklist to the file.
+        # final_file_content = add_links_from_list(
+        #     file_content_with_updated_tags, linklist_content
+        # )
+        final_file_content = add_links_from_index(
+            file_content_with_updated_tags, tag_index, rel_path
+        )
+        laps.next("write")
+        # Save updated file
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(final_file_content)
+        count_write(final_file_content)
+        document = documents.put(file_path, final_file_content)
+        tag_index.record_file(rel_path, final_file_content, current_tags)
+        laps.next("references")
+
+        reference_names, locations = document.references(rel_path)
+        tag_index.set_file_references(rel_path, None, reference_names)
+        tag_index.set_reference_locations(rel_path, document.hash, locations)
+        streamed_tag_paths = None
+    laps.next("definitions")
+
+    # Determine what was removed from this file.
+    tags_removed_from_file = old_tags - current_tags
+
+    # Register the definitions of all tags of this file, as the location of
+    # a kept tag changes when e.g. its header is removed
+    if streamed_tag_paths is None:
+        all_current_file_tag_paths = get_tag_headers(
+            current_tags, final_file_content, rel_path, document.sections
+        )
+    else:
+        all_current_file_tag_paths = streamed_tag_paths
+    for tag in current_tags:
+        path_info = all_current_file_tag_paths[tag]
+        if tag_index.get_defining_files(tag).get(rel_path) != path_info:
+            tag_index.add_definition(tag, rel_path, path_info)
+
+    for tag in tags_removed_from_file:
+        tag_index.remove_definition(tag, rel_path)
+    dead_tags = {
+        tag for tag in tags_removed_from_file if not tag_index.get_defining_files(tag)
+    }
+    if dead_tags:
+        _remove_dead_tags(dead_tags, dir_path, tag_index, dead_references)
+    laps.stop()
+
+
+def _remove_dead_tags(
+    tags: set[str],
+    dir_path: str,
+    tag_index: TagIndex,
+    dead_references: Optional[dict[str, set]] = None,
+) -> None:
+    """
+    Unlinks tags that lost their last definition in every file and drops
+    them from the index.
+    If `dead_references` is given, the files to unlink them in are added to
+    it instead, so a batch can clean every file once at the end.
+    """
+    tags_by_file = _files_referencing(tags, tag_index)
+    if dead_references is None:
+        _cleanup_dead_tags_in_project(tags_by_file, dir_path, tag_index)
+    else:
+        for name, dead_tags in tags_by_file.items():
+            dead_references.setdefault(name, set()).update(dead_tags)
+    for tag in tags:
+        tag_index.remove_tag_from_index(tag)
+
+
+@timed("update_tags_on_files")
+def update_tags_on_files(
+    dir_path: str,
+    file_paths: Iterable[str],
+    tag_index: Optional[TagIndex] = None,
+    optimistic: bool = False,
+) -> dict[str, float]:
+    """
+    Updates several files of one directory in a batch.
+    The TagIndex and the linklist are loaded once, every file is processed
+    against the in-memory state and both are persisted once at the end.
+    A long-running caller can pass its resident `tag_index` instead.
+    Files whose fingerprint matches the index are skipped, files that no
+    longer exist are dropped from the index; other files of the directory
+    are relinked only if a changed tag set affects them.
+    Tags that died in the batch are unlinked with one pass per referencing
+    file after all files are updated.
+    Other processes are kept from changing the index from loading to saving
+    it. With `optimistic`, the index is only locked while saving, and the
+    files another process updated meanwhile are merged, see TagIndex.save.
+    Returns the seconds spent in each phase (load, update, relink, save).
+    """
+    lock = TagIndex.lock_for(dir_path)
+    with nullcontext() if optimistic else lock:
+        return _update_tags_on_files(dir_path, file_paths, tag_index, optimistic)
+
+
+def _update_tags_on_files(
+    dir_path: str,
+    file_paths: Iterable[str],
+    tag_index: Optional[TagIndex],
+    optimistic: bool,
+) -> dict[str, float]:
+    laps = Laps("load")
+    if tag_index is None:
+        tag_index = TagIndex(dir_path)
+    elif not optimistic:
+        # another process may have saved since the index was loaded
+        tag_index.refresh()
+    laps.next("update")
+
+    old_links = tag_index.get_tag_links()
+    processed = set()
+    # files that still reference tags which died in this batch
+    dead_references: dict[str, set] = {}
+    for file_path in file_paths:
+        rel_path = vault_path(dir_path, file_path)
+        if not os.path.exists(file_path):
+            defined_tags = tag_index.get_defined_tags(rel_path)
+            tag_index.remove_file(rel_path)
+            dead_tags = {
+                tag for tag in defined_tags if not tag_index.get_defining_files(tag)
+            }
+            if dead_tags:
+                _remove_dead_tags(dead_tags, dir_path, tag_index, dead_references)
+            processed.add(rel_path)
+            continue
+        if tag_index.is_file_unchanged(rel_path):
+            continue
+        _update_file(file_path, dir_path, tag_index, dead_references)
+        processed.add(rel_path)
+
+    # tags defined again by a later file of the batch are not dead anymore
+    all_tags = tag_index.get_all_tags()
+    for name in list(dead_references):
+        dead_references[name] -= all_tags
+        if not dead_references[name]:
+            del dead_references[name]
+    _cleanup_dead_tags_in_project(dead_references, dir_path, tag_index)
+    laps.next("relink")
+
+    unprocessed = set(_markdown_files(dir_path)) - processed
+    for name in _find_dependents(dir_path, tag_index, old_links, unprocessed):
+        _update_file(os.path.join(dir_path, name), dir_path, tag_index)
+    laps.next("save")
+
+    # Final Saves
+    with tag_index.lock:
+        tag_index.save()
+        save_linklist(dir_path, tag_index, old_links)
+    laps.stop()
+    return laps.seconds
 
 
-def update_tags_on_file(file_path: str) -> None:
+def update_tags_on_file(file_path: str, optimistic: bool = False) -> None:
     """
     Updates a single file and the central linklist.
     - Adds links to the file for any new tags found in the linklist.
     - Scans the file for new or removed tags.
     - Updates the linklist with these changes.
     """
-    # Initialize TagIndex for the current directory
-    dir_path = os.path.dirname(file_path)
-    if not dir_path:
-        dir_path = "."
-    linklist_path = os.path.join(dir_path, "linklist.md")
-    rel_path = os.path.relpath(file_path, dir_path)
-
-    # Read original state of file and linklist
-    tag_index = TagIndex(dir_path)
-    old_tags = {
-        tag
-        for tag in tag_index.get_all_tags()
-        if os.path.relpath(file_path, dir_path)
-        in tag_index.get_defining_files(tag).keys()
+    update_tags_on_files(find_vault_root(file_path), [file_path], optimistic=optimistic)
+
+
+@timed("collect_garbage")
+def collect_garbage(directory_path: str) -> set[str]:
+    """
+    Drops files that no longer exist from the index, then removes every tag
+    that no file defines anymore from the index and the linklist and unlinks
+    it in the files that still reference it, rewriting each of them once.
+    The index is locked from loading to saving it, see update_tags_on_files.
+    Returns the removed tags.
+    """
+    with TagIndex.lock_for(directory_path):
+        return _collect_garbage(directory_path)
+
+
+def _collect_garbage(directory_path: str) -> set[str]:
+    tag_index = TagIndex(directory_path)
+    old_links = tag_index.get_tag_links()
+    for name in sorted(tag_index.get_files()):
+        if not os.path.exists(os.path.join(directory_path, name)):
+            tag_index.remove_file(name)
+    dead_tags = {
+        tag for tag in tag_index.get_all_tags() if not tag_index.get_defining_files(tag)
     }
-    with open(file_path, "r", encoding="utf-8") as f:
-        original_file_content = f.read()
+    if dead_tags:
+        _remove_dead_tags(dead_tags, directory_path, tag_index)
+    tag_index.save()
+    save_linklist(directory_path, tag_index, old_links)
+    return dead_tags
 
-    try:
-        with open(linklist_path, "r", encoding="utf-8") as f:
-            linklist_content = f.read()
-    except FileNotFoundError:
-        # If no linklist, start with empty.
-        linklist_content = ""
-
-    # Update the file's tags
-    current_tags = get_tags_from_headers(original_file_content)
-    current_tags.update(get_tags_from_wikilinks(original_file_content))
-    current_tags.update(get_tags_from_comment(original_file_content))
-    file_content_with_updated_tags = add_tags(current_tags, original_file_content)
-    # Add links from the master linklist to the file.
-    # final_file_content = add_links_from_list(
-    #     file_content_with_updated_tags, linklist_content
-    # )
-    final_file_content = add_links_from_index(file_content_with_updated_tags, tag_index)
-    # Save updated file
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(final_file_content)
-
-    tag_index.update_file_references(
-        rel_path, tag_index.get_all_tags(), final_file_content
-    )
-
-    # Update the linklist based on changes in the file
-    linklist_tags = get_tags_from_comment(linklist_content)
-
-    # Determine what was added to or removed from this file.
-    tags_added_to_file = current_tags - old_tags
-    tags_removed_from_file = old_tags - current_tags
-    if not tags_added_to_file and not tags_removed_from_file:
-        return
 
-    # Update tag index with definitions from this file for newly added tags
-    all_current_file_tag_paths = get_tag_headers(
-        current_tags, final_file_content, rel_path
-    )
-    for tag in tags_added_to_file:
-        tag_index.add_definition(tag, rel_path, all_current_file_tag_paths[tag])
+def read_rename_map(file_path: str) -> dict[str, str]:
+    """
+    Reads old,new tag pairs from a CSV file, one pair per row.
+    Empty rows, rows starting with '#' and an "old,new" header are skipped.
+    """
+    mapping: dict[str, str] = {}
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            if not row or not "".join(row).strip() or row[0].startswith("#"):
+                continue
+            if number == 1 and [cell.strip() for cell in row] == ["old", "new"]:
+                continue
+            if len(row) != 2:
+                raise ValueError(f"{file_path}:{number}: expected old,new")
+            old_tag, new_tag = (cell.strip() for cell in row)
+            if old_tag in mapping:
+                raise ValueError(f"{file_path}:{number}: '{old_tag}' is renamed twice")
+            mapping[old_tag] = new_tag
+    return mapping
 
-    # Prepare tags for update/removal in the linklist's definitions section
-    tags_to_update_in_linklist: dict[str, str] = {}
 
-    for tag in tags_removed_from_file:
-        tag_index.remove_definition(tag, rel_path)
-        remaining_defining_files = tag_index.get_defining_files(tag)
-        if not remaining_defining_files:
-            _cleanup_dead_tag_in_project(tag, dir_path, tag_index)
-            tag_index.remove_tag_from_index(tag)
-            # Also remove its definition from new_linklist_content
-            # TODO should this be its own function?
-            linklist_content = re.sub(
-                rf"\[{re.escape(tag)}\]\(.*\); \n\n",
-                "",
-                linklist_content,
-                flags=re.IGNORECASE,
-            )
-            linklist_content = re.sub(
-                rf"{re.escape(tag)}, ", "", linklist_content, flags=re.IGNORECASE
-            )
+def _renamed_tagstring(taglist: str, mapping: dict[str, str]) -> Optional[str]:
+    """
+    The tag list of a [tags]:# comment with the tags of `mapping` renamed,
+    or None if it holds none of them.
+    """
+    tags = set(taglist.replace(", ", ",").split(","))
+    tags.discard("")
+    if not tags & mapping.keys():
+        return None
+    tags = {mapping.get(tag, tag) for tag in tags}
+    return "".join(f"{tag}, " for tag in sorted(tags))
+
+
+@timed("rename_tags")
+def rename_tags(directory_path: str, mapping: dict[str, str]) -> bool:
+    """
+    Renames many tags at once and updates all occurrences and references
+    across the project. Every affected file is read and written once, and
+    only the spans that name a renamed tag change; the index and the
+    linklist are saved once.
+    Nothing is renamed if a tag is missing or a new name is taken; returns
+    whether the renaming was done.
+    The index is locked from loading to saving it, see update_tags_on_files.
+    """
+    with TagIndex.lock_for(directory_path):
+        return _rename_tags(directory_path, mapping)
+
+
+def _rename_tags(directory_path: str, mapping: dict[str, str]) -> bool:
+    tag_index = TagIndex(directory_path)
+    mapping = {old: new for old, new in mapping.items() if old != new}
+    all_tags = tag_index.get_all_tags()
+
+    # Check that the old tags exist and the new ones are free
+    valid = True
+    for old_tag, new_tag in mapping.items():
+        if old_tag not in all_tags:
+            print(f"Error: Tag '{old_tag}' not found in the index.")
+            valid = False
+        elif new_tag in all_tags and new_tag not in mapping:
+            print(f"Error: Tag '{new_tag}' already exists. Cannot rename.")
+            valid = False
+    new_tags = list(mapping.values())
+    for new_tag in sorted({tag for tag in new_tags if new_tags.count(tag) > 1}):
+        print(f"Error: Several tags would be renamed to '{new_tag}'.")
+        valid = False
+    if not valid or not mapping:
+        return False
+
+    # Identify all relevant files
+    files_to_update = set()
+    for old_tag in mapping:
+        files_to_update.update(tag_index.get_defining_files(old_tag).keys())
+        files_to_update.update(tag_index.get_referenced_files(old_tag))
+
+    if not files_to_update:
+        if len(mapping) == 1:
+            print(f"No files found containing or referencing tag '{old_tag}'.")
         else:
-            # Tag still defined elsewhere, update its path in linklist_content
-            # Pick the first remaining defining file as the new canonical source for linklist.md
-            first_defining_file_path = next(iter(remaining_defining_files.keys()))
-            first_defining_file_tag_path = remaining_defining_files[
-                first_defining_file_path
-            ]
-            tags_to_update_in_linklist[tag] = first_defining_file_tag_path
+            print("No files found containing or referencing these tags.")
+        return False
 
-    # Update the set of all tags for the linklist.
-    final_linklist_tags = (linklist_tags | tags_added_to_file) - tags_removed_from_file
+    laps = Laps("files")
+    old_links = tag_index.get_tag_links()
+    # Update TagIndex
+    tag_index.rename_tags_in_index(mapping)
+    # matched case-insensitively, the alphabetically first spelling wins
+    new_by_lower: dict[str, str] = {}
+    for old_tag in sorted(mapping):
+        new_by_lower.setdefault(old_tag.lower(), mapping[old_tag])
+
+    # Patch the spans that name an old tag and leave the rest of every file
+    # as it is. Definition lines are filled in once the locations of all
+    # renamed tags are registered, so none points to an old header.
+    patched: dict[str, tuple[str, list[str], list[tuple[int, str]]]] = {}
+    for rel_path in sorted(files_to_update):
+        file_path = os.path.join(directory_path, rel_path)
+        if not os.path.exists(file_path):
+            continue
 
-    # Start building the new linklist content by updating its [tags] comment.
-    linklist_content = add_tags(final_linklist_tags, linklist_content)
-    tags_to_update_in_linklist.update(all_current_file_tag_paths)
-    linklist_content = add_taglinks_to_linklist(
-        tags_to_update_in_linklist, linklist_content
-    )
+        content = documents.get(file_path).text
+
+        parts: list[str] = []
+        # (index in parts, new tag) of every definition line
+        definitions: list[tuple[int, str]] = []
+        renamed_in_file: set[str] = set()
+        pos = 0
+        # the [tags]:# comment, header lines that are an old tag, [old][old]
+        # references and `[old]: ...` definition lines, never inside code
+        for token in tokenize(content):
+            start, end = token.start, token.end
+            if start < pos:
+                continue  # in the title of a renamed header
+            if token.kind == COMMENT:
+                tagstring = _renamed_tagstring(token.value, mapping)
+                if tagstring is None:
+                    continue
+                renamed_in_file.update(
+                    mapping[tag] for tag in comment_tags(token.value) if tag in mapping
+                )
+                replacement = f"[tags]:# ({tagstring})"
+            elif token.kind == HEADER:
+                line_end = content.find("\n", end)
+                title = content[end : len(content) if line_end == -1 else line_end]
+                title = title.rstrip(" \t")
+                new_tag = new_by_lower.get(title.lower())
+                if new_tag is None:
+                    continue
+                start, end = end, end + len(title)
+                replacement = new_tag
+            elif token.kind in (REFERENCE, DEFINITION):
+                new_tag = new_by_lower.get(token.value.lower())
+                if new_tag is None:
+                    continue
+                if token.kind == REFERENCE:
+                    replacement = f"[{new_tag}][{new_tag}]"
+                else:
+                    definitions.append((len(parts) + 1, new_tag))
+                    replacement = content[start:end]
+            else:
+                continue
+            parts.append(content[pos:start])
+            parts.append(replacement)
+            pos = end
+        parts.append(content[pos:])
+        count("regex_passes")
+
+        if renamed_in_file:
+            tag_paths = get_tag_headers(renamed_in_file, "".join(parts), rel_path)
+            for new_tag in renamed_in_file:
+                tag_index.add_definition(new_tag, rel_path, tag_paths[new_tag])
+        patched[rel_path] = (content, parts, definitions)
+
+    for rel_path, (content, parts, definitions) in patched.items():
+        taglink = _index_taglink(tag_index, rel_path)
+        for i, new_tag in definitions:
+            path = taglink(new_tag)
+            parts[i] = "" if path is None else f"[{new_tag}]: {path} (autolink)"
+        modified_content = "".join(parts)
+        if modified_content == content:
+            continue
+        file_path = os.path.join(directory_path, rel_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(modified_content)
+        count_write(modified_content)
+        documents.put(file_path, modified_content)
+    laps.next("save")
 
-    # Final Saves
     tag_index.save()
-    with open(linklist_path, "w", encoding="utf-8") as f:
-        f.write(linklist_content)
+    save_linklist(directory_path, tag_index, old_links)
+    laps.stop()
+    return True
 
 
 def rename_tag(directory_path: str, old_tag: str, new_tag: str) -> None:
     """
     Renames a tag and updates all occurrences and references across the project.
     """
-    tag_index = TagIndex(directory_path)
+    rename_tags(directory_path, {old_tag: new_tag})
 
-    # Check if the old tag exists and the new one doesn't
-    if old_tag not in tag_index.get_all_tags():
-        print(f"Error: Tag '{old_tag}' not found in the index.")
+
+def convert_index(path: str, backend: str) -> None:
+    """
+    Moves the index of a directory to another storage backend ("json",
+    "sqlite" or "sharded"). The previous index is removed once the new one
+    is written.
+    """
+    source = TagIndex(path)
+    if source.backend == backend:
+        print(f"Index is already stored as {backend}.")
         return
-    if new_tag in tag_index.get_all_tags():
-        print(f"Error: Tag '{new_tag}' already exists. Cannot rename.")
+    if not os.path.exists(source.index_file_path):
+        print(f"Error: no index found in {path}")
         return
+    target = TagIndex(path, backend=backend)
+    target.import_index(source)
+    target.save()
+    target.close()
+    source.remove()
 
-    # Identify all relevant files
-    defining_files = tag_index.get_defining_files(old_tag).keys()
-    referenced_files = tag_index.get_referenced_files(old_tag)
 
-    files_to_update = sorted(defining_files | referenced_files)
+def watch_directory(
+    path: str, debounce: float = 0.5, interval: float = 1.0, polling: bool = False
+) -> None:
+    """
+    Watches a directory and relinks changed files until interrupted.
+    The TagIndex and the compiled linkers stay in memory between batches.
+    """
+    watch = DirectoryWatch(path, debounce=debounce, interval=interval, polling=polling)
 
-    if not files_to_update:
-        print(f"No files found containing or referencing tag '{old_tag}'.")
-        return
+    def report(names: list[str], timings: dict[str, float]) -> None:
+        print(f"Updated {', '.join(names)} in {sum(timings.values()):.3f}s")
 
-    # Update TagIndex
-    tag_index.rename_tag_in_index(old_tag, new_tag)
-    # Update file contents
-    eo_tag = re.escape(old_tag)
-    for rel_path in files_to_update:
-        file_path = os.path.join(directory_path, rel_path)
-        if not os.path.exists(file_path):
-            continue
+    try:
+        watch.run(report)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watch.close()
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
 
-        # Replace tag in headers, and reference links
-        modified_content = content
-        modified_content = re.sub(
-            rf"# {eo_tag}",
-            f"# {new_tag}",
-            modified_content,
-            flags=re.IGNORECASE,
-        )
-        # modified_content = re.sub(
-        #     rf"\[\[{eo_tag}\]\]",
-        #     f"[[{new_tag}]]",
-        #     modified_content,
-        #     flags=re.IGNORECASE,
-        # )
-        modified_content = re.sub(
-            rf"\[{eo_tag}\]\[{eo_tag}\]",
-            f"[{new_tag}][{new_tag}]",
-            modified_content,
-            flags=re.IGNORECASE,
-        )
-        modified_content = re.sub(
-            rf"^\s*\[{eo_tag}\]: .*$",  # Match [old_tag]: ...\n
-            "",
-            modified_content,
-            flags=re.MULTILINE | re.IGNORECASE,
-        )
-
-        # Update tags in the [tags]:# comment
-        tags_in_file = get_tags_from_comment(modified_content)
-        if old_tag in tags_in_file:
-            tags_in_file.remove(old_tag)
-            tags_in_file.add(new_tag)
-            tag_index.add_definition(
-                new_tag,
-                rel_path,
-                get_tag_headers(set(new_tag), modified_content, rel_path)[new_tag],
-            )
-        modified_content = re.sub(rf"\[tags\]:# \((.*)\)", "", modified_content)
-        modified_content = add_tags(tags_in_file, modified_content)
-        modified_content = add_links_from_index(modified_content, tag_index)
+def serve_directory(path: str, socket_path: Optional[str] = None) -> None:
+    """
+    Serves JSON-RPC requests for a directory on stdin/stdout, or on a Unix
+    socket if `socket_path` is given, until shutdown or end of input.
+    """
+    from .server import AutolinkServer, serve_stdio, serve_unix
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(modified_content)
-    # Update the linklist
-    linklist_path = os.path.join(directory_path, "linklist.md")
-    if os.path.exists(linklist_path):
-        with open(linklist_path, "r", encoding="utf-8") as f:
-            linklist_content = f.read()
-        linklist_content = re.sub(
-            rf"\[{re.escape(old_tag)}\]\(.*?\); \n\n",
-            f"[{new_tag}]({sorted(tag_index.get_defining_files(new_tag).values())[0]}); \n\n",
-            linklist_content,
-            flags=re.IGNORECASE,
-        )
-        linklist_content = re.sub(
-            r"^(?<!\S| )\[tags\]:# \((.*)\)\n", "", linklist_content
-        )
-        print(linklist_content)
-        linklist_content = add_tags(tag_index.get_all_tags(), linklist_content)
-        with open(linklist_path, "w", encoding="utf-8") as f:
-            f.write(linklist_content)
-
-    # Re-run a full update for consistency
-    # for file in files_to_update:
-    #     update_tags_on_file(os.path.join(directory_path, file))
-    tag_index.save()
+    server = AutolinkServer(path)
+    # stdout carries the responses, status goes to stderr
+    print(f"Serving directory: {path}", file=sys.stderr)
+    try:
+        if socket_path is None:
+            serve_stdio(server)
+        else:
+            serve_unix(server, socket_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
 
 
 def terminal_operation(argv=None) -> None:
@@ -671,10 +1345,33 @@ def terminal_operation(argv=None) -> None:
     subparsers = parser.add_subparsers(
         dest="command", required=True, help="Available commands"
     )
+    # instrumentation options shared by the one-shot commands
+    instrument_parser = argparse.ArgumentParser(add_help=False)
+    instrument_parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print the time of each phase and the file and regex counters.",
+    )
+    instrument_parser.add_argument(
+        "--profile",
+        type=str,
+        metavar="FILE",
+        help="write cProfile stats of the command to FILE.",
+    )
+    instrument_parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="print the top allocations traced by tracemalloc.",
+    )
+    instrument_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print the timings and allocations as JSON.",
+    )
 
     # 'init' command
     init_parser = subparsers.add_parser(
-        "init", help="Initialize a directory from scratch."
+        "init", help="Initialize a directory from scratch.", parents=[instrument_parser]
     )
     init_parser.add_argument(
         "path",
@@ -683,10 +1380,30 @@ def terminal_operation(argv=None) -> None:
         nargs="?",
         help="Directory path to initialize.",
     )
+    init_parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="reprocess all files, even unchanged ones.",
+    )
+    init_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes, 0 uses one per CPU.",
+    )
 
     # 'update' command
     update_parser = subparsers.add_parser(
-        "update", help="Update tags and links for a file or directory."
+        "update",
+        help="Update tags and links for a file or directory.",
+        parents=[instrument_parser],
+    )
+    update_parser.add_argument(
+        "--optimistic",
+        action="store_true",
+        help="lock the index only while saving and merge concurrent updates.",
     )
     update_parser.add_argument(
         "path",
@@ -697,7 +1414,9 @@ def terminal_operation(argv=None) -> None:
     )
 
     rename_parser = subparsers.add_parser(
-        "rename", help="rename tags and links for a directory."
+        "rename",
+        help="rename tags and links for a directory.",
+        parents=[instrument_parser],
     )
     rename_parser.add_argument(
         "-o",
@@ -711,6 +1430,12 @@ def terminal_operation(argv=None) -> None:
         type=str,
         help="new tag",
     )
+    rename_parser.add_argument(
+        "-m",
+        "--map",
+        type=str,
+        help="CSV file of old,new tag pairs to rename in one pass",
+    )
 
     rename_parser.add_argument(
         "path",
@@ -720,36 +1445,301 @@ def terminal_operation(argv=None) -> None:
         help="directory path to rename tags in.",
     )
 
+    convert_parser = subparsers.add_parser(
+        "convert",
+        help="store the tag index with another backend.",
+        parents=[instrument_parser],
+    )
+    convert_parser.add_argument(
+        "-b",
+        "--backend",
+        choices=TagIndex.BACKENDS,
+        required=True,
+        help="backend to store the index with.",
+    )
+    convert_parser.add_argument(
+        "path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="directory path of the index.",
+    )
+
+    gc_parser = subparsers.add_parser(
+        "gc",
+        help="remove tags that are no longer defined and unlink them.",
+        parents=[instrument_parser],
+    )
+    gc_parser.add_argument(
+        "path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="directory path of the index.",
+    )
+
+    query_parser = subparsers.add_parser(
+        "query", help="answer a question about the tags from the index alone."
+    )
+    query_parser.add_argument(
+        "question",
+        choices=QUESTIONS,
+        help="backlinks or cooccurring of --tag, unreferenced or undefined "
+        "tags, or the top most referenced tags.",
+    )
+    query_parser.add_argument(
+        "-t", "--tag", type=str, help="tag of backlinks and cooccurring."
+    )
+    query_parser.add_argument(
+        "-n",
+        "--limit",
+        type=int,
+        help="number of tags of top and cooccurring, top defaults to 10.",
+    )
+    query_parser.add_argument(
+        "--format",
+        choices=("text", "json"),
+        default="text",
+        help="print the result as lines of text or as JSON.",
+    )
+    query_parser.add_argument(
+        "path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="directory path of the index.",
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="keep relinking a directory while its files change."
+    )
+    watch_parser.add_argument(
+        "-d",
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="seconds without changes before a batch is processed.",
+    )
+    watch_parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=1.0,
+        help="seconds between scans when polling.",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="poll the directory instead of using inotify.",
+    )
+    watch_parser.add_argument(
+        "path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="directory path to watch.",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="answer JSON-RPC requests for a directory."
+    )
+    serve_parser.add_argument(
+        "-s",
+        "--socket",
+        type=str,
+        help="listen on this Unix socket instead of stdin/stdout.",
+    )
+    serve_parser.add_argument(
+        "path",
+        type=str,
+        default=".",
+        nargs="?",
+        help="directory path to serve.",
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="time the operations on a generated vault."
+    )
+    bench_parser.add_argument(
+        "--files", type=int, default=100, help="number of notes in the vault."
+    )
+    bench_parser.add_argument(
+        "--tags", type=int, default=200, help="number of distinct tags."
+    )
+    bench_parser.add_argument(
+        "--size", type=int, default=2000, help="characters of prose per note."
+    )
+    bench_parser.add_argument(
+        "--headers", type=int, default=2, help="headers per note."
+    )
+    bench_parser.add_argument(
+        "--wikilinks", type=int, default=2, help="wikilinks per note."
+    )
+    bench_parser.add_argument(
+        "--density",
+        type=float,
+        default=0.05,
+        help="share of words that mention a tag.",
+    )
+    bench_parser.add_argument(
+        "--directories",
+        type=int,
+        default=0,
+        help="spread the notes over this many subdirectories.",
+    )
+    bench_parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the vault generator."
+    )
+    bench_parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="runs per scenario."
+    )
+    bench_parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=("init", "update_file", "update_directory", "rename", "link"),
+        help="scenario to run, may be repeated; all by default.",
+    )
+    bench_parser.add_argument(
+        "-o", "--output", type=str, help="write the results to this JSON file."
+    )
+    bench_parser.add_argument(
+        "-c",
+        "--compare",
+        type=str,
+        help="baseline JSON file to check the results against.",
+    )
+    bench_parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="slowdown of a median that counts as regression, 0.2 = 20%%.",
+    )
+
     args = parser.parse_args(argv)
+    if args.command == "bench":
+        from .bench import VaultSpec, bench
+
+        spec = VaultSpec(
+            files=args.files,
+            tags=args.tags,
+            size=args.size,
+            headers=args.headers,
+            wikilinks=args.wikilinks,
+            link_density=args.density,
+            directories=args.directories,
+            seed=args.seed,
+        )
+        regressions = bench(
+            spec, args.scenario, args.repeat, args.output, args.compare, args.threshold
+        )
+        if regressions:
+            sys.exit(1)
+        return
+    with instrumented(
+        timings=getattr(args, "timings", False),
+        profile=getattr(args, "profile", None),
+        trace_memory=10 if getattr(args, "trace_memory", False) else 0,
+        as_json=getattr(args, "json", False),
+    ):
+        _run_command(args)
+
+
+def _run_command(args: argparse.Namespace) -> None:
+    """Executes a parsed command other than 'bench'."""
     path = os.path.realpath(args.path)
 
     if args.command == "init":
         if os.path.isdir(path):
             print(f"Initializing directory: {path}")
-            initialize_tagging(path)
+            initialize_tagging(path, force=args.force, jobs=args.jobs)
         else:
             print("Error: 'init' command requires a directory path.")
             return
     elif args.command == "update":
         if os.path.isfile(path):
             print(f"Updating file: {path}")
-            update_tags_on_file(path)
+            update_tags_on_file(path, optimistic=args.optimistic)
         elif os.path.isdir(path):
             print(f"Updating all files in directory: {path}")
-            for name in os.listdir(path):
-                file_path = os.path.join(path, name)
-                if (
-                    os.path.isfile(file_path)
-                    and os.path.splitext(file_path)[1].lower() == ".md"
-                    and not file_path.endswith("linklist.md")
-                ):
-                    print(f"  - Updating {name}")
-                    update_tags_on_file(file_path)
+            root = find_vault_root(path)
+            file_paths = []
+            for rel_path in sorted(
+                walk_vault(root, "" if path == root else vault_path(root, path))
+            ):
+                print(f"  - Updating {rel_path}")
+                file_paths.append(os.path.join(root, rel_path))
+            timings = update_tags_on_files(
+                root, file_paths, optimistic=args.optimistic
+            )
+            # the instrumentation report covers the phases otherwise
+            if not (args.timings or args.json):
+                print(
+                    "Timings: "
+                    + ", ".join(
+                        f"{phase} {seconds:.3f}s" for phase, seconds in timings.items()
+                    )
+                )
         else:
             print(f"Error: Path not found - {path}")
     elif args.command == "rename":
-        rename_tag(args.path, args.old, args.new)
-        print(f"Successfully renamed tag '{args.old}' to '{args.new}'.")
+        if args.map:
+            try:
+                mapping = read_rename_map(args.map)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                return
+            if rename_tags(args.path, mapping):
+                print(f"Successfully renamed {len(mapping)} tags.")
+        elif args.old is None or args.new is None:
+            print("Error: 'rename' needs --old and --new, or --map.")
+        else:
+            rename_tag(args.path, args.old, args.new)
+            print(f"Successfully renamed tag '{args.old}' to '{args.new}'.")
+    elif args.command == "convert":
+        print(f"Converting index in {path} to {args.backend}")
+        convert_index(path, args.backend)
+    elif args.command == "gc":
+        if not os.path.isdir(path):
+            print("Error: 'gc' command requires a directory path.")
+            return
+        dead_tags = collect_garbage(path)
+        if dead_tags:
+            tags = ", ".join(sorted(dead_tags))
+            print(f"Removed {len(dead_tags)} dead tags: {tags}")
+        else:
+            print("No dead tags found.")
+    elif args.command == "query":
+        if not TagIndex.exists(path):
+            print(f"Error: no index found in {path}")
+            return
+        tag_index = TagIndex(path)
+        try:
+            result = query_index(tag_index, args.question, args.tag, args.limit)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        finally:
+            tag_index.close()
+        output = format_result(args.question, result, as_json=args.format == "json")
+        if output:
+            print(output)
+    elif args.command == "watch":
+        if os.path.isdir(path):
+            print(f"Watching directory: {path}")
+            watch_directory(
+                path,
+                debounce=args.debounce,
+                interval=args.interval,
+                polling=args.poll,
+            )
+        else:
+            print("Error: 'watch' command requires a directory path.")
+    elif args.command == "serve":
+        if not os.path.isdir(path):
+            print("Error: 'serve' command requires a directory path.")
+            return
+        serve_directory(path, args.socket)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,295 @@
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from .tag_index import TagIndex
+from .vault import walk_vault
+
+
+# version of the JSON result layout
+RESULTS_VERSION = 1
+SYLLABLES = "ka lo mi ne ru sa to vi pe da go hu ri ze bo fa li mo nu te".split()
+
+
+@dataclass
+class VaultSpec:
+    """Shape of a synthetic vault; the same spec and seed give the same files."""
+
+    files: int = 100
+    tags: int = 200
+    # approximate characters of prose per file
+    size: int = 2000
+    # headers per file, each defines a tag
+    headers: int = 2
+    # [[wikilinks]] per file
+    wikilinks: int = 2
+    # share of words that are mentions of a tag
+    link_density: float = 0.05
+    # files are spread over this many subdirectories, 0 keeps them flat
+    directories: int = 0
+    seed: int = 0
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def generate_vault(path: str, spec: VaultSpec) -> list[str]:
+    """
+    Writes a synthetic vault of Markdown files to `path` and returns their
+    paths relative to it. Tags are made-up two-word names; headers define
+    them, the prose mentions them at `link_density` and wikilinks refer to
+    them, so every file links to several others.
+    """
+    rng = random.Random(spec.seed)
+    tags: list[str] = []
+    seen = set()
+    while len(tags) < spec.tags:
+        tag = f"{_word(rng).capitalize()} {_word(rng)}"
+        if tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    names = []
+    for i in range(spec.files):
+        name = f"note_{i:05d}.md"
+        if spec.directories:
+            name = f"dir_{i % spec.directories:03d}/{name}"
+        names.append(name)
+    for i, name in enumerate(names):
+        lines = []
+        for h in range(spec.headers):
+            # every tag gets a defining header somewhere, if there are enough
+            tag = tags[(i * spec.headers + h) % len(tags)]
+            lines.append(f"{'#' * (1 + h % 3)} {tag}\n")
+            lines.append(_prose(rng, tags, spec.size // max(spec.headers, 1), spec))
+        for _ in range(spec.wikilinks):
+            lines.append(f"See [[{rng.choice(tags)}]].\n")
+        file_path = os.path.join(path, name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return names
+
+
+def _prose(rng: random.Random, tags: list[str], size: int, spec: VaultSpec) -> str:
+    words = []
+    length = 0
+    while length < size:
+        if rng.random() < spec.link_density:
+            word = rng.choice(tags)
+        else:
+            word = _word(rng)
+        words.append(word)
+        length += len(word) + 1
+        if rng.random() < 0.1:
+            words[-1] += ".\n" if rng.random() < 0.3 else "."
+    return " ".join(words) + "\n"
+
+
+def _edit(file_path: str, text: str) -> None:
+    with open(file_path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+class Benchmark:
+    """
+    Times the autolink operations on copies of one synthetic vault.
+    Every run starts from a fresh copy, initialized unless the scenario
+    measures initialization itself; only the operation is timed.
+    """
+
+    SCENARIOS = ("init", "update_file", "update_directory", "rename", "link")
+
+    def __init__(self, spec: VaultSpec, workdir: str):
+        self.spec = spec
+        self.workdir = workdir
+        self.template = os.path.join(workdir, "template")
+        self.names = generate_vault(self.template, spec)
+        self.initialized = os.path.join(workdir, "initialized")
+        shutil.copytree(self.template, self.initialized)
+        self._quiet(self._init, self.initialized)
+        self._runs = 0
+
+    @staticmethod
+    def _quiet(function: Callable, *args) -> Any:
+        # the operations print progress, which would distort the timings
+        with redirect_stdout(io.StringIO()):
+            return function(*args)
+
+    @staticmethod
+    def _init(path: str) -> None:
+        from .autolink import initialize_tagging
+
+        initialize_tagging(path)
+
+    def _copy(self, source: str) -> str:
+        self._runs += 1
+        target = os.path.join(self.workdir, f"run_{self._runs}")
+        shutil.copytree(source, target)
+        return target
+
+    def run(self, scenario: str) -> float:
+        """Runs a scenario once and returns its seconds."""
+        if scenario not in self.SCENARIOS:
+            raise ValueError(f"unknown scenario: {scenario}")
+        from .autolink import (
+            add_links_from_index,
+            rename_tag,
+            update_tags_on_file,
+            update_tags_on_files,
+        )
+
+        if scenario == "init":
+            path = self._copy(self.template)
+            operation, args = self._init, (path,)
+        else:
+            path = self._copy(self.initialized)
+        if scenario == "update_file":
+            file_path = os.path.join(path, self.names[0])
+            _edit(file_path, "\n# Fresh benchmark tag\n")
+            operation, args = update_tags_on_file, (file_path,)
+        elif scenario == "update_directory":
+            # a tenth of the files changed, as after a pull
+            file_paths = [os.path.join(path, name) for name in self.names]
+            step = max(len(file_paths) // 10, 1)
+            for i, file_path in enumerate(file_paths[::step]):
+                _edit(file_path, f"\n# Pulled tag {i}\n")
+            operation, args = update_tags_on_files, (path, file_paths)
+        elif scenario == "rename":
+            tag_index = TagIndex(path)
+            old_tag = max(
+                tag_index.get_all_tags(),
+                key=lambda tag: (len(tag_index.get_referenced_files(tag)), tag),
+            )
+            tag_index.close()
+            operation, args = rename_tag, (path, old_tag, old_tag + " renamed")
+        elif scenario == "link":
+            tag_index = TagIndex(path)
+            texts = []
+            for name in walk_vault(path):
+                with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                    texts.append((f.read(), name))
+
+            def operation():
+                for text, name in texts:
+                    add_links_from_index(text, tag_index, name)
+
+            args = ()
+        start = time.perf_counter()
+        self._quiet(operation, *args)
+        seconds = time.perf_counter() - start
+        shutil.rmtree(path)
+        return seconds
+
+
+def run_benchmarks(
+    spec: VaultSpec,
+    scenarios: Optional[Iterable[str]] = None,
+    repeat: int = 3,
+    directory: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Runs each scenario `repeat` times on the vault described by `spec`
+    and returns the results as a JSON-serializable dict.
+    The vaults are created in a temporary directory below `directory`,
+    the system's temporary directory by default.
+    """
+    scenarios = list(scenarios or Benchmark.SCENARIOS)
+    results: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(
+        prefix="autolink-bench-", dir=directory
+    ) as workdir:
+        benchmark = Benchmark(spec, workdir)
+        for scenario in scenarios:
+            runs = [benchmark.run(scenario) for _ in range(repeat)]
+            results[scenario] = {
+                "median": statistics.median(runs),
+                "min": min(runs),
+                "runs": runs,
+            }
+    return {
+        "version": RESULTS_VERSION,
+        "spec": asdict(spec),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare_results(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.2
+) -> list[str]:
+    """
+    Returns a message for every scenario whose median got slower than the
+    baseline by more than `threshold` (0.2 = 20%).
+    """
+    regressions = []
+    if baseline.get("spec") != current.get("spec"):
+        regressions.append("baseline was measured on a different vault spec")
+    for scenario, result in current["results"].items():
+        before = baseline.get("results", {}).get(scenario)
+        if before is None:
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{scenario}: {before['median']:.3f}s -> {result['median']:.3f}s"
+                f" ({ratio - 1:+.0%})"
+            )
+    return regressions
+
+
+def format_results(results: dict[str, Any]) -> str:
+    lines = [f"{'scenario':<18}{'median':>10}{'min':>10}"]
+    for scenario, result in results["results"].items():
+        lines.append(
+            f"{scenario:<18}{result['median']:>9.3f}s{result['min']:>9.3f}s"
+        )
+    return "\n".join(lines)
+
+
+def load_results(file_path: str) -> dict[str, Any]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results: dict[str, Any], file_path: str) -> None:
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def bench(
+    spec: VaultSpec,
+    scenarios: Optional[Iterable[str]] = None,
+    repeat: int = 3,
+    output: Optional[str] = None,
+    baseline: Optional[str] = None,
+    threshold: float = 0.2,
+) -> list[str]:
+    """
+    Runs the benchmarks and prints their results, writes them to `output`
+    as JSON and compares them against the `baseline` results file if given.
+    Returns the regressions found.
+    """
+    results = run_benchmarks(spec, scenarios, repeat)
+    print(format_results(results))
+    if output is not None:
+        save_results(results, output)
+        print(f"Results written to {output}")
+    if baseline is None:
+        return []
+    regressions = compare_results(load_results(baseline), results, threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if not regressions:
+        print(f"No regressions against {baseline}")
+    return regressions
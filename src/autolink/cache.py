@@ -0,0 +1,158 @@
+import os
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import Any, Optional
+
+from .instrument import count, count_read
+from .lexer import extract_tags, referenced_names, tokenize
+from .sections import SectionMap, reference_locations
+from .tag_index import RACY_WINDOW_NS, content_hash
+
+
+class Document:
+    """
+    A note as read from or written to disk. The values derived from its
+    text are computed on first use and kept with it: the tags it defines,
+    its header sections and its references.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # rel_path -> (reference names, reference locations)
+        self._references: dict[str, tuple[set[str], list[list]]] = {}
+
+    @cached_property
+    def hash(self) -> str:
+        return content_hash(self.text)
+
+    @cached_property
+    def tags(self) -> set[str]:
+        """The tags of the headers, wikilinks and [tags]:# comment."""
+        count("regex_passes")
+        return extract_tags(tokenize(self.text))
+
+    @cached_property
+    def sections(self) -> SectionMap:
+        return SectionMap(self.text)
+
+    def references(self, rel_path: str) -> tuple[set[str], list[list]]:
+        """
+        The names of the [x][x] and [[x]] references of the text and the
+        locations of its [x][x] references in the file at `rel_path`, found
+        with one scan.
+        """
+        if rel_path not in self._references:
+            tokens = list(tokenize(self.text))
+            self._references[rel_path] = (
+                referenced_names(tokens),
+                reference_locations(self.text, rel_path, self.sections, tokens),
+            )
+        return self._references[rel_path]
+
+
+class DocumentCache:
+    """
+    Keeps the parsed documents of recently used files, so that a long-running
+    process does not read and parse an unchanged note again.
+    An entry is valid while the file has the size and mtime it had when the
+    entry was made; like TagIndex fingerprints, a file modified right around
+    that time is read once more and compared. The least recently used entries
+    are evicted beyond `max_entries` files or `max_bytes` bytes of files.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # path -> (size, mtime_ns, checked_ns, document), least recent first
+        self._entries: OrderedDict[str, tuple[int, int, int, Document]] = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, file_path: str) -> Document:
+        """Returns the document of a file, read from disk if not cached."""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        entry = self._entries.get(file_path)
+        text: Optional[str] = None
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            document = entry[3]
+            if stat.st_mtime_ns + RACY_WINDOW_NS < entry[2]:
+                self._hit(file_path)
+                return document
+            text = _read(file_path)
+            if text == document.text:
+                self._entries[file_path] = (*entry[:2], time.time_ns(), document)
+                self._hit(file_path)
+                return document
+        self.misses += 1
+        count("document_cache_misses")
+        if text is None:
+            text = _read(file_path)
+        document = Document(text)
+        self._store(file_path, stat, document)
+        return document
+
+    def put(self, file_path: str, text: str) -> Document:
+        """Caches the text just written to a file and returns its document."""
+        file_path = os.path.abspath(file_path)
+        document = Document(text)
+        self._store(file_path, os.stat(file_path), document)
+        return document
+
+    def discard(self, file_path: str) -> None:
+        entry = self._entries.pop(os.path.abspath(file_path), None)
+        if entry is not None:
+            self._bytes -= entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counts and the current size of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _hit(self, file_path: str):
+        self._entries.move_to_end(file_path)
+        self.hits += 1
+        count("document_cache_hits")
+
+    def _store(self, file_path: str, stat: os.stat_result, document: Document):
+        self.discard(file_path)
+        if stat.st_size > self.max_bytes:
+            return
+        self._entries[file_path] = (
+            stat.st_size,
+            stat.st_mtime_ns,
+            time.time_ns(),
+            document,
+        )
+        self._bytes += stat.st_size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[0]
+            self.evictions += 1
+
+
+def _read(file_path: str) -> str:
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    count_read(text)
+    return text
+
+
+# the cache of this process, shared by all operations
+documents = DocumentCache()
@@ -1,32 +1,45 @@
 import vscode
-from autolink.autolink import initialize_tagging, update_tags_on_file
+from autolink.server import BackendClient
 import os
 
 
+# backend process serving the workspace, started once by activate
+backend: BackendClient | None = None
+
+
 def activate(context: vscode.ExtensionContext):
     """
     This function is called when the extension is activated.
+    It starts one autolink backend for the workspace; commands and saves are
+    forwarded to it without waiting, so the editor is never blocked.
     """
+    global backend
+    workspace_folders = vscode.workspace.workspace_folders
+    if workspace_folders:
+        backend = BackendClient(workspace_folders[0].uri.fs_path)
 
     # Register a command to initialize tagging for the entire workspace.
     def init_command():
-        workspace_folders = vscode.workspace.workspace_folders
-        if workspace_folders:
-            workspace_path = workspace_folders[0].uri.fs_path
-            vscode.window.show_information_message(
-                f"Running autolink initialization on: {workspace_path}"
+        if backend is None:
+            vscode.window.show_warning_message(
+                "No workspace folder open to initialize autolink."
             )
-            try:
-                initialize_tagging(workspace_path)
+            return
+        vscode.window.show_information_message(
+            f"Running autolink initialization on: {workspace_folders[0].uri.fs_path}"
+        )
+
+        def on_done(future):
+            if future.exception() is None:
                 vscode.window.show_information_message(
                     "Autolink initialization complete!"
                 )
-            except Exception as e:
-                vscode.window.show_error_message(f"Autolink initialization failed: {e}")
-        else:
-            vscode.window.show_warning_message(
-                "No workspace folder open to initialize autolink."
-            )
+            else:
+                vscode.window.show_error_message(
+                    f"Autolink initialization failed: {future.exception()}"
+                )
+
+        backend.request("init").add_done_callback(on_done)
 
     context.subscriptions.append(
         vscode.commands.register_command("autolink.initialize", init_command)
@@ -34,21 +47,28 @@ def activate(context: vscode.ExtensionContext):
 
     # Register a listener for when a Markdown document is saved.
     def on_save_handler(document: vscode.TextDocument):
-        if document.language_id == "markdown" and not document.file_name.endswith(
-            "linklist.md"
+        if (
+            backend is None
+            or document.language_id != "markdown"
+            or document.file_name.endswith("linklist.md")
         ):
-            file_path = document.uri.fs_path
-            vscode.window.set_status_bar_message(
-                f"Autolink: Updating tags for {os.path.basename(file_path)}...", 2000
-            )
-            try:
-                update_tags_on_file(file_path)
+            return
+        file_path = document.uri.fs_path
+        vscode.window.set_status_bar_message(
+            f"Autolink: Updating tags for {os.path.basename(file_path)}...", 2000
+        )
+
+        def on_done(future):
+            if future.exception() is None:
                 vscode.window.set_status_bar_message("Autolink: Update complete!", 2000)
-            except Exception as e:
+            else:
                 vscode.window.show_error_message(
-                    f"Autolink failed for {os.path.basename(file_path)}: {e}"
+                    f"Autolink failed for {os.path.basename(file_path)}: "
+                    f"{future.exception()}"
                 )
 
+        backend.request("update", {"paths": [file_path]}).add_done_callback(on_done)
+
     context.subscriptions.append(
         vscode.workspace.on_did_save_text_document(on_save_handler)
     )
@@ -59,5 +79,9 @@ def activate(context: vscode.ExtensionContext):
 def deactivate():
     """
     This function is called when the extension is deactivated.
+    It stops the backend.
     """
-    pass
+    global backend
+    if backend is not None:
+        backend.close()
+        backend = None
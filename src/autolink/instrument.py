@@ -0,0 +1,241 @@
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+
+class Recorder:
+    """
+    Collects named spans and counters while it is active.
+    A span opened inside another one is recorded under the joined name,
+    e.g. "update_tags_on_files/load"; spans with the same name add up.
+    Only the process that records sees the spans, worker processes of
+    `initialize_tagging(jobs=N)` are not included.
+    """
+
+    def __init__(self):
+        # name -> [seconds, calls], in the order the spans were first opened
+        self.spans: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self._stack: list[str] = []
+
+    def open(self, name: str) -> str:
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        self.spans.setdefault(path, [0.0, 0])
+        return path
+
+    def close(self, path: str, seconds: float):
+        # spans left open inside this one, e.g. by an exception, end with it
+        del self._stack[path.count("/") :]
+        entry = self.spans[path]
+        entry[0] += seconds
+        entry[1] += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "spans": {
+                path: {"seconds": seconds, "calls": calls}
+                for path, (seconds, calls) in self.spans.items()
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def format(self) -> str:
+        lines = ["Timings:"]
+        for path, (seconds, calls) in self.spans.items():
+            depth = path.count("/")
+            name = "  " * depth + path.rsplit("/", 1)[-1]
+            line = f"  {name:<40}{seconds:>9.3f}s"
+            if calls > 1:
+                line += f"  ({calls} calls)"
+            lines.append(line)
+        if self.counters:
+            lines.append("Counters:")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"  {name:<40}{value:>10}")
+        return "\n".join(lines)
+
+
+# the active recorder, spans and counters cost a check while there is none
+_recorder: Optional[Recorder] = None
+
+
+class Span:
+    """Handle of an open span; `seconds` is set when it closes."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    """Times the enclosed block as the span `name`."""
+    recorder = _recorder
+    handle = Span(name)
+    path = recorder.open(name) if recorder is not None else ""
+    start = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        handle.seconds = time.perf_counter() - start
+        if recorder is not None:
+            recorder.close(path, handle.seconds)
+
+
+def timed(name: str) -> Callable:
+    """Decorator that times every call of a function as the span `name`."""
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Laps:
+    """
+    Times consecutive phases of a function without nesting its code:
+    each phase is a span that runs until `next` starts the following one
+    or `stop` ends it. `seconds` holds the time of every finished phase.
+    """
+
+    def __init__(self, name: str):
+        self.seconds: dict[str, float] = {}
+        self._name: Optional[str] = None
+        self.next(name)
+
+    def next(self, name: Optional[str] = None):
+        now = time.perf_counter()
+        if self._name is not None:
+            seconds = now - self._start
+            self.seconds[self._name] = self.seconds.get(self._name, 0.0) + seconds
+            if self._recorder is not None:
+                self._recorder.close(self._path, seconds)
+        self._name = name
+        if name is not None:
+            self._recorder = _recorder
+            if self._recorder is not None:
+                self._path = self._recorder.open(name)
+            self._start = time.perf_counter()
+
+    def stop(self):
+        self.next(None)
+
+
+def count(name: str, amount: int = 1):
+    """Adds `amount` to the counter `name`."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.counters[name] = recorder.counters.get(name, 0) + amount
+
+
+def count_read(text: str):
+    """Counts a file read with the given content."""
+    count("files_read")
+    count("chars_read", len(text))
+
+
+def count_write(text: str):
+    """Counts a file written with the given content."""
+    count("files_written")
+    count("chars_written", len(text))
+
+
+@contextmanager
+def recording() -> Iterator[Recorder]:
+    """Activates a new Recorder for the enclosed block."""
+    global _recorder
+    previous, _recorder = _recorder, Recorder()
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
+
+
+@contextmanager
+def profiling(file_path: str) -> Iterator[cProfile.Profile]:
+    """Profiles the enclosed block and dumps the stats to `file_path`."""
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(file_path)
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int) -> list[dict]:
+    """The `limit` source lines that hold the most memory in `snapshot`."""
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+@contextmanager
+def instrumented(
+    timings: bool = False,
+    profile: Optional[str] = None,
+    trace_memory: int = 0,
+    as_json: bool = False,
+) -> Iterator[None]:
+    """
+    Instruments the enclosed command as requested on the command line and
+    prints the report afterwards, as one JSON object if `as_json` is set:
+    - `timings` records spans and counters
+    - `profile` dumps cProfile stats to that file
+    - `trace_memory` lists that many top allocations found by tracemalloc
+    """
+    report: dict[str, Any] = {}
+    with recording() as recorder:
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            if profile:
+                with profiling(profile):
+                    yield
+            else:
+                yield
+        finally:
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                report["memory"] = {
+                    "peak": peak,
+                    "top": top_allocations(snapshot, trace_memory),
+                }
+    if timings:
+        report.update(recorder.as_dict())
+    if profile:
+        report["profile"] = profile
+    if not report:
+        return
+    if as_json:
+        print(json.dumps(report))
+        return
+    if timings:
+        print(recorder.format())
+    if trace_memory:
+        print(f"Memory: peak {report['memory']['peak'] / 1024:.1f} KiB")
+        for allocation in report["memory"]["top"]:
+            print(
+                f"  {allocation['location']:<60}"
+                f"{allocation['size'] / 1024:>10.1f} KiB"
+                f"{allocation['count']:>8} blocks"
+            )
+    if profile:
+        print(f"Profile written to {profile}")
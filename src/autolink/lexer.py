@@ -0,0 +1,146 @@
+import re
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+# token kinds
+TEXT = "text"
+CODE = "code"
+HEADER = "header"
+WIKILINK = "wikilink"
+REFERENCE = "reference"
+DEFINITION = "definition"
+COMMENT = "comment"
+
+
+class Token(NamedTuple):
+    """
+    A span of a Markdown text. `value` is the title of a header, the name of
+    a wikilink, reference or definition, the tag list of a [tags]:# comment
+    and, for a fenced code block that is still open at the end of the text,
+    its fence; otherwise it is empty.
+    A header token only covers the `#` marker and the space after it, the
+    rest of its line is tokenized as usual.
+    """
+
+    kind: str
+    start: int
+    end: int
+    value: str = ""
+
+
+TOKEN_RE = re.compile(
+    # every token starts with one of these, checked first to skip plain text fast
+    r"(?=[\[#`~ ])(?:"
+    # a fenced code block, up to its closing fence or the end of the text
+    r"^ {0,3}(?P<fence>`{3,}(?=[^`\n]*$)|~{3,})[^\n]*"
+    r"(?:\n(?s:.*?)(?P<close>^ {0,3}(?P=fence)[`~]*[ \t]*$)|(?s:.*)\Z)"
+    # inline code
+    r"|(?<!`)(?P<ticks>`+)(?!`)[^\n]*?(?<!`)(?P=ticks)(?!`)"
+    r"|(?-i:(?<!\S| )\[tags\]:# \((?P<comment>.*)\))"
+    r"|(?<!\S| )\[(?P<definition>[^\[\]\n]+)\]: .*"
+    r"|(?<!\S| )(?P<header>#{1,6} )(?=.)"
+    r"|\[\[(?P<wikilink>[^\[\]]*)\]\]"
+    r"|\[(?P<reference>[^\[\]\n]+)\]\[(?P=reference)\])",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _closing_fence(fence: str) -> re.Pattern:
+    return re.compile(rf"^ {{0,3}}{re.escape(fence)}[`~]*[ \t]*$", re.MULTILINE)
+
+
+def tokenize(text: str, pos: int = 0, fence: Optional[str] = None) -> Iterator[Token]:
+    """
+    Splits `text` from `pos` on into consecutive tokens in one scan: code
+    blocks and spans, headers, wikilinks, [name][name] references, link
+    definitions, [tags]:# comments and the plain text runs between them.
+    Nothing is recognized inside code. `fence` continues a fenced code block
+    that an earlier piece of the text left open.
+    """
+    if fence is not None:
+        m = _closing_fence(fence).search(text, pos)
+        if m is None:
+            yield Token(CODE, pos, len(text), fence)
+            return
+        yield Token(CODE, pos, m.end())
+        pos = m.end()
+    text_start = pos
+    # a header marker later on the line of another header is plain text
+    header_end = -1
+    for m in TOKEN_RE.finditer(text, pos):
+        kind = m.lastgroup
+        start, end = m.span()
+        if kind == "header":
+            if start < header_end:
+                continue
+            line_end = text.find("\n", end)
+            header_end = len(text) if line_end == -1 else line_end
+            line = text[start:header_end]
+            token = Token(HEADER, start, end, "".join(line.split("# ")[1:]))
+        elif kind in ("fence", "close"):
+            open_fence = m["fence"] if m["close"] is None else ""
+            token = Token(CODE, start, end, open_fence)
+        elif kind == "ticks":
+            token = Token(CODE, start, end)
+        else:
+            token = Token(kind, start, end, m[kind])
+        if text_start < start:
+            yield Token(TEXT, text_start, start)
+        yield token
+        text_start = end
+    if text_start < len(text):
+        yield Token(TEXT, text_start, len(text))
+
+
+class PieceLexer:
+    """
+    Tokenizes a text given in pieces that end at line ends, one piece at a
+    time; a fenced code block left open by a piece continues in the next.
+    """
+
+    def __init__(self):
+        self.fence: Optional[str] = None
+
+    def tokenize(self, piece: str) -> Iterator[Token]:
+        fence, self.fence = self.fence, None
+        for token in tokenize(piece, fence=fence):
+            self.fence = token.value if token.kind == CODE and token.value else None
+            yield token
+
+
+def comment_tags(taglist: str) -> set[str]:
+    """The tags of the tag list of a [tags]:# comment."""
+    tags = set(taglist.replace(", ", ",").split(","))
+    tags.discard("")
+    return tags
+
+
+def extract_tags(
+    tokens: Iterable[Token], kinds: tuple[str, ...] = (HEADER, WIKILINK, COMMENT)
+) -> set[str]:
+    """
+    The tags defined by the tokens of the given kinds: header titles,
+    wikilink names and the tags of the first [tags]:# comment.
+    """
+    tags: set[str] = set()
+    comment_found = False
+    for token in tokens:
+        if token.kind not in kinds:
+            continue
+        if token.kind != COMMENT:
+            tags.add(token.value)
+        elif not comment_found:
+            comment_found = True
+            tags.update(comment_tags(token.value))
+    return tags
+
+
+def referenced_names(tokens: Iterable[Token]) -> set[str]:
+    """The names used in [x][x] and single-line [[x]] references."""
+    return {
+        token.value
+        for token in tokens
+        if token.kind in (REFERENCE, WIKILINK)
+        and token.value
+        and "\n" not in token.value
+    }
@@ -0,0 +1,314 @@
+import re
+from functools import lru_cache
+from itertools import chain
+from typing import Callable, Iterable, Iterator, Optional
+
+from .instrument import count
+from .lexer import COMMENT, CODE, DEFINITION, REFERENCE, TEXT, WIKILINK, Token
+from .lexer import tokenize
+from .stream import lstrip_pieces, rstrip_pieces
+
+
+TAGS_LINE_RE = re.compile(r"^(?<!\S| )\[tags\]:# \((.*)\)$", re.MULTILINE)
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Builds a regex alternation for `words` shaped like a prefix trie.
+    At every position the pattern prefers the longest word, and matching
+    costs the length of the word instead of the number of words.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    branches = [
+        re.escape(char) + _node_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1:
+        pattern = branches[0]
+    else:
+        pattern = "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+class Linker:
+    """
+    Links a fixed set of tags in Markdown text.
+    The text is split into tokens by the lexer in one scan; only plain text
+    runs are searched for tag mentions, with one compiled pattern, while the
+    [tags]:# comment, stale (autolink) definitions, [tag][tag] references
+    and [[tag]] wikilinks are rewritten from their tokens and code is kept
+    as it is.
+    """
+
+    def __init__(self, tags: Iterable[str]):
+        # case-insensitive lookup, the alphabetically first spelling wins
+        self.canonical: dict[str, str] = {}
+        for tag in sorted(tags):
+            self.canonical.setdefault(tag.lower(), tag)
+        self.tag_pattern: Optional[re.Pattern] = None
+        if self.canonical:
+            alt = trie_pattern(self.canonical)
+            self.tag_pattern = re.compile(
+                rf"(?<!#)(?<!# )(?<!\(|\[)\b(?:{alt})(?![a-z,][ \)][\)\n]|\.md)",
+                re.IGNORECASE,
+            )
+        # a [tag][tag] reference spans twice the lines of its tag
+        self.carry_lines = 2 * max(
+            (tag.count("\n") for tag in self.canonical), default=0
+        )
+
+    def mentions(self, text: str) -> bool:
+        """Tells whether linking `text` would reference at least one of the tags."""
+        count("regex_passes")
+        if self.tag_pattern is None:
+            return False
+        linked: set[str] = set()
+        for _ in self._link_tokens(text, tokenize(text), "", linked, _discard):
+            if linked:
+                return True
+        return False
+
+    def mentions_stream(self, pieces: Iterable[str]) -> bool:
+        """`mentions` for a text given in pieces that end at line ends."""
+        if self.tag_pattern is None:
+            return False
+        linked: set[str] = set()
+        for _ in self._link_pieces(pieces, "", linked, _discard):
+            if linked:
+                return True
+        return False
+
+    def link(self, text: str, taglink: Callable[[str], Optional[str]]) -> str:
+        """
+        Replaces tag occurrences with [tag][tag] references and appends a
+        `[tag]: path (autolink)` definition for every linked tag.
+        `taglink` maps a tag to the path it should point to.
+        """
+        text = text.strip()
+        m = TAGS_LINE_RE.match(text)
+        if not m:
+            return text  # Cannot proceed without a tags comment
+        tagstring = m.group(0)
+        parts: list[str] = []
+        linked: set[str] = set()
+        for _ in self._link_tokens(
+            text, tokenize(text), tagstring, linked, parts.append
+        ):
+            pass
+        body = "".join(parts)
+        count("regex_passes")
+        count("tags_linked", len(linked))
+
+        appendix = self._appendix(linked, taglink)
+        if not appendix:
+            return body
+        return body.strip() + "\n" + appendix
+
+    def _link_tokens(
+        self,
+        text: str,
+        tokens: Iterable[Token],
+        tagstring: str,
+        linked: set[str],
+        emit: Callable[[str], object],
+        stop: Optional[int] = None,
+    ) -> Iterator[tuple[int, Optional[str]]]:
+        """
+        Hands the linked text of `tokens` to `emit` and yields, after each
+        token, the position up to which the text is done and the fence of a
+        code block that is still open there.
+        With `stop`, tokens and mentions starting from there on are left for
+        later; a code block open at the end of the text ends at `stop`.
+        """
+        for token in tokens:
+            if stop is not None and token.start >= stop:
+                return
+            kind = token.kind
+            if kind == TEXT:
+                end = self._link_mentions(
+                    text, token.start, token.end, linked, emit, stop
+                )
+                yield end, None
+                continue
+            if kind == COMMENT:
+                emit(tagstring)
+            elif kind == DEFINITION:
+                # definitions written by the linker are replaced
+                if not text.endswith(" (autolink)", token.start, token.end):
+                    emit(text[token.start : token.end])
+            elif kind in (REFERENCE, WIKILINK):
+                tag = self.canonical.get(token.value.lower())
+                if tag is not None:
+                    linked.add(tag)
+                    emit(f"[{tag}][{tag}]")
+                elif kind == WIKILINK:
+                    emit("[[")
+                    self._link_mentions(
+                        text, token.start + 2, token.end - 2, linked, emit
+                    )
+                    emit("]]")
+                else:
+                    emit(text[token.start : token.end])
+            elif kind == CODE and token.value and stop is not None:
+                # the block goes on in the text that follows
+                emit(text[token.start : stop])
+                yield stop, token.value
+                return
+            else:
+                emit(text[token.start : token.end])
+            yield token.end, None
+
+    def _link_mentions(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        linked: set[str],
+        emit: Callable[[str], object],
+        stop: Optional[int] = None,
+    ) -> int:
+        """
+        Links the tag mentions in a plain text run and returns where the
+        emitted text ends; with `stop`, at the end of the last mention that
+        starts before it, but at least at `stop`.
+        """
+        pos = start
+        if self.tag_pattern is not None:
+            for match in self.tag_pattern.finditer(text, start, end):
+                if stop is not None and match.start() >= stop:
+                    break
+                emit(text[pos : match.start()])
+                tag = self.canonical.get(match.group(0).lower())
+                if tag is None:
+                    emit(match.group(0))
+                else:
+                    linked.add(tag)
+                    emit(f"[{tag}][{tag}]")
+                pos = match.end()
+        if stop is not None and stop < end:
+            end = max(pos, stop)
+        emit(text[pos:end])
+        return end
+
+    @staticmethod
+    def _appendix(linked: set[str], taglink: Callable[[str], Optional[str]]) -> str:
+        return "\n".join(
+            f"[{tag}]: {path} (autolink)"
+            for tag in sorted(linked)
+            if (path := taglink(tag)) is not None
+        )
+
+    def link_stream(
+        self,
+        pieces: Iterable[str],
+        taglink: Callable[[str], Optional[str]],
+        write: Callable[[str], object],
+    ) -> None:
+        """
+        Streaming variant of `link` for text that is too large to hold.
+        `pieces` has to split the text at line ends; the output is handed to
+        `write` piece by piece and equals what `link` returns for the text.
+        """
+        pieces = rstrip_pieces(lstrip_pieces(pieces))
+        first = next(pieces, "")
+        m = TAGS_LINE_RE.match(first)
+        if not m:
+            write(first)
+            for piece in pieces:
+                write(piece)
+            return
+        tagstring = m.group(0)
+        linked: set[str] = set()
+        # output whitespace is held back until something follows it,
+        # the body is stripped before an appendix
+        pending = ""
+
+        def emit(part: str):
+            nonlocal pending
+            stripped = part.rstrip()
+            if stripped:
+                write(pending + stripped)
+                pending = part[len(stripped) :]
+            else:
+                pending += part
+
+        for _ in self._link_pieces(chain([first], pieces), tagstring, linked, emit):
+            pass
+
+        count("tags_linked", len(linked))
+        appendix = self._appendix(linked, taglink)
+        if appendix:
+            write("\n" + appendix)
+        else:
+            write(pending)
+
+    def _link_pieces(
+        self,
+        pieces: Iterable[str],
+        tagstring: str,
+        linked: set[str],
+        emit: Callable[[str], object],
+    ) -> Iterator[None]:
+        """
+        Links a text given in pieces, yielding after each processed part.
+        Only the lines a token or mention can still extend into are kept
+        between pieces, and an open fenced code block is carried over.
+        """
+        context = ""
+        buffer = ""
+        fence: Optional[str] = None
+        for piece in chain(pieces, [None]):
+            if piece is not None:
+                buffer += piece
+                # process complete lines, keep the ones a match may span
+                cut = buffer.rfind("\n") + 1
+                for _ in range(self.carry_lines):
+                    if cut > 0:
+                        cut = buffer.rfind("\n", 0, cut - 1) + 1
+                if cut == 0:
+                    continue
+            else:
+                cut = len(buffer)
+            text = context + buffer
+            start = rest = len(context)
+            count("regex_passes")
+            fence_left = fence
+            fence = None
+            for rest, fence in self._link_tokens(
+                text,
+                tokenize(text, start, fence_left),
+                tagstring,
+                linked,
+                emit,
+                start + cut,
+            ):
+                pass
+            rest = max(rest, start)
+            # lookbehinds need a few characters before the rest
+            context = text[max(0, rest - 8) : rest]
+            buffer = text[rest:]
+            yield
+
+
+def _discard(part: str) -> None:
+    pass
+
+
+@lru_cache(maxsize=8)
+def get_linker(tags: frozenset[str]) -> Linker:
+    """Returns a compiled Linker for `tags`, reusing recently built ones."""
+    return Linker(tags)
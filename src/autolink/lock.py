@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import Optional
+
+from .instrument import count
+
+try:
+    import fcntl
+except ImportError:
+    # without fcntl (Windows) the lock only orders the threads of a process
+    fcntl = None
+
+
+class IndexLock:
+    """
+    An advisory exclusive lock on the index of a directory, taken with
+    fcntl.flock on a lock file next to it, so that processes which load,
+    change and save the same index take turns.
+    The lock is re-entrant: nested acquisitions by the thread holding it are
+    counted and only the outermost one locks the file. flock locks belong to
+    an open file, so a process has to use one instance per lock file, the one
+    returned by for_file.
+    """
+
+    _instances: dict[str, "IndexLock"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def for_file(cls, file_path: str) -> "IndexLock":
+        """Returns the lock of this process on a lock file."""
+        file_path = os.path.realpath(file_path)
+        with cls._instances_lock:
+            lock = cls._instances.get(file_path)
+            if lock is None:
+                lock = cls._instances[file_path] = cls(file_path)
+            return lock
+
+    @property
+    def held(self) -> bool:
+        return self._depth > 0
+
+    def acquire(self) -> None:
+        """Waits until no other process or thread holds the lock and takes it."""
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = _lock_file(self.file_path)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            # closing the file drops the flock
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "IndexLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def _lock_file(file_path: str) -> int:
+    fd = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            count("index_lock_waits")
+            fcntl.flock(fd, fcntl.LOCK_EX)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
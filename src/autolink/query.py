@@ -0,0 +1,82 @@
+import heapq
+import json
+from typing import Any, Optional
+
+from .instrument import timed
+from .tag_index import TagIndex
+
+
+QUESTIONS = ("backlinks", "unreferenced", "undefined", "top", "cooccurring")
+# questions that are about one tag
+TAG_QUESTIONS = ("backlinks", "cooccurring")
+
+
+def _ranked(counts: dict[str, int], limit: Optional[int]) -> list[list]:
+    """[tag, count] pairs, most frequent first, ties by tag."""
+    pairs = ([tag, n] for tag, n in counts.items() if n)
+    if limit is None:
+        return sorted(pairs, key=_rank)
+    return heapq.nsmallest(limit, pairs, key=_rank)
+
+
+def _rank(pair: list) -> tuple[int, str]:
+    return -pair[1], pair[0]
+
+
+@timed("query")
+def query_index(
+    tag_index: TagIndex,
+    question: str,
+    tag: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Any:
+    """
+    Answers a question about a vault from its index alone, without reading
+    any note. The result is plain JSON data:
+    - "backlinks": the sorted files referencing `tag`
+    - "unreferenced": the sorted tags that are defined but never referenced
+    - "undefined": the sorted files referencing each name no file defines
+    - "top": [tag, count] for the `limit` (10) most referenced tags
+    - "cooccurring": [tag, count] for the tags defined or referenced in the
+      files of `tag`, by the number of files they share with it
+    `tag` is matched case-insensitively if it is not indexed as written.
+    """
+    if question not in QUESTIONS:
+        raise ValueError(f"unknown question: {question}")
+    if question in TAG_QUESTIONS:
+        if tag is None:
+            raise ValueError(f"'{question}' needs a tag")
+        tags = tag_index.match_tags(tag)
+    if question == "backlinks":
+        files: set[str] = set()
+        for match in tags:
+            files.update(tag_index.get_referenced_files(match))
+        return sorted(files)
+    if question == "unreferenced":
+        return sorted(tag_index.get_unreferenced_tags())
+    if question == "undefined":
+        return {
+            name: sorted(files)
+            for name, files in sorted(tag_index.get_undefined_references().items())
+        }
+    if question == "top":
+        return _ranked(tag_index.get_reference_counts(), 10 if limit is None else limit)
+    shared: dict[str, int] = {}
+    for match in tags:
+        for other, n in tag_index.get_cooccurring_tags(match).items():
+            if other not in tags:
+                shared[other] = shared.get(other, 0) + n
+    return _ranked(shared, limit)
+
+
+def format_result(question: str, result: Any, as_json: bool = False) -> str:
+    """Renders the result of query_index as JSON or as lines of text."""
+    if as_json:
+        return json.dumps(result)
+    if question == "undefined":
+        return "\n".join(
+            f"{name}: {', '.join(files)}" for name, files in result.items()
+        )
+    if question in ("top", "cooccurring"):
+        return "\n".join(f"{n}\t{tag}" for tag, n in result)
+    return "\n".join(result)
@@ -0,0 +1,193 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, Optional
+
+
+class Interner:
+    """
+    Maps names to dense integer ids and back. Every name is held once,
+    ids stay valid for the lifetime of the interner.
+    """
+
+    __slots__ = ("names", "_ids")
+
+    def __init__(self):
+        self.names: list[str] = []
+        self._ids: dict[str, int] = {}
+
+    def id(self, name: str) -> int:
+        """Returns the id of a name, assigning a new one if needed."""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def find(self, name: str) -> Optional[int]:
+        """Returns the id of a name, or None if it was never interned."""
+        return self._ids.get(name)
+
+    def intern(self, name: str) -> str:
+        """Returns the one held copy of a name."""
+        return self.names[self.id(name)]
+
+    def __getitem__(self, name_id: int) -> str:
+        return self.names[name_id]
+
+
+def id_array(ids: Iterable[int] = ()) -> array:
+    """A sorted array of unique ids, the set type of the index records."""
+    return array("I", sorted(set(ids)))
+
+
+def add_id(ids: array, name_id: int) -> None:
+    position = bisect_left(ids, name_id)
+    if position == len(ids) or ids[position] != name_id:
+        ids.insert(position, name_id)
+
+
+def discard_id(ids: array, name_id: Optional[int]) -> None:
+    if name_id is None:
+        return
+    position = bisect_left(ids, name_id)
+    if position < len(ids) and ids[position] == name_id:
+        del ids[position]
+
+
+class TagRecord:
+    """
+    The index entry of a tag: the link target within every defining file
+    and the files referencing it, by file id.
+    """
+
+    __slots__ = ("defining_files", "referenced_by_files")
+
+    def __init__(self):
+        self.defining_files: dict[int, str] = {}
+        self.referenced_by_files = array("I")
+
+
+class FileRecord:
+    """
+    The index entry of a file: the tags it defines and references, by tag
+    id, and the fingerprint, extracted tags and reference locations stored
+    for it, None while there are none.
+    """
+
+    __slots__ = ("defines", "references", "tags", "fingerprint", "locations")
+
+    def __init__(self):
+        self.defines = array("I")
+        self.references = array("I")
+        self.tags: Optional[array] = None
+        self.fingerprint: Optional[dict[str, Any]] = None
+        self.locations: Optional[dict[str, Any]] = None
+
+
+class RecordCodec:
+    """
+    Converts index records to and from the layout of the index files, in
+    which tags and files are named. Names read in are interned, so each tag
+    and path is held once however many records mention it.
+    """
+
+    def __init__(self):
+        self.tags = Interner()
+        self.paths = Interner()
+
+    def tag_from_json(self, tag_info: dict[str, Any]) -> TagRecord:
+        record = TagRecord()
+        record.defining_files = {
+            self.paths.id(file_path): link
+            for file_path, link in tag_info.get("defining_files", {}).items()
+        }
+        record.referenced_by_files = id_array(
+            map(self.paths.id, tag_info.get("referenced_by_files", ()))
+        )
+        return record
+
+    def tag_to_json(self, record: TagRecord) -> dict[str, Any]:
+        paths = self.paths.names
+        return {
+            "defining_files": {
+                paths[file_id]: link for file_id, link in record.defining_files.items()
+            },
+            "referenced_by_files": sorted(
+                paths[file_id] for file_id in record.referenced_by_files
+            ),
+        }
+
+    def file_from_json(self, file_info: dict[str, Any]) -> FileRecord:
+        record = FileRecord()
+        record.defines = id_array(map(self.tags.id, file_info.get("defines", ())))
+        record.references = id_array(
+            map(self.tags.id, file_info.get("references", ()))
+        )
+        if "tags" in file_info:
+            record.tags = id_array(map(self.tags.id, file_info["tags"]))
+        record.fingerprint = file_info.get("fingerprint")
+        record.locations = file_info.get("locations")
+        return record
+
+    def file_to_json(self, record: FileRecord) -> dict[str, Any]:
+        tags = self.tags.names
+        file_info: dict[str, Any] = {
+            "defines": sorted(tags[tag_id] for tag_id in record.defines),
+            "references": sorted(tags[tag_id] for tag_id in record.references),
+        }
+        if record.fingerprint is not None:
+            file_info["fingerprint"] = record.fingerprint
+        if record.tags is not None:
+            file_info["tags"] = sorted(tags[tag_id] for tag_id in record.tags)
+        if record.locations is not None:
+            file_info["locations"] = record.locations
+        return file_info
+
+    def from_json(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Converts a whole index as read from a JSON file to records."""
+        tags = data.get("tags", {})
+        files = data.get("files")
+        if files is None:
+            # index written before the reverse map existed
+            files = build_file_map(tags)
+        return {
+            "tags": {
+                self.tags.intern(tag): self.tag_from_json(tag_info)
+                for tag, tag_info in tags.items()
+            },
+            "files": {
+                self.paths.intern(file_path): self.file_from_json(file_info)
+                for file_path, file_info in files.items()
+            },
+            "last_updated": data.get("last_updated"),
+            "generation": data.get("generation", 0),
+        }
+
+    def to_json(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Converts a whole index to the layout of the JSON file."""
+        return {
+            "generation": data.get("generation", 0),
+            **data,
+            "tags": {
+                tag: self.tag_to_json(record) for tag, record in data["tags"].items()
+            },
+            "files": {
+                file_path: self.file_to_json(record)
+                for file_path, record in data["files"].items()
+            },
+        }
+
+
+def build_file_map(tags: dict[str, Any]) -> dict[str, dict[str, list[str]]]:
+    """Derives the file -> tags reverse map from the per-tag entries of a file."""
+    files: dict[str, dict[str, list[str]]] = {}
+    for tag, tag_info in tags.items():
+        for file_path in tag_info.get("defining_files", {}):
+            files.setdefault(file_path, {"defines": [], "references": []})[
+                "defines"
+            ].append(tag)
+        for file_path in tag_info.get("referenced_by_files", ()):
+            files.setdefault(file_path, {"defines": [], "references": []})[
+                "references"
+            ].append(tag)
+    return files
@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from .lexer import REFERENCE, Token, tokenize
+from .linker import trie_pattern
+
+
+HEADER_RE = re.compile(r"^#{1,6} .*(?=\n)|(?<=\n)#{1,6} .*(?=\n|$)")
+TAGS_PREFIX_RE = re.compile(r"^\[tags\]:# .*\n\n")
+
+
+@lru_cache(maxsize=64)
+def tag_scanner(tags: frozenset[str]) -> tuple[re.Pattern, tuple[int, ...]]:
+    """
+    A pattern that finds, at every position, the longest of `tags` starting
+    there, and the lengths of the tags, to recover shorter tags that are a
+    prefix of the match.
+    """
+    pattern = re.compile(f"(?=({trie_pattern(tags)}))")
+    return pattern, tuple(sorted({len(tag) for tag in tags}))
+
+
+class SectionMap:
+    """
+    The header sections of a Markdown text, built with one scan.
+    Headers are found in the whole text and keep their order, title, level
+    and anchor slug. Section 0 is the text before the first header, section
+    i the text below header i - 1 up to the next header line; offsets are
+    positions in `body`, the text without a leading [tags]:# comment.
+    """
+
+    def __init__(self, text: str):
+        headers = HEADER_RE.findall(text)
+        self.titles = [header.split("# ")[1] for header in headers]
+        self.levels = [len(header) - len(header.lstrip("#")) for header in headers]
+        self.anchors = [title.replace(" ", "-") for title in self.titles]
+        m = TAGS_PREFIX_RE.match(text)
+        self.body = text[len(m.group(0)) :] if m else text
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        for m in HEADER_RE.finditer(self.body):
+            self.starts.append(m.start())
+            self.ends.append(m.end())
+
+    def section(self, start: int, end: int) -> Optional[int]:
+        """
+        Returns the section that holds the body text from `start` to `end`,
+        or None if that touches a header line or spans two sections.
+        """
+        index = bisect_right(self.starts, start)
+        if index and start < self.ends[index - 1]:
+            return None
+        limit = self.starts[index] if index < len(self.starts) else len(self.body)
+        return index if end <= limit else None
+
+    def link(self, rel_path: str, index: int) -> str:
+        """The link to a section of the file at `rel_path`."""
+        if index == 0:
+            return rel_path
+        return rel_path + "#" + self.anchors[index - 1]
+
+    def locate(self, tags: Iterable[str]) -> dict[str, int]:
+        """
+        Returns the first section in which each tag occurs, case-sensitive,
+        0 for tags that do not occur. All tags are searched in one scan that
+        stops once every tag is found.
+        """
+        tags = set(tags)
+        # the empty tag occurs everywhere
+        found = {tag: 0 for tag in tags if not tag}
+        remaining = tags - found.keys()
+        if remaining:
+            pattern, lengths = tag_scanner(frozenset(remaining))
+            for m in pattern.finditer(self.body):
+                start = m.start()
+                longest = m.group(1)
+                for length in lengths:
+                    if length > len(longest):
+                        break
+                    tag = longest[:length]
+                    if tag not in remaining:
+                        continue
+                    index = self.section(start, start + length)
+                    if index is not None:
+                        found[tag] = index
+                        remaining.discard(tag)
+                if not remaining:
+                    break
+        for tag in remaining:
+            found[tag] = 0
+        return found
+
+
+def reference_locations(
+    text: str,
+    rel_path: str,
+    sections: Optional[SectionMap] = None,
+    tokens: Optional[Iterable[Token]] = None,
+) -> list[list]:
+    """
+    Returns [name, link, offset] for every [name][name] reference of the
+    text outside of header lines and code: the name as written, the link to
+    the section it is in (as find_links_to_tag reports it) and its offset in
+    the text. `tokens` may pass on the tokens of the text if they are at hand.
+    """
+    if sections is None:
+        sections = SectionMap(text)
+    if tokens is None:
+        tokens = tokenize(text)
+    skipped = len(text) - len(sections.body)
+    locations = []
+    for token in tokens:
+        if token.kind != REFERENCE or token.start < skipped:
+            continue
+        start = token.start - skipped
+        index = sections.section(start, token.end - skipped)
+        if index is not None:
+            locations.append([token.value, sections.link(rel_path, index), token.start])
+    return locations
@@ -0,0 +1,261 @@
+import inspect
+import itertools
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from contextlib import redirect_stdout
+from typing import Any, Optional, TextIO
+
+from .autolink import initialize_tagging, rename_tag, update_tags_on_files
+from .cache import documents
+from .query import query_index
+from .tag_index import TagIndex
+
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class AutolinkServer:
+    """
+    Serves autolink operations on one directory over JSON-RPC 2.0.
+    The TagIndex stays loaded between requests; it is reloaded only when
+    the index file was changed by another process.
+    Messages are single-line JSON objects, one per line.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.realpath(path)
+        self.tag_index = self._load_index()
+        self._index_stamp = self._stamp()
+        self._lock = threading.Lock()
+        self.running = True
+
+    def _stamp(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self.tag_index.index_file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_index(self) -> TagIndex:
+        # loading prints status, keep it off the protocol stream
+        with redirect_stdout(sys.stderr):
+            return TagIndex(self.path)
+
+    def _reload(self):
+        self.tag_index.close()
+        self.tag_index = self._load_index()
+
+    def update(self, paths: list[str]) -> dict[str, float]:
+        """Relinks the given files, see update_tags_on_files."""
+        paths = [os.path.realpath(path) for path in paths]
+        outside = [
+            path for path in paths if os.path.commonpath([path, self.path]) != self.path
+        ]
+        if outside:
+            raise ValueError(f"files outside of {self.path}: {', '.join(outside)}")
+        return update_tags_on_files(self.path, paths, tag_index=self.tag_index)
+
+    def init(self, force: bool = False, jobs: int = 1) -> None:
+        """Initializes the directory, see initialize_tagging."""
+        initialize_tagging(self.path, force=force, jobs=jobs)
+        self._reload()
+
+    def rename(self, old: str, new: str) -> None:
+        """Renames a tag, see rename_tag."""
+        rename_tag(self.path, old, new)
+        self._reload()
+
+    def query(
+        self, question: str, tag: Optional[str] = None, limit: Optional[int] = None
+    ) -> Any:
+        """Answers a question from the loaded index, see query_index."""
+        return query_index(self.tag_index, question, tag, limit)
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counts of the document cache of this process."""
+        return documents.stats()
+
+    def shutdown(self) -> None:
+        """Stops serving once the response is sent."""
+        self.running = False
+
+    METHODS = ("update", "init", "rename", "query", "stats", "shutdown")
+
+    def handle(self, request: Any) -> Optional[dict[str, Any]]:
+        """
+        Executes one JSON-RPC request and returns its response,
+        or None for a notification.
+        """
+        if not isinstance(request, dict) or not isinstance(
+            request.get("method"), str
+        ):
+            return _error(None, INVALID_REQUEST, "invalid request")
+        request_id = request.get("id")
+        method = request["method"]
+        params = request.get("params", {})
+        if method not in self.METHODS:
+            return _error(request_id, METHOD_NOT_FOUND, f"unknown method: {method}")
+        with self._lock:
+            if self._stamp() != self._index_stamp:
+                self._reload()
+            operation = getattr(self, method)
+            args, kwargs = (params, {}) if isinstance(params, list) else ((), params)
+            try:
+                inspect.signature(operation).bind(*args, **kwargs)
+            except TypeError as e:
+                return _error(request_id, INVALID_PARAMS, str(e))
+            try:
+                result = operation(*args, **kwargs)
+            except Exception as e:
+                return _error(request_id, INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+            finally:
+                self._index_stamp = self._stamp()
+        if "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def handle_line(self, line: str) -> Optional[str]:
+        """Handles one line of the wire protocol."""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response = _error(None, PARSE_ERROR, str(e))
+        else:
+            # operations print progress, keep it off the protocol stream
+            with redirect_stdout(sys.stderr):
+                response = self.handle(request)
+        return None if response is None else json.dumps(response)
+
+    def close(self):
+        self.tag_index.close()
+
+
+def _error(request_id: Any, code: int, message: str) -> dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+def serve_stdio(
+    server: AutolinkServer, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout
+) -> None:
+    """Answers requests read from `stdin` until it closes or on shutdown."""
+    for line in stdin:
+        if not line.strip():
+            continue
+        response = server.handle_line(line)
+        if response is not None:
+            stdout.write(response + "\n")
+            stdout.flush()
+        if not server.running:
+            break
+
+
+def serve_unix(server: AutolinkServer, socket_path: str) -> None:
+    """
+    Answers requests on a Unix socket, one thread per connection.
+    Requests are still executed one at a time.
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode("utf-8")
+                if not line.strip():
+                    continue
+                response = server.handle_line(line)
+                if response is not None:
+                    self.wfile.write((response + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                if not server.running:
+                    threading.Thread(target=unix_server.shutdown).start()
+                    break
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as unix_server:
+        try:
+            unix_server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+class BackendClient:
+    """
+    Starts `autolink serve` on a directory as a child process and sends it
+    requests over stdio. `request` returns at once with a Future that is
+    resolved by a reader thread when the response arrives.
+    """
+
+    def __init__(self, path: str, python: str = sys.executable):
+        self._process = subprocess.Popen(
+            [python, "-m", "autolink", "serve", path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+        )
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    def _read_responses(self):
+        for line in self._process.stdout:
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                response = None
+            if not isinstance(response, dict):
+                # not a response, e.g. a stray print of the backend
+                print(f"autolink backend: {line.rstrip()}", file=sys.stderr)
+                continue
+            with self._lock:
+                future = self._pending.pop(response.get("id"), None)
+            if future is None:
+                continue
+            if "error" in response:
+                future.set_exception(RuntimeError(response["error"]["message"]))
+            else:
+                future.set_result(response.get("result"))
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("autolink backend exited"))
+
+    def request(self, method: str, params: Optional[dict[str, Any]] = None) -> Future:
+        """Sends a request without waiting for its response."""
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+            if params is not None:
+                message["params"] = params
+            self._process.stdin.write(json.dumps(message) + "\n")
+            self._process.stdin.flush()
+        return future
+
+    def close(self, timeout: float = 5.0):
+        """Asks the backend to shut down and waits for it to exit."""
+        if self._process.poll() is None:
+            try:
+                self.request("shutdown")
+                self._process.stdin.close()
+                self._process.wait(timeout)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self._process.kill()
+        self._reader.join(timeout)
@@ -0,0 +1,567 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import zlib
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .instrument import count
+from .records import RecordCodec
+from .stream import write_atomic
+
+
+class JsonStorage:
+    """
+    Stores the whole index as one JSON document.
+    Every save rewrites the file, no matter how much changed.
+    """
+
+    # the generation is the first key, so it is read without parsing the rest
+    GENERATION_RE = re.compile(r'\{\s*"generation": (\d+)')
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def close(self):
+        pass
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file_path)
+
+    def load(self, codec: RecordCodec) -> dict[str, Any]:
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            loaded_data = json.load(f)
+        return codec.from_json(loaded_data)
+
+    def generation(self) -> Optional[int]:
+        """The generation of the stored index, None if there is no readable one."""
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                match = self.GENERATION_RE.match(f.read(64))
+                if match is not None:
+                    return int(match[1])
+                f.seek(0)
+                return json.load(f).get("generation", 0)
+        except (OSError, ValueError):
+            return None
+
+    def save(
+        self,
+        data: dict[str, Any],
+        codec: RecordCodec,
+        dirty_tags: Iterable[str] = (),
+        dirty_files: Iterable[str] = (),
+    ):
+        write_atomic(self.file_path, json.dumps(codec.to_json(data), indent=2))
+
+    def remove(self):
+        os.remove(self.file_path)
+
+
+class SqliteStorage:
+    """
+    Stores the index in an SQLite database with one row per tag, definition,
+    reference and file fingerprint, indexed on tag and file.
+    Tags and files are read when they are first used, see SqliteMap, and a
+    save only rewrites the rows of the tags and files that changed, inside
+    one transaction.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY, value TEXT
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS tags (
+            tag TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS definitions (
+            tag TEXT NOT NULL, file TEXT NOT NULL, path TEXT NOT NULL,
+            PRIMARY KEY (tag, file)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS definitions_by_file ON definitions (file);
+        CREATE TABLE IF NOT EXISTS refs (
+            tag TEXT NOT NULL, file TEXT NOT NULL,
+            PRIMARY KEY (tag, file)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS refs_by_file ON refs (file);
+        CREATE TABLE IF NOT EXISTS files (
+            file TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, tags TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS locations (
+            file TEXT PRIMARY KEY, hash TEXT NOT NULL, refs TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file_path)
+            self._connection.executescript(self.SCHEMA)
+            # Python's lowercase, to match tags the way the other backends do
+            self._connection.create_function("fold", 1, str.lower, deterministic=True)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file_path)
+
+    def remove(self):
+        self.close()
+        os.remove(self.file_path)
+
+    def load(self, codec: RecordCodec) -> dict[str, Any]:
+        meta = dict(self._connect().execute("SELECT key, value FROM meta"))
+        return {
+            "tags": SqliteMap(self, "tags", codec),
+            "files": SqliteMap(self, "files", codec),
+            "last_updated": meta.get("last_updated"),
+            "generation": int(meta.get("generation", 0)),
+        }
+
+    def read_tags(self, tag: Optional[str] = None) -> dict[str, Any]:
+        """The stored tags in the JSON layout, only `tag` if given."""
+        connection = self._connect()
+        where, args = ("", ()) if tag is None else (" WHERE tag = ?", (tag,))
+        tags: dict[str, Any] = {
+            name: {"defining_files": {}, "referenced_by_files": set()}
+            for (name,) in connection.execute("SELECT tag FROM tags" + where, args)
+        }
+
+        def tag_entry(name: str) -> dict[str, Any]:
+            return tags.setdefault(
+                name, {"defining_files": {}, "referenced_by_files": set()}
+            )
+
+        for name, file_path, path in connection.execute(
+            "SELECT tag, file, path FROM definitions" + where, args
+        ):
+            tag_entry(name)["defining_files"][file_path] = path
+        for name, file_path in connection.execute(
+            "SELECT tag, file FROM refs" + where, args
+        ):
+            tag_entry(name)["referenced_by_files"].add(file_path)
+        return tags
+
+    def read_files(self, file: Optional[str] = None) -> dict[str, Any]:
+        """The stored files in the JSON layout, only `file` if given."""
+        connection = self._connect()
+        where, args = ("", ()) if file is None else (" WHERE file = ?", (file,))
+        files: dict[str, Any] = {}
+
+        def file_entry(file_path: str) -> dict[str, Any]:
+            return files.setdefault(file_path, {"defines": set(), "references": set()})
+
+        for tag, file_path in connection.execute(
+            "SELECT tag, file FROM definitions" + where, args
+        ):
+            file_entry(file_path)["defines"].add(tag)
+        for tag, file_path in connection.execute(
+            "SELECT tag, file FROM refs" + where, args
+        ):
+            file_entry(file_path)["references"].add(tag)
+        for file_path, fingerprint, file_tags in connection.execute(
+            "SELECT file, fingerprint, tags FROM files" + where, args
+        ):
+            file_info = file_entry(file_path)
+            file_info["fingerprint"] = json.loads(fingerprint)
+            file_info["tags"] = set(json.loads(file_tags))
+        for file_path, digest, references in connection.execute(
+            "SELECT file, hash, refs FROM locations" + where, args
+        ):
+            file_entry(file_path)["locations"] = {
+                "hash": digest,
+                "references": json.loads(references),
+            }
+        return files
+
+    def fold_tags(self, tag: str) -> set[str]:
+        """The stored tags equal to `tag` ignoring case."""
+        return {
+            name
+            for (name,) in self._connect().execute(
+                "SELECT tag FROM tags WHERE fold(tag) = ?", (tag.lower(),)
+            )
+        }
+
+    def generation(self) -> Optional[int]:
+        """The generation of the stored index, None if there is none."""
+        if not self.exists():
+            return None
+        row = (
+            self._connect()
+            .execute("SELECT value FROM meta WHERE key = 'generation'")
+            .fetchone()
+        )
+        return int(row[0]) if row else 0
+
+    def save(
+        self,
+        data: dict[str, Any],
+        codec: RecordCodec,
+        dirty_tags: Iterable[str] = (),
+        dirty_files: Iterable[str] = (),
+    ):
+        connection = self._connect()
+        with connection:
+            for tag in dirty_tags:
+                if tag in data["tags"]:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO tags (tag) VALUES (?)", (tag,)
+                    )
+                else:
+                    connection.execute("DELETE FROM tags WHERE tag = ?", (tag,))
+                    connection.execute("DELETE FROM definitions WHERE tag = ?", (tag,))
+                    connection.execute("DELETE FROM refs WHERE tag = ?", (tag,))
+            for file_path in dirty_files:
+                connection.execute(
+                    "DELETE FROM definitions WHERE file = ?", (file_path,)
+                )
+                connection.execute("DELETE FROM refs WHERE file = ?", (file_path,))
+                connection.execute("DELETE FROM locations WHERE file = ?", (file_path,))
+                record = data["files"].get(file_path)
+                if record is None or record.fingerprint is None:
+                    connection.execute("DELETE FROM files WHERE file = ?", (file_path,))
+                if record is None:
+                    continue
+                file_info = codec.file_to_json(record)
+                file_id = codec.paths.id(file_path)
+                connection.executemany(
+                    "INSERT INTO definitions (tag, file, path) VALUES (?, ?, ?)",
+                    (
+                        (tag, file_path, data["tags"][tag].defining_files[file_id])
+                        for tag in file_info["defines"]
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO refs (tag, file) VALUES (?, ?)",
+                    ((tag, file_path) for tag in file_info["references"]),
+                )
+                if "fingerprint" in file_info:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO files (file, fingerprint, tags)"
+                        " VALUES (?, ?, ?)",
+                        (
+                            file_path,
+                            json.dumps(file_info["fingerprint"]),
+                            json.dumps(file_info.get("tags", [])),
+                        ),
+                    )
+                if "locations" in file_info:
+                    connection.execute(
+                        "INSERT INTO locations (file, hash, refs) VALUES (?, ?, ?)",
+                        (
+                            file_path,
+                            file_info["locations"]["hash"],
+                            json.dumps(file_info["locations"]["references"]),
+                        ),
+                    )
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (
+                    ("last_updated", data["last_updated"]),
+                    ("generation", str(data["generation"])),
+                ),
+            )
+
+
+class SqliteMap(MutableMapping):
+    """
+    The tags or the files of an SQLite index: an entry is read with point
+    queries when its key is first used; iterating or counting the entries
+    reads all of them.
+    """
+
+    def __init__(self, storage: SqliteStorage, kind: str, codec: RecordCodec):
+        self._storage = storage
+        self._kind = kind
+        self._codec = codec
+        self.entries: dict[str, Any] = {}
+        # keys that are not stored or were deleted since
+        self._missing: set[str] = set()
+        self._complete = False
+
+    def _from_json(self, key: str, info: dict[str, Any]) -> tuple[str, Any]:
+        if self._kind == "tags":
+            return self._codec.tags.intern(key), self._codec.tag_from_json(info)
+        return self._codec.paths.intern(key), self._codec.file_from_json(info)
+
+    def _read(self, key: str) -> None:
+        if key in self.entries or key in self._missing or self._complete:
+            return
+        count("index_rows_read")
+        if self._kind == "tags":
+            stored = self._storage.read_tags(key)
+        else:
+            stored = self._storage.read_files(key)
+        if key in stored:
+            key, value = self._from_json(key, stored[key])
+            self.entries[key] = value
+        else:
+            self._missing.add(key)
+
+    def _read_all(self):
+        if self._complete:
+            return
+        if self._kind == "tags":
+            stored = self._storage.read_tags()
+        else:
+            stored = self._storage.read_files()
+        for key, info in stored.items():
+            if key not in self.entries and key not in self._missing:
+                key, value = self._from_json(key, info)
+                self.entries[key] = value
+        self._complete = True
+
+    def folded(self, key: str) -> set[str]:
+        """The keys equal to `key` ignoring case."""
+        lowered = key.lower()
+        if self._complete:
+            keys: Iterable[str] = self.entries
+        else:
+            keys = self._storage.fold_tags(key) - self._missing | self.entries.keys()
+        return {name for name in keys if name.lower() == lowered}
+
+    def __getitem__(self, key: str) -> Any:
+        self._read(key)
+        return self.entries[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self.entries[key] = value
+        self._missing.discard(key)
+
+    def __delitem__(self, key: str):
+        self._read(key)
+        del self.entries[key]
+        self._missing.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        self._read(key)
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        self._read_all()
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        self._read_all()
+        return len(self.entries)
+
+
+class ShardedMap(MutableMapping):
+    """
+    The tags or the files of a sharded index: a dict spread over the shard
+    files of a ShardedStorage. A shard is read when one of its keys is first
+    used; iterating or counting the entries reads all of them.
+    Keys are hashed ignoring case, so the keys equal to a name in any case
+    are found in the shard of that name.
+    """
+
+    def __init__(self, storage: "ShardedStorage", kind: str, codec: RecordCodec):
+        self._storage = storage
+        self._kind = kind
+        self._codec = codec
+        self.shards: dict[int, dict[str, Any]] = {}
+        # keys by lowercase spelling, per shard, built on first use
+        self._folded: dict[int, dict[str, set[str]]] = {}
+
+    def shard(self, number: int) -> dict[str, Any]:
+        """The entries of one shard, read from disk on first use."""
+        shard = self.shards.get(number)
+        if shard is None:
+            shard = self.shards[number] = self._storage.read_shard(
+                self._kind, number, self._codec
+            )
+        return shard
+
+    def _shard_of(self, key: str) -> dict[str, Any]:
+        return self.shard(self._storage.shard_number(key))
+
+    def _read_all(self):
+        for number in range(self._storage.shard_count):
+            self.shard(number)
+
+    def folded(self, key: str) -> set[str]:
+        """The keys equal to `key` ignoring case, read from its shard only."""
+        number = self._storage.shard_number(key)
+        folded = self._folded.get(number)
+        if folded is None:
+            folded = self._folded[number] = {}
+            for name in self.shard(number):
+                folded.setdefault(name.lower(), set()).add(name)
+        return set(folded.get(key.lower(), ()))
+
+    def __getitem__(self, key: str) -> Any:
+        return self._shard_of(key)[key]
+
+    def __setitem__(self, key: str, value: Any):
+        number = self._storage.shard_number(key)
+        self.shard(number)[key] = value
+        if number in self._folded:
+            self._folded[number].setdefault(key.lower(), set()).add(key)
+
+    def __delitem__(self, key: str):
+        number = self._storage.shard_number(key)
+        del self.shard(number)[key]
+        folded = self._folded.get(number, {})
+        spellings = folded.get(key.lower(), set())
+        spellings.discard(key)
+        if not spellings:
+            folded.pop(key.lower(), None)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and key in self._shard_of(key)
+
+    def __iter__(self) -> Iterator[str]:
+        self._read_all()
+        for shard in self.shards.values():
+            yield from shard
+
+    def __len__(self) -> int:
+        self._read_all()
+        return sum(len(shard) for shard in self.shards.values())
+
+
+class ShardedStorage:
+    """
+    Stores the index as a directory of small JSON files: tags and files are
+    hashed into a fixed number of shards each, listed by a manifest.
+    Shards are read when an entry of theirs is first used, and a save only
+    rewrites the shards that hold a tag or file changed since the last one.
+    """
+
+    MANIFEST = "manifest.json"
+    SHARD_COUNT = 64
+    # version 2 hashes keys ignoring case
+    VERSION = 2
+
+    def __init__(self, directory_path: str):
+        self.directory_path = directory_path
+        self.file_path = os.path.join(directory_path, self.MANIFEST)
+        self.shard_count = self.SHARD_COUNT
+        self.version = self.VERSION
+
+    def close(self):
+        pass
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file_path)
+
+    def remove(self):
+        shutil.rmtree(self.directory_path)
+
+    def shard_number(self, key: str) -> int:
+        if self.version >= 2:
+            key = key.lower()
+        return zlib.crc32(key.encode("utf-8")) % self.shard_count
+
+    def _shard_path(self, kind: str, number: int) -> str:
+        return os.path.join(self.directory_path, f"{kind}-{number:03d}.json")
+
+    def read_shard(self, kind: str, number: int, codec: RecordCodec) -> dict[str, Any]:
+        count("index_shards_read")
+        try:
+            with open(self._shard_path(kind, number), "r", encoding="utf-8") as f:
+                shard = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if kind == "tags":
+            return {
+                codec.tags.intern(tag): codec.tag_from_json(tag_info)
+                for tag, tag_info in shard.items()
+            }
+        return {
+            codec.paths.intern(file_path): codec.file_from_json(file_info)
+            for file_path, file_info in shard.items()
+        }
+
+    def load(self, codec: RecordCodec) -> dict[str, Any]:
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.shard_count = manifest["shards"]
+        self.version = manifest.get("version", 1)
+        tags = ShardedMap(self, "tags", codec)
+        files = ShardedMap(self, "files", codec)
+        if self.version < self.VERSION:
+            # an older layout is read completely and rewritten in the
+            # current one on the next save
+            tags, files = dict(tags), dict(files)
+            self.version = self.VERSION
+        return {
+            "tags": tags,
+            "files": files,
+            "last_updated": manifest.get("last_updated"),
+            "generation": manifest.get("generation", 0),
+        }
+
+    def generation(self) -> Optional[int]:
+        """The generation of the stored index, None if there is none."""
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("generation", 0)
+        except (OSError, ValueError):
+            return None
+
+    def save(
+        self,
+        data: dict[str, Any],
+        codec: RecordCodec,
+        dirty_tags: Iterable[str] = (),
+        dirty_files: Iterable[str] = (),
+    ):
+        os.makedirs(self.directory_path, exist_ok=True)
+        for kind, dirty in (("tags", dirty_tags), ("files", dirty_files)):
+            entries = data[kind]
+            if isinstance(entries, ShardedMap) and self.exists():
+                shards = {
+                    number: entries.shard(number)
+                    for number in {self.shard_number(key) for key in dirty}
+                }
+            else:
+                # a new, imported or migrated index is written completely
+                shards = {number: {} for number in range(self.shard_count)}
+                for key, value in entries.items():
+                    shards[self.shard_number(key)][key] = value
+            to_json = codec.tag_to_json if kind == "tags" else codec.file_to_json
+            for number, shard in sorted(shards.items()):
+                self._write_shard(kind, number, shard, to_json)
+        write_atomic(
+            self.file_path,
+            json.dumps(
+                {
+                    "version": self.version,
+                    "shards": self.shard_count,
+                    "last_updated": data["last_updated"],
+                    "generation": data["generation"],
+                },
+                indent=2,
+            ),
+        )
+
+    def _write_shard(
+        self,
+        kind: str,
+        number: int,
+        shard: dict[str, Any],
+        to_json: Callable[[Any], dict[str, Any]],
+    ):
+        file_path = self._shard_path(kind, number)
+        if not shard:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return
+        count("index_shards_written")
+        write_atomic(
+            file_path,
+            json.dumps({key: to_json(value) for key, value in sorted(shard.items())}),
+        )
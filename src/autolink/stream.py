@@ -0,0 +1,178 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterable, Iterator, Optional
+
+from .instrument import count
+
+
+# files larger than this many bytes are processed in pieces instead of whole
+STREAM_THRESHOLD = 32 * 1024 * 1024
+# characters read at a time while streaming
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_large_file(file_path: str) -> bool:
+    """Tells whether a file is processed in streaming mode."""
+    return os.path.getsize(file_path) > STREAM_THRESHOLD
+
+
+def read_pieces(file_path: str, chunk_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Reads a text file in pieces of about `chunk_size` characters that end at
+    line ends, so line-based patterns never straddle two pieces.
+    A single line longer than that is returned as one piece.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    count("files_read")
+    with open(file_path, "r", encoding="utf-8") as f:
+        for piece in align_pieces(iter(lambda: f.read(chunk_size), "")):
+            count("chars_read", len(piece))
+            yield piece
+
+
+def align_pieces(pieces: Iterable[str]) -> Iterator[str]:
+    """Regroups text pieces so that every piece but the last ends a line."""
+    partial = ""
+    for piece in pieces:
+        piece = partial + piece
+        cut = piece.rfind("\n") + 1
+        if cut:
+            yield piece[:cut]
+        partial = piece[cut:]
+    if partial:
+        yield partial
+
+
+def lstrip_pieces(pieces: Iterable[str]) -> Iterator[str]:
+    """Drops the leading whitespace of a text given in pieces."""
+    pieces = iter(pieces)
+    for piece in pieces:
+        piece = piece.lstrip()
+        if piece:
+            yield piece
+            break
+    yield from pieces
+
+
+def rstrip_pieces(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Drops the trailing whitespace of a text given in pieces.
+    Whitespace at the end of a piece is held back until text follows it.
+    """
+    pending = ""
+    for piece in pieces:
+        stripped = piece.rstrip()
+        if stripped:
+            yield pending + stripped
+            pending = piece[len(stripped) :]
+        else:
+            pending += piece
+
+
+def hash_file(file_path: str) -> str:
+    """Returns content_hash of a file's text without holding all of it."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "r", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ""):
+            digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class StreamWriter:
+    """
+    Writes the new content of a file to a temporary file next to it and
+    replaces the file on close, unless the content turned out unchanged.
+    Written text is buffered and handed to the `on_lines` callbacks in
+    pieces that end at line ends.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        original_hash: Optional[str] = None,
+        on_lines: Iterable[Callable[[str], object]] = (),
+    ):
+        self.file_path = file_path
+        self.original_hash = original_hash
+        self.on_lines = list(on_lines)
+        self.changed = False
+        self._digest = hashlib.blake2b(digest_size=16)
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._written = 0
+        directory, name = os.path.split(file_path)
+        fd, self._temp_path = tempfile.mkstemp(
+            dir=directory or ".", prefix=f".{name}.", suffix=".tmp"
+        )
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+
+    @property
+    def hash(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= CHUNK_SIZE:
+            self._flush(final=False)
+
+    def _flush(self, final: bool):
+        text = "".join(self._buffer)
+        cut = len(text) if final else text.rfind("\n") + 1
+        self._buffer = [text[cut:]] if cut < len(text) else []
+        self._buffered = len(text) - cut
+        if cut:
+            piece = text[:cut]
+            self._file.write(piece)
+            self._written += len(piece)
+            self._digest.update(piece.encode("utf-8"))
+            for callback in self.on_lines:
+                callback(piece)
+
+    def close(self):
+        """Replaces the file with the written content if it differs."""
+        self._flush(final=True)
+        self._file.close()
+        if self.hash == self.original_hash:
+            os.remove(self._temp_path)
+            return
+        shutil.copymode(self.file_path, self._temp_path)
+        os.replace(self._temp_path, self.file_path)
+        self.changed = True
+        count("files_written")
+        count("chars_written", self._written)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._temp_path)
+
+    def __enter__(self) -> "StreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_atomic(file_path: str, text: str) -> None:
+    """
+    Writes a text file through a temporary file next to it that then
+    replaces it, so readers see either the old or the new content.
+    """
+    directory, name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory or ".", prefix=f".{name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
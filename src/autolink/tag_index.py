@@ -1,31 +1,143 @@
+import hashlib
 import json
 import os
-import re
-from typing import Any, Optional
+import time
+from collections import Counter
+from typing import Any, Iterable, Optional
 from datetime import datetime
 
+from .instrument import count, timed
+from .lexer import PieceLexer, referenced_names, tokenize
+from .lock import IndexLock
+from .records import FileRecord, RecordCodec, TagRecord
+from .records import add_id, discard_id, id_array
+from .storage import JsonStorage, ShardedMap, ShardedStorage, SqliteMap, SqliteStorage
+from .stream import hash_file
+
+
+# files modified this close to their last check may still change unnoticed
+# within the same mtime tick, so their content hash is compared as well
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def content_hash(content: str) -> str:
+    """Returns a short hex digest of a file's text content."""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def find_reference_names(
+    file_content: str, lexer: Optional[PieceLexer] = None
+) -> set[str]:
+    """
+    Returns the names used in [x][x] and [[x]] references of a text, outside
+    of code. `lexer` tokenizes a text that is given in pieces.
+    """
+    tokens = tokenize(file_content) if lexer is None else lexer.tokenize(file_content)
+    return referenced_names(tokens)
+
+
+def canonical_link(tag: str, links: Iterable[str]) -> Optional[str]:
+    """
+    Picks the link target of a tag among the locations of its definitions:
+    a header named after the tag comes first, then any header section, then
+    the file itself; ties go to the first path.
+    """
+    anchor = "#" + tag.replace(" ", "-")
+    return min(
+        links,
+        key=lambda link: (not link.endswith(anchor), "#" not in link, link),
+        default=None,
+    )
+
+
+def file_fingerprint(
+    file_path: str, content: Optional[str], digest: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Returns the fingerprint (size, mtime_ns, content hash) of a file as it is
+    on disk now. `content` has to be the text last read from or written to it;
+    for a streamed file its `digest` is passed instead.
+    """
+    stat = os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": content_hash(content) if digest is None else digest,
+        "checked_ns": time.time_ns(),
+    }
+
 
 class TagIndex:
     INDEX_FILENAME = "autolink_index.json"
+    SQLITE_FILENAME = "autolink_index.sqlite"
+    SHARDS_DIRNAME = "autolink_index.shards"
+    LOCK_FILENAME = "autolink_index.lock"
+    BACKENDS = ("json", "sqlite", "sharded")
 
-    def __init__(self, directory_path: str):
+    def __init__(self, directory_path: str, backend: Optional[str] = None):
+        """
+        Loads the index of a directory. `backend` is "json", "sqlite" or
+        "sharded"; by default an existing SQLite index is preferred, then a
+        sharded one, then the JSON file.
+        """
         self.directory_path = directory_path
-        self.index_file_path = os.path.join(directory_path, self.INDEX_FILENAME)
-        self._data: dict[str, Any] = {"tags": {}, "last_updated": None}
+        if backend is None:
+            backend = self._detect_backend(directory_path)
+        if backend not in self.BACKENDS:
+            raise ValueError(f"unknown index backend: {backend}")
+        self.backend = backend
+        self._storage: JsonStorage | SqliteStorage | ShardedStorage
+        if backend == "sqlite":
+            self.index_file_path = os.path.join(directory_path, self.SQLITE_FILENAME)
+            self._storage = SqliteStorage(self.index_file_path)
+        elif backend == "sharded":
+            self._storage = ShardedStorage(
+                os.path.join(directory_path, self.SHARDS_DIRNAME)
+            )
+            # the manifest is rewritten on every save
+            self.index_file_path = self._storage.file_path
+        else:
+            self.index_file_path = os.path.join(directory_path, self.INDEX_FILENAME)
+            self._storage = JsonStorage(self.index_file_path)
+        # tags and file paths are interned, records refer to them by id
+        self._codec = RecordCodec()
+        self._data: dict[str, Any] = {
+            "tags": {},
+            "files": {},
+            "last_updated": None,
+            "generation": 0,
+        }
+        # tags by lowercase spelling, built on first use
+        self._tags_by_lower: Optional[dict[str, set[str]]] = None
+        # tags and files changed since the last save, for row-level storage
+        self._dirty_tags: set[str] = set()
+        self._dirty_files: set[str] = set()
+        self.lock = self.lock_for(directory_path)
         self._load()
 
+    @classmethod
+    def lock_for(cls, directory_path: str) -> IndexLock:
+        """
+        Returns the lock of this process on the index of a directory. Saves
+        take it, a caller holds it to keep other processes from changing the
+        index between loading and saving it.
+        """
+        return IndexLock.for_file(os.path.join(directory_path, cls.LOCK_FILENAME))
+
+    @classmethod
+    def _detect_backend(cls, directory_path: str) -> str:
+        if os.path.exists(os.path.join(directory_path, cls.SQLITE_FILENAME)):
+            return "sqlite"
+        manifest = os.path.join(
+            directory_path, cls.SHARDS_DIRNAME, ShardedStorage.MANIFEST
+        )
+        return "sharded" if os.path.exists(manifest) else "json"
+
+    @timed("index_load")
     def _load(self):
-        if os.path.exists(self.index_file_path):
+        if self._storage.exists():
             try:
-                with open(self.index_file_path, "r", encoding="utf-8") as f:
-                    loaded_data = json.load(f)
-                    # Convert referenced_by_files lists back to sets for internal use
-                    for tag_name, tag_info in loaded_data.get("tags", {}).items():
-                        if "referenced_by_files" in tag_info:
-                            tag_info["referenced_by_files"] = set(
-                                tag_info["referenced_by_files"]
-                            )
-                    self._data = loaded_data
+                self._data = self._storage.load(self._codec)
             except json.JSONDecodeError:
                 print(
                     f"Warning: Could not decode JSON from {self.index_file_path}. Initializing empty index."
@@ -39,34 +151,187 @@ class TagIndex:
                 f"No index file found at {self.index_file_path}. Initializing empty index."
             )
 
+    def _lower_tags(self) -> dict[str, set[str]]:
+        """
+        Returns the tags by their lowercase spelling. The map is built on
+        first use; sharded and SQLite indexes look names up instead, see _spellings.
+        """
+        if self._tags_by_lower is None:
+            self._tags_by_lower = {}
+            for tag in self._data["tags"]:
+                self._tags_by_lower.setdefault(tag.lower(), set()).add(tag)
+        return self._tags_by_lower
+
+    def _spellings(self, name: str) -> set[str]:
+        """Returns the tags equal to `name` ignoring case."""
+        tags = self._data["tags"]
+        if isinstance(tags, (ShardedMap, SqliteMap)):
+            return tags.folded(name)
+        return set(self._lower_tags().get(name.lower(), set()))
+
+    def _add_lower_tag(self, tag: str):
+        if self._tags_by_lower is not None:
+            self._tags_by_lower.setdefault(tag.lower(), set()).add(tag)
+
+    def _discard_lower_tag(self, tag: str):
+        if self._tags_by_lower is not None:
+            spellings = self._tags_by_lower.get(tag.lower(), set())
+            spellings.discard(tag)
+            if not spellings:
+                self._tags_by_lower.pop(tag.lower(), None)
+
+    @timed("index_save")
     def save(self):
-        self._data["last_updated"] = datetime.now().isoformat()
-        # Convert referenced_by_files sets to lists for JSON serialization
-        data_to_save = self._data.copy()
-        data_to_save["tags"] = {
-            tag_name: {
-                **tag_info,
-                "referenced_by_files": list(tag_info["referenced_by_files"]),
-            }
-            for tag_name, tag_info in self._data["tags"].items()
+        """
+        Writes the changes to the index. Every save increments its generation;
+        if another process saved since this index was loaded, its index is read
+        again and the files changed here are merged into it first.
+        """
+        with self.lock:
+            if self._stored_changed():
+                self._merge_stored()
+            self._data["generation"] += 1
+            self._data["last_updated"] = datetime.now().isoformat()
+            self._storage.save(
+                self._data, self._codec, self._dirty_tags, self._dirty_files
+            )
+        self._dirty_tags.clear()
+        self._dirty_files.clear()
+
+    def refresh(self):
+        """
+        Catches up with the saves of other processes since this index was
+        loaded, keeping the changes not saved yet, see save.
+        """
+        with self.lock:
+            if self._stored_changed():
+                self._merge_stored()
+
+    def _stored_changed(self) -> bool:
+        generation = self._storage.generation()
+        return generation is not None and generation != self._data["generation"]
+
+    def _merge_stored(self):
+        """
+        Replaces the index with the stored one plus the changes made here.
+        The index is a function of its files, so the changes are replayed per
+        file: every file changed here gets the definitions, references and
+        fingerprint it has here; the other files keep their stored state.
+        Tags the replay leaves without a definition are dropped.
+        """
+        count("index_merges")
+        stored = TagIndex(self.directory_path, backend=self.backend)
+        touched = set(self._dirty_tags)
+        for file_path in self._dirty_files:
+            touched.update(stored.get_defined_tags(file_path))
+            stored.remove_file(file_path)
+            record = self._data["files"].get(file_path)
+            if record is None:
+                continue
+            for tag, link in self._definitions_of(file_path).items():
+                stored.add_definition(tag, file_path, link)
+                touched.add(tag)
+            references = self.get_referenced_tags(file_path)
+            stored.set_file_references(file_path, references, references)
+            merged = stored._file_entry(file_path)
+            merged.fingerprint = record.fingerprint
+            merged.locations = record.locations
+            if record.tags is not None:
+                file_tags = self._names(record.tags, self._codec.tags)
+                merged.tags = id_array(map(stored._codec.tags.id, file_tags))
+        for tag in touched:
+            if tag in stored._data["tags"] and not stored.get_defining_files(tag):
+                stored.remove_tag_from_index(tag)
+        stored.close()
+        self._codec = stored._codec
+        self._data = stored._data
+        self._tags_by_lower = None
+        self._dirty_tags = stored._dirty_tags
+        self._dirty_files = stored._dirty_files
+
+    def _definitions_of(self, file_path: str) -> dict[str, str]:
+        """Returns the link target of every tag a file defines."""
+        file_id = self._codec.paths.find(file_path)
+        return {
+            tag: self._data["tags"][tag].defining_files[file_id]
+            for tag in self.get_defined_tags(file_path)
         }
-        with open(self.index_file_path, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, indent=2)
+
+    def close(self):
+        """Releases the storage backend, e.g. the SQLite connection."""
+        self._storage.close()
+
+    def remove(self):
+        """Deletes the stored index of this backend."""
+        self._storage.remove()
+
+    def export_json(self, file_path: str):
+        """Writes the whole index to a JSON file in the default format."""
+        JsonStorage(file_path).save(self._data, self._codec)
+
+    def import_json(self, file_path: str):
+        """
+        Replaces the index with the content of a JSON index file.
+        Everything is written on the next save.
+        """
+        self._import(JsonStorage(file_path).load(self._codec))
+
+    def import_index(self, source: "TagIndex"):
+        """
+        Replaces the index with the content of another one, e.g. the same
+        index in another backend. Everything is written on the next save.
+        """
+        self._import(self._codec.from_json(source._codec.to_json(source._data)))
+
+    def _import(self, data: dict[str, Any]):
+        self._dirty_tags.update(self._data["tags"], data["tags"])
+        self._dirty_files.update(self._data["files"], data["files"])
+        self._data = data
+        self._tags_by_lower = None
+
+    def _names(self, ids, interner) -> set[str]:
+        return {interner[name_id] for name_id in ids}
+
+    def _tag_entry(self, tag: str) -> TagRecord:
+        record = self._data["tags"].get(tag)
+        if record is None:
+            tag = self._codec.tags.intern(tag)
+            record = self._data["tags"][tag] = TagRecord()
+            self._add_lower_tag(tag)
+        self._dirty_tags.add(tag)
+        return record
+
+    def _file_entry(self, file_path: str) -> FileRecord:
+        file_path = self._codec.paths.intern(file_path)
+        self._dirty_files.add(file_path)
+        record = self._data["files"].get(file_path)
+        if record is None:
+            record = self._data["files"][file_path] = FileRecord()
+        return record
+
+    def _discard_from_file(self, file_path: str, key: str, tag: str):
+        record = self._data["files"].get(file_path)
+        if record is None:
+            return
+        self._dirty_files.add(file_path)
+        discard_id(getattr(record, key), self._codec.tags.find(tag))
+        if not record.defines and not record.references and record.fingerprint is None:
+            del self._data["files"][file_path]
 
     def add_definition(self, tag: str, file_path: str, tag_path_within_file: str):
         """Adds or updates a tag's definition location."""
-        tag_data = self._data["tags"].setdefault(
-            tag, {"defining_files": {}, "referenced_by_files": set()}
-        )
-        tag_data["defining_files"][file_path] = tag_path_within_file
+        tag_data = self._tag_entry(tag)
+        tag_data.defining_files[self._codec.paths.id(file_path)] = tag_path_within_file
+        add_id(self._file_entry(file_path).defines, self._codec.tags.id(tag))
 
     def remove_definition(self, tag: str, file_path: str):
         """Removes a tag's definition from a specific file."""
-        if (
-            tag in self._data["tags"]
-            and file_path in self._data["tags"][tag]["defining_files"]
-        ):
-            del self._data["tags"][tag]["defining_files"][file_path]
+        record = self._data["tags"].get(tag)
+        file_id = self._codec.paths.find(file_path)
+        if record is not None and file_id in record.defining_files:
+            del record.defining_files[file_id]
+            self._dirty_tags.add(tag)
+            self._discard_from_file(file_path, "defines", tag)
 
     def update_file_references(
         self, file_path: str, all_tags_in_project: set[str], file_content: str
@@ -74,39 +339,213 @@ class TagIndex:
         """
         Scans the given file content for [tag][tag] and [[tag]] references and updates the index.
         This function needs to be called after a file's content has been finalized.
-        It will update the `referenced_by_files` for all tags.
+        Only the tags this file referenced before and the ones it references now are touched.
         """
-        # First, remove this file from all tags it might have previously referenced.
-        # This is the safest way to ensure correctness before re-scanning.
-        for tag_name, tag_data in self._data["tags"].items():
-            if file_path in tag_data["referenced_by_files"]:
-                tag_data["referenced_by_files"].remove(file_path)
+        self.set_file_references(
+            file_path, all_tags_in_project, find_reference_names(file_content)
+        )
 
-        # Then, re-scan the file content for current references and add them.
+    def set_file_references(
+        self,
+        file_path: str,
+        all_tags_in_project: Optional[set[str]],
+        reference_names: set[str],
+    ):
+        """
+        Updates the index with the references of a file, given the names found
+        by `find_reference_names`. Names are matched case-insensitively.
+        With `all_tags_in_project` None, the tags are the indexed ones, looked
+        up per name.
+        """
+        # Keep the reference names that are known tags.
         referenced_tags_in_file = set()
-        for (
-            tag
-        ) in all_tags_in_project:  # Iterate over all known tags to check for references
-            if re.search(
-                rf"\[{re.escape(tag)}\]\[{re.escape(tag)}\]",
-                file_content,
-                re.IGNORECASE,
-            ) or re.search(rf"\[\[{re.escape(tag)}\]\]", file_content, re.IGNORECASE):
-                referenced_tags_in_file.add(tag)
-
-        for tag in referenced_tags_in_file:
-            tag_data = self._data["tags"].setdefault(
-                tag, {"defining_files": {}, "referenced_by_files": set()}
+        for name in reference_names:
+            spellings = self._spellings(name)
+            if all_tags_in_project is not None:
+                if name in all_tags_in_project:
+                    referenced_tags_in_file.add(name)
+                spellings &= all_tags_in_project
+            referenced_tags_in_file.update(spellings)
+
+        # Only the tags the file stopped or started referencing change.
+        old_tags = self.get_referenced_tags(file_path)
+        file_id = self._codec.paths.id(file_path)
+        for tag in old_tags - referenced_tags_in_file:
+            discard_id(self._data["tags"][tag].referenced_by_files, file_id)
+            self._dirty_tags.add(tag)
+            self._discard_from_file(file_path, "references", tag)
+        new_tags = referenced_tags_in_file - old_tags
+        for tag in new_tags:
+            add_id(self._tag_entry(tag).referenced_by_files, file_id)
+        if new_tags:
+            references = self._file_entry(file_path).references
+            for tag in new_tags:
+                add_id(references, self._codec.tags.id(tag))
+
+    def record_file(
+        self,
+        file_path: str,
+        content: Optional[str],
+        tags: set[str],
+        digest: Optional[str] = None,
+    ):
+        """
+        Stores the fingerprint of a file as it is on disk now, together with
+        the tags extracted from it.
+        `content` has to be the text that was last read from or written to it,
+        or None if its `digest` is given.
+        """
+        self.set_fingerprint(
+            file_path,
+            file_fingerprint(
+                os.path.join(self.directory_path, file_path), content, digest
+            ),
+            tags,
+        )
+
+    def set_fingerprint(
+        self, file_path: str, fingerprint: dict[str, Any], tags: set[str]
+    ):
+        """Stores a fingerprint computed by `file_fingerprint` for a file."""
+        record = self._file_entry(file_path)
+        record.fingerprint = fingerprint
+        record.tags = id_array(map(self._codec.tags.id, tags))
+
+    def set_reference_locations(
+        self, file_path: str, digest: str, locations: list[list]
+    ):
+        """
+        Stores the [name, link, offset] reference locations of a file, found
+        by `reference_locations` in the content with hash `digest`.
+        """
+        self._file_entry(file_path).locations = {
+            "hash": digest,
+            "references": locations,
+        }
+
+    def get_reference_locations(self, file_path: str) -> Optional[list[list]]:
+        """
+        Returns the stored reference locations of a file, or None if there
+        are none for its current content.
+        """
+        if not self.is_file_unchanged(file_path):
+            return None
+        record = self._data["files"][file_path]
+        locations = record.locations
+        if locations is None or locations["hash"] != record.fingerprint["hash"]:
+            return None
+        return locations["references"]
+
+    def is_file_recorded(self, file_path: str) -> bool:
+        """Tells whether a fingerprint is stored for a file."""
+        record = self._data["files"].get(file_path)
+        return record is not None and record.fingerprint is not None
+
+    def is_file_unchanged(self, file_path: str) -> bool:
+        """
+        Checks a file against its stored fingerprint.
+        Size and mtime decide on their own unless the file was modified right
+        around its last check; then the content hash is compared.
+        """
+        record = self._data["files"].get(file_path)
+        fingerprint = None if record is None else record.fingerprint
+        if fingerprint is None:
+            return False
+        full_path = os.path.join(self.directory_path, file_path)
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != fingerprint["size"]:
+            return False
+        if (
+            stat.st_mtime_ns == fingerprint["mtime_ns"]
+            and stat.st_mtime_ns + RACY_WINDOW_NS < fingerprint["checked_ns"]
+        ):
+            return True
+        digest = hash_file(full_path)
+        if digest != fingerprint["hash"]:
+            return False
+        self.record_file(file_path, None, self.get_file_tags(file_path), digest)
+        return True
+
+    def remove_file(self, file_path: str):
+        """Forgets a file: its definitions, references and fingerprint."""
+        for tag in self.get_defined_tags(file_path):
+            self.remove_definition(tag, file_path)
+        file_id = self._codec.paths.find(file_path)
+        for tag in self.get_referenced_tags(file_path):
+            discard_id(self._data["tags"][tag].referenced_by_files, file_id)
+            self._dirty_tags.add(tag)
+        self._data["files"].pop(file_path, None)
+        self._dirty_files.add(file_path)
+
+    @staticmethod
+    def exists(directory_path: str) -> bool:
+        """Tells whether a directory has an index in any backend."""
+        return any(
+            os.path.exists(os.path.join(directory_path, name))
+            for name in (
+                TagIndex.INDEX_FILENAME,
+                TagIndex.SQLITE_FILENAME,
+                os.path.join(TagIndex.SHARDS_DIRNAME, ShardedStorage.MANIFEST),
             )
-            tag_data["referenced_by_files"].add(file_path)
+        )
+
+    def get_files(self) -> set[str]:
+        """Returns a set of all files known to the index."""
+        return set(self._data["files"].keys())
+
+    def get_file_tags(self, file_path: str) -> set[str]:
+        """Returns the tags extracted from a file when it was last recorded."""
+        record = self._data["files"].get(file_path)
+        if record is None or record.tags is None:
+            return set()
+        return self._names(record.tags, self._codec.tags)
+
+    def get_tag_links(self) -> dict[str, str]:
+        """Returns the canonical link target per tag, see canonical_link."""
+        return {
+            tag: canonical_link(tag, record.defining_files.values())
+            for tag, record in self._data["tags"].items()
+            if record.defining_files
+        }
+
+    def get_tag_link(self, tag: str) -> Optional[str]:
+        """Returns the canonical link target of a tag, None if undefined."""
+        record = self._data["tags"].get(tag)
+        if record is None:
+            return None
+        return canonical_link(tag, record.defining_files.values())
 
     def get_defining_files(self, tag: str) -> dict[str, str]:
         """Returns a dictionary of defining files for a tag."""
-        return self._data["tags"].get(tag, {}).get("defining_files", {})
+        record = self._data["tags"].get(tag)
+        if record is None:
+            return {}
+        paths = self._codec.paths
+        return {paths[file_id]: link for file_id, link in record.defining_files.items()}
 
     def get_referenced_files(self, tag: str) -> set[str]:
         """Returns a set of files referencing a tag."""
-        return self._data["tags"].get(tag, {}).get("referenced_by_files", set())
+        record = self._data["tags"].get(tag)
+        if record is None:
+            return set()
+        return self._names(record.referenced_by_files, self._codec.paths)
+
+    def get_defined_tags(self, file_path: str) -> set[str]:
+        """Returns a set of tags defined in a file."""
+        record = self._data["files"].get(file_path)
+        if record is None:
+            return set()
+        return self._names(record.defines, self._codec.tags)
+
+    def get_referenced_tags(self, file_path: str) -> set[str]:
+        """Returns a set of tags a file references."""
+        record = self._data["files"].get(file_path)
+        if record is None:
+            return set()
+        return self._names(record.references, self._codec.tags)
 
     def get_all_tags(self) -> set[str]:
         """Returns a set of all tags in the index."""
@@ -114,16 +553,112 @@ class TagIndex:
 
     def get_tag_data(self, tag: str) -> Optional[dict[str, Any]]:
         """Returns all data for a specific tag."""
-        return self._data["tags"].get(tag)
+        if tag not in self._data["tags"]:
+            return None
+        return {
+            "defining_files": self.get_defining_files(tag),
+            "referenced_by_files": self.get_referenced_files(tag),
+        }
+
+    def match_tags(self, name: str) -> set[str]:
+        """Returns the tag `name` if indexed, else its spellings in any case."""
+        if name in self._data["tags"]:
+            return {name}
+        return self._spellings(name)
+
+    def get_reference_counts(self) -> dict[str, int]:
+        """Returns the number of files referencing each tag."""
+        return {
+            tag: len(record.referenced_by_files)
+            for tag, record in self._data["tags"].items()
+        }
+
+    def get_unreferenced_tags(self) -> set[str]:
+        """Returns the tags that some file defines and no file references."""
+        return {
+            tag
+            for tag, record in self._data["tags"].items()
+            if record.defining_files and not record.referenced_by_files
+        }
+
+    def get_cooccurring_tags(self, tag: str) -> dict[str, int]:
+        """
+        Returns, for every other tag, the number of files that define or
+        reference it as well as `tag`.
+        """
+        record = self._data["tags"].get(tag)
+        if record is None:
+            return {}
+        paths = self._codec.paths
+        counts: Counter[int] = Counter()
+        for file_id in set(record.defining_files).union(record.referenced_by_files):
+            file_record = self._data["files"].get(paths[file_id])
+            if file_record is not None:
+                counts.update(set(file_record.defines).union(file_record.references))
+        counts.pop(self._codec.tags.find(tag), None)
+        return {self._codec.tags[tag_id]: n for tag_id, n in counts.items()}
+
+    def get_undefined_references(self) -> dict[str, set[str]]:
+        """
+        Returns the files referencing each name that no file defines: tags
+        whose definitions are gone and the [name][name] references of the
+        stored reference locations that match no tag.
+        """
+        undefined: dict[str, set[str]] = {}
+        defined = set()
+        for tag, record in self._data["tags"].items():
+            if record.defining_files:
+                defined.add(tag.lower())
+            elif record.referenced_by_files:
+                files = record.referenced_by_files
+                undefined[tag] = self._names(files, self._codec.paths)
+        for file_path, record in self._data["files"].items():
+            locations = record.locations
+            if (
+                locations is None
+                or record.fingerprint is None
+                or locations["hash"] != record.fingerprint["hash"]
+            ):
+                continue
+            for name, _, _ in locations["references"]:
+                if name.lower() not in defined:
+                    undefined.setdefault(name, set()).add(file_path)
+        return undefined
 
     def remove_tag_from_index(self, tag: str):
         """Completely removes a tag from the index."""
         if tag in self._data["tags"]:
-            del self._data["tags"][tag]
+            record = self._data["tags"].pop(tag)
+            self._dirty_tags.add(tag)
+            paths = self._codec.paths
+            for file_id in record.defining_files:
+                self._discard_from_file(paths[file_id], "defines", tag)
+            for file_id in record.referenced_by_files:
+                self._discard_from_file(paths[file_id], "references", tag)
+            self._discard_lower_tag(tag)
 
     def rename_tag_in_index(self, old_tag: str, new_tag: str):
         """Renames a tag in the index by transferring its data and references."""
-        if old_tag in self._data["tags"]:
-            tag_data = self._data["tags"][old_tag]
-            self._data["tags"][new_tag] = tag_data
-            del self._data["tags"][old_tag]
+        self.rename_tags_in_index({old_tag: new_tag})
+
+    def rename_tags_in_index(self, mapping: dict[str, str]):
+        """
+        Renames several tags at once. All old tags are taken out before the
+        new names are added, so tags can also swap names.
+        """
+        moved = {}
+        for old_tag in mapping:
+            if old_tag in self._data["tags"]:
+                moved[old_tag] = self._data["tags"][old_tag]
+                self.remove_tag_from_index(old_tag)
+        paths = self._codec.paths
+        for old_tag, record in moved.items():
+            new_tag = self._codec.tags.intern(mapping[old_tag])
+            new_id = self._codec.tags.id(new_tag)
+            self._data["tags"][new_tag] = record
+            self._dirty_tags.add(new_tag)
+            self._add_lower_tag(new_tag)
+            for file_id in record.defining_files:
+                add_id(self._file_entry(paths[file_id]).defines, new_id)
+            for file_id in record.referenced_by_files:
+                add_id(self._file_entry(paths[file_id]).references, new_id)
@@ -0,0 +1,242 @@
+import os
+import posixpath
+import re
+from typing import Iterator, Optional
+
+
+IGNORE_FILENAMES = (".gitignore", ".autolinkignore")
+# directories that are never part of a vault
+SKIPPED_DIRECTORIES = {".git"}
+# files whose presence marks the root of a vault
+ROOT_MARKERS = (
+    "autolink_index.json",
+    "autolink_index.sqlite",
+    os.path.join("autolink_index.shards", "manifest.json"),
+    "linklist.md",
+)
+
+
+def is_note(name: str) -> bool:
+    """Tells whether a file name is a Markdown note, linklist.md excluded."""
+    return name.lower().endswith(".md") and not name.endswith("linklist.md")
+
+
+def _pattern_regex(pattern: str) -> str:
+    """Translates a gitignore glob into a regex for a '/'-separated path."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRules:
+    """
+    Patterns of .gitignore and .autolinkignore files, in gitignore syntax.
+    Patterns of a file apply below the directory it is in; later patterns
+    win over earlier ones and `!pattern` re-includes a path.
+    """
+
+    def __init__(self):
+        # (compiled pattern, negated, directories only), in order
+        self.rules: list[tuple[re.Pattern, bool, bool]] = []
+
+    def add_file(self, file_path: str, base: str = ""):
+        """Reads the patterns of an ignore file located in directory `base`."""
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return
+        for line in lines:
+            self.add_pattern(line, base)
+
+    def add_pattern(self, line: str, base: str = ""):
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        directories_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return
+        if "/" in line:
+            # anchored to the directory of the ignore file
+            regex = _pattern_regex(line.lstrip("/"))
+        else:
+            regex = "(?:.*/)?" + _pattern_regex(line)
+        if base:
+            regex = re.escape(base + "/") + regex
+        self.rules.append((re.compile(regex + r"\Z"), negated, directories_only))
+
+    def copy(self) -> "IgnoreRules":
+        rules = IgnoreRules()
+        rules.rules = list(self.rules)
+        return rules
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Tells whether a '/'-separated path relative to the vault is ignored."""
+        ignored = False
+        for regex, negated, directories_only in self.rules:
+            if directories_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                ignored = not negated
+        return ignored
+
+
+def load_ignore_rules(root: str, rel_dir: str = "", rules=None) -> IgnoreRules:
+    """
+    Returns `rules` extended by the ignore files in directory `rel_dir`
+    of the vault at `root`.
+    """
+    rules = IgnoreRules() if rules is None else rules.copy()
+    directory = os.path.join(root, rel_dir)
+    for name in IGNORE_FILENAMES:
+        rules.add_file(os.path.join(directory, name), rel_dir)
+    return rules
+
+
+def walk_vault(
+    root: str, rel_dir: str = "", directories: Optional[list[str]] = None
+) -> Iterator[str]:
+    """
+    Yields the paths of the notes below `rel_dir` of the vault at `root`,
+    relative to the root and '/'-separated, directory by directory.
+    The file type of an entry comes from os.scandir without an extra stat,
+    ignored files and directories are skipped without being entered and
+    symlinked directories are followed once, so symlink loops end.
+    The relative paths of the walked directories are appended to
+    `directories` if given.
+    """
+    rules = IgnoreRules()
+    parts = rel_dir.split("/") if rel_dir else []
+    for depth in range(len(parts) + 1):
+        rules = load_ignore_rules(root, "/".join(parts[:depth]), rules)
+    return _walk(root, rel_dir, rules, directories)
+
+
+def _walk(
+    root: str, rel_dir: str, rules: IgnoreRules, directories: Optional[list[str]]
+) -> Iterator[str]:
+    visited: set[tuple[int, int]] = set()
+    stack = [(rel_dir, rules)]
+    while stack:
+        current, rules = stack.pop()
+        directory = os.path.join(root, current) if current else root
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            continue
+        if (stat.st_dev, stat.st_ino) in visited:
+            continue
+        visited.add((stat.st_dev, stat.st_ino))
+        if directories is not None:
+            directories.append(current)
+        if current != rel_dir:
+            rules = load_ignore_rules(root, current, rules)
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            rel_path = f"{current}/{entry.name}" if current else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name not in SKIPPED_DIRECTORIES and not rules.is_ignored(
+                    rel_path, True
+                ):
+                    subdirectories.append(rel_path)
+            elif (
+                is_note(entry.name)
+                and entry.is_file()
+                and not rules.is_ignored(rel_path)
+            ):
+                yield rel_path
+        # depth first, in sorted order
+        stack.extend((sub, rules) for sub in reversed(subdirectories))
+
+
+def is_ignored(root: str, rel_path: str, is_dir: bool = False) -> bool:
+    """
+    Tells whether a path relative to the vault at `root` is excluded from it,
+    by its own name or by one of its directories.
+    """
+    parts = rel_path.split("/")
+    rules = IgnoreRules()
+    for depth in range(len(parts)):
+        directory = "/".join(parts[:depth])
+        if directory and (
+            parts[depth - 1] in SKIPPED_DIRECTORIES
+            or rules.is_ignored(directory, True)
+        ):
+            return True
+        rules = load_ignore_rules(root, directory, rules)
+    return rules.is_ignored(rel_path, is_dir)
+
+
+def find_vault_root(path: str) -> str:
+    """
+    Returns the closest directory at or above `path` that holds an index or a
+    linklist.md; the directory of `path` itself if there is none.
+    """
+    directory = path if os.path.isdir(path) else os.path.dirname(path) or "."
+    directory = os.path.realpath(directory)
+    candidate = directory
+    while True:
+        if any(os.path.exists(os.path.join(candidate, m)) for m in ROOT_MARKERS):
+            return candidate
+        parent = os.path.dirname(candidate)
+        if parent == candidate:
+            return directory
+        candidate = parent
+
+
+def relative_link(link: str, from_file: str) -> str:
+    """
+    Rewrites a link relative to the vault root, like `dir/note.md#Header`,
+    so that it works from the note `from_file`.
+    """
+    from_dir = posixpath.dirname(from_file)
+    if not from_dir:
+        return link
+    target, hash_sign, anchor = link.partition("#")
+    return posixpath.relpath(target, from_dir) + hash_sign + anchor
+
+
+def vault_path(root: str, file_path: str) -> str:
+    """Returns the '/'-separated path of a file relative to the vault root."""
+    return os.path.relpath(file_path, root).replace(os.sep, "/")
@@ -0,0 +1,241 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Optional
+
+from .tag_index import TagIndex
+from .vault import is_ignored, is_note, walk_vault
+
+
+class PollingWatcher:
+    """
+    Detects changed Markdown files of a vault by comparing (mtime_ns, size)
+    of its notes between walks. Names are relative to the vault root.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for rel_path in walk_vault(self.path):
+            try:
+                stat = os.stat(os.path.join(self.path, rel_path))
+            except OSError:
+                continue
+            snapshot[rel_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def read(self, timeout: float) -> set[str]:
+        """Waits up to `timeout` seconds and returns the names that changed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                name
+                for name in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(name) != self._snapshot.get(name)
+            }
+            self._snapshot = snapshot
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects changed Markdown files of a vault through the Linux inotify API,
+    called via ctypes, with one watch per directory of the vault.
+    Files are reported once they are closed after writing, moved in or out,
+    or deleted; a directory that disappears is reported as "dir/".
+    Names are relative to the vault root.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # watch descriptor -> directory relative to the vault root
+        self._directories: dict[int, str] = {}
+        try:
+            self._watch_tree("")
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, rel_dir: str) -> list[str]:
+        """Watches a directory and its subdirectories, returns their notes."""
+        directories: list[str] = []
+        notes = list(walk_vault(self.path, rel_dir, directories))
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(os.path.join(self.path, directory)), self.MASK
+            )
+            if wd < 0:
+                raise OSError(
+                    ctypes.get_errno(), f"inotify_add_watch failed for {directory}"
+                )
+            self._directories.setdefault(wd, directory)
+        return notes
+
+    def read(self, timeout: float) -> set[str]:
+        """Waits up to `timeout` seconds and returns the names that changed."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        try:
+            while True:
+                buffer = os.read(self._fd, 64 * 1024)
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, _, length = self.EVENT_HEADER.unpack_from(buffer, offset)
+                    offset += self.EVENT_HEADER.size
+                    name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+                    offset += length
+                    changed.update(self._event_names(wd, mask, name))
+        except BlockingIOError:
+            pass
+        return changed
+
+    def _event_names(self, wd: int, mask: int, name: str) -> list[str]:
+        if mask & self.IN_Q_OVERFLOW:
+            # events were lost, report every note as changed
+            return list(walk_vault(self.path))
+        if mask & self.IN_IGNORED:
+            self._directories.pop(wd, None)
+            return []
+        directory = self._directories.get(wd)
+        if directory is None:
+            return []
+        rel_path = f"{directory}/{name}" if directory else name
+        if not mask & self.IN_ISDIR:
+            return [rel_path] if is_note(name) else []
+        if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            if is_ignored(self.path, rel_path, True):
+                return []
+            try:
+                return self._watch_tree(rel_path)
+            except OSError:
+                return []
+        if mask & (self.IN_MOVED_FROM | self.IN_DELETE):
+            return [rel_path + "/"]
+        return []
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(path: str, interval: float = 1.0, polling: bool = False):
+    """
+    Returns an InotifyWatcher where inotify is available, a PollingWatcher
+    otherwise or if `polling` is set.
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(path, interval)
+
+
+class DirectoryWatch:
+    """
+    Keeps the TagIndex of a directory loaded and relinks changed files.
+    Changes are collected until no new one arrives for `debounce` seconds
+    and then handed to update_tags_on_files as one batch.
+    Files that still match their fingerprint in the index are ignored, so
+    the files written while relinking do not trigger another batch; so are
+    files excluded by the ignore rules of the vault.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        debounce: float = 0.5,
+        interval: float = 1.0,
+        polling: bool = False,
+    ):
+        self.path = path
+        self.debounce = debounce
+        self.tag_index = TagIndex(path)
+        self.watcher = make_watcher(path, interval, polling)
+
+    def collect(self, timeout: Optional[float] = None) -> list[str]:
+        """
+        Waits up to `timeout` seconds (forever if None) for a change and
+        returns the names changed by others once the changes settle.
+        """
+        names = set()
+        while not names:
+            started = time.monotonic()
+            names = self.watcher.read(1.0 if timeout is None else timeout)
+            if timeout is not None:
+                timeout -= time.monotonic() - started
+                if not names and timeout <= 0:
+                    return []
+        while more := self.watcher.read(self.debounce):
+            names |= more
+        # a removed directory stands for the notes that were in it
+        for prefix in [name for name in names if name.endswith("/")]:
+            names.discard(prefix)
+            names.update(n for n in self.tag_index.get_files() if n.startswith(prefix))
+        known = self.tag_index.get_files()
+        return sorted(
+            name
+            for name in names
+            if not self.tag_index.is_file_unchanged(name)
+            and (name in known or not is_ignored(self.path, name))
+        )
+
+    def process(self, names: list[str]) -> dict[str, float]:
+        """Relinks the given files against the resident index."""
+        from .autolink import update_tags_on_files
+
+        return update_tags_on_files(
+            self.path,
+            [os.path.join(self.path, name) for name in names],
+            tag_index=self.tag_index,
+        )
+
+    def run(
+        self,
+        on_batch: Optional[Callable[[list[str], dict[str, float]], None]] = None,
+    ):
+        """Processes batches until interrupted."""
+        while True:
+            names = self.collect()
+            if not names:
+                continue
+            timings = self.process(names)
+            if on_batch is not None:
+                on_batch(names, timings)
+
+    def close(self):
+        self.watcher.close()
+        self.tag_index.close()
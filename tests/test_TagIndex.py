@@ -41,7 +41,12 @@ def test_tag_index_init_no_file(temp_dir):
     It should start with an empty internal data structure.
     """
     index = TagIndex(str(temp_dir))
-    assert index._data == {"tags": {}, "last_updated": None}
+    assert index._data == {
+        "tags": {},
+        "files": {},
+        "last_updated": None,
+        "generation": 0,
+    }
     assert not os.path.exists(index.index_file_path)
 
 
@@ -62,11 +67,9 @@ def test_tag_index_init_existing_file(temp_dir, tag_index_path):
     create_dummy_index(tag_index_path, initial_data)
 
     index = TagIndex(str(temp_dir))
-    assert "tag1" in index._data["tags"]
-    assert index._data["tags"]["tag1"]["defining_files"] == {
-        "file1.md": "file1.md#tag1"
-    }
-    assert index._data["tags"]["tag1"]["referenced_by_files"] == {
+    assert "tag1" in index.get_all_tags()
+    assert index.get_defining_files("tag1") == {"file1.md": "file1.md#tag1"}
+    assert index.get_referenced_files("tag1") == {
         "file2.md",
         "file3.md",
     }  # Should be converted to set
@@ -80,7 +83,12 @@ def test_tag_index_init_invalid_json(temp_dir, tag_index_path, capsys):
     """
     tag_index_path.write_text("invalid json {")
     index = TagIndex(str(temp_dir))
-    assert index._data == {"tags": {}, "last_updated": None}
+    assert index._data == {
+        "tags": {},
+        "files": {},
+        "last_updated": None,
+        "generation": 0,
+    }
     captured = capsys.readouterr()
     assert "Warning: Could not decode JSON" in captured.out
 
@@ -231,3 +239,276 @@ def test_tag_index_remove_tag_from_index(temp_dir):
 
     index.remove_tag_from_index("non_existent_tag")  # Should not raise error
     assert index.get_all_tags() == {"tag2"}
+
+
+def test_tag_index_file_map(temp_dir, tag_index_path):
+    """
+    Tests the file -> tags reverse map: it follows definitions, references,
+    renames and removals, is persisted, and is rebuilt for older index files.
+    """
+    index = TagIndex(str(temp_dir))
+    index.add_definition("tag1", "fileA.md", "fileA.md#tag1")
+    index.add_definition("Tag2", "fileB.md", "fileB.md#Tag2")
+    index.update_file_references(
+        "fileA.md", index.get_all_tags(), "[tag2][tag2] and [[tag1]]"
+    )
+    assert index.get_defined_tags("fileA.md") == {"tag1"}
+    assert index.get_referenced_tags("fileA.md") == {"tag1", "Tag2"}
+
+    index.rename_tag_in_index("Tag2", "tag3")
+    assert index.get_referenced_tags("fileA.md") == {"tag1", "tag3"}
+    assert index.get_defined_tags("fileB.md") == {"tag3"}
+
+    index.remove_tag_from_index("tag3")
+    assert index.get_referenced_tags("fileA.md") == {"tag1"}
+    assert index.get_defined_tags("fileB.md") == set()
+
+    index.save()
+    with open(tag_index_path, "r", encoding="utf-8") as f:
+        saved_data = json.load(f)
+    assert saved_data["files"] == {
+        "fileA.md": {"defines": ["tag1"], "references": ["tag1"]}
+    }
+
+    del saved_data["files"]
+    create_dummy_index(tag_index_path, saved_data)
+    index = TagIndex(str(temp_dir))
+    assert index.get_defined_tags("fileA.md") == {"tag1"}
+    assert index.get_referenced_tags("fileA.md") == {"tag1"}
+
+
+def test_tag_index_fingerprints(temp_dir):
+    """
+    Tests `record_file` and `is_file_unchanged`: a recorded file counts as
+    unchanged until its content changes, even within the same mtime tick.
+    """
+    note = temp_dir / "note.md"
+    note.write_text("# Alpha")
+    index = TagIndex(str(temp_dir))
+    assert not index.is_file_unchanged("note.md")
+
+    index.record_file("note.md", note.read_text(), {"Alpha"})
+    assert index.is_file_unchanged("note.md")
+    assert index.get_file_tags("note.md") == {"Alpha"}
+
+    mtime_ns = note.stat().st_mtime_ns
+    note.write_text("# Gamma")
+    os.utime(note, ns=(mtime_ns, mtime_ns))
+    assert not index.is_file_unchanged("note.md")
+
+    index.save()
+    reloaded = TagIndex(str(temp_dir))
+    assert reloaded.get_file_tags("note.md") == {"Alpha"}
+    reloaded.remove_file("note.md")
+    assert "note.md" not in reloaded.get_files()
+
+
+def test_tag_index_sqlite_backend(temp_dir):
+    """
+    Tests the SQLite backend: it round-trips the same data as the JSON file
+    and a save only covers the tags and files changed since the last one.
+    """
+    index = TagIndex(str(temp_dir), backend="sqlite")
+    assert index.index_file_path.endswith(TagIndex.SQLITE_FILENAME)
+    index.add_definition("tag1", "fileA.md", "fileA.md#tag1")
+    index.add_definition("tag2", "fileB.md", "fileB.md#tag2")
+    index.update_file_references(
+        "fileC.md", index.get_all_tags(), "[tag1][tag1] and [[tag2]]"
+    )
+    (temp_dir / "fileC.md").write_text("content")
+    index.record_file("fileC.md", "content", {"tag3"})
+    index.save()
+    index.close()
+
+    reloaded = TagIndex(str(temp_dir))
+    assert reloaded.backend == "sqlite"
+    saved = index._codec.to_json(index._data)
+    loaded = reloaded._codec.to_json(reloaded._data)
+    assert loaded["tags"] == saved["tags"]
+    assert loaded["files"] == saved["files"]
+    assert reloaded.is_file_unchanged("fileC.md")
+
+    reloaded.update_file_references("fileC.md", reloaded.get_all_tags(), "[[tag2]]")
+    reloaded.remove_tag_from_index("tag1")
+    assert reloaded._dirty_files == {"fileA.md", "fileC.md"}
+    assert reloaded._dirty_tags == {"tag1"}
+    reloaded.save()
+    reloaded.close()
+
+    final = TagIndex(str(temp_dir))
+    assert final.get_all_tags() == {"tag2"}
+    assert final.get_referenced_files("tag2") == {"fileC.md"}
+    assert final.get_defined_tags("fileA.md") == set()
+    final.close()
+
+
+def test_sqlite_index_reads_entries_on_first_use(temp_dir):
+    """
+    Tests that the SQLite backend reads a tag or file with point queries
+    when it is first used instead of the whole index on load.
+    """
+    from autolink.instrument import recording
+
+    index = TagIndex(str(temp_dir), backend="sqlite")
+    for i in range(100):
+        index.add_definition(f"Tag{i}", f"file{i}.md", f"file{i}.md#Tag{i}")
+    index.save()
+    index.close()
+
+    with recording() as recorder:
+        reloaded = TagIndex(str(temp_dir))
+        assert reloaded.get_defining_files("Tag7") == {"file7.md": "file7.md#Tag7"}
+        assert reloaded.match_tags("tag8") == {"Tag8"}
+        reloaded.set_file_references("notes.md", None, {"TAG9"})
+    assert recorder.counters["index_rows_read"] <= 4
+    assert reloaded._data["tags"].entries.keys() == {"Tag7", "Tag9"}
+    reloaded.remove_tag_from_index("Tag7")
+    assert "Tag7" not in reloaded.get_all_tags()
+    assert len(reloaded.get_all_tags()) == 99
+    reloaded.save()
+    reloaded.close()
+
+    final = TagIndex(str(temp_dir))
+    assert final.get_referenced_files("Tag9") == {"notes.md"}
+    assert final.get_defining_files("Tag7") == {}
+    final.close()
+
+
+def test_tag_index_sharded_backend(temp_dir):
+    """
+    Tests the sharded backend: shards are read on first use and a save only
+    rewrites the shards of the tags and files that changed.
+    """
+    from autolink.instrument import recording
+
+    index = TagIndex(str(temp_dir), backend="sharded")
+    for i in range(100):
+        index.add_definition(f"tag{i}", f"file{i}.md", f"file{i}.md#tag{i}")
+    index.update_file_references("notes.md", index.get_all_tags(), "[tag1][tag1]")
+    index.save()
+    shard_dir = temp_dir / TagIndex.SHARDS_DIRNAME
+    assert (shard_dir / "manifest.json").exists()
+
+    with recording() as recorder:
+        reloaded = TagIndex(str(temp_dir))
+        assert reloaded.backend == "sharded"
+        assert reloaded.get_defining_files("tag7") == {"file7.md": "file7.md#tag7"}
+        assert reloaded.get_referenced_files("tag1") == {"notes.md"}
+    assert recorder.counters["index_shards_read"] == 2
+
+    def shard_files():
+        return {
+            entry.name: entry.stat().st_ino
+            for entry in os.scandir(shard_dir)
+            if entry.name != "manifest.json"
+        }
+
+    before = shard_files()
+    reloaded.remove_tag_from_index("tag7")
+    reloaded.save()
+    after = shard_files()
+    # only the shard of tag7 and the shard of file7.md are replaced
+    changed = {name for name in before if after.get(name) != before[name]}
+    assert len(changed) == 2
+
+    final = TagIndex(str(temp_dir))
+    assert final.get_all_tags() == index.get_all_tags() - {"tag7"}
+    assert final.get_defined_tags("file7.md") == set()
+    assert final.get_tag_links()["tag8"] == "file8.md#tag8"
+
+    # a new reference to an existing tag rewrites that tag's shard as well
+    final.update_file_references("file9.md", {"tag8"}, "[tag8][tag8]")
+    final.save()
+    assert TagIndex(str(temp_dir)).get_referenced_files("tag8") == {"file9.md"}
+
+
+def test_sharded_references_read_only_their_shards(temp_dir):
+    """
+    Tests that references are matched to tags ignoring case from the shards
+    of the referenced names, and that an index hashed by exact spelling is
+    rewritten in the current layout.
+    """
+    from autolink.instrument import recording
+    from autolink.storage import ShardedStorage
+
+    index = TagIndex(str(temp_dir), backend="sharded")
+    index._storage.version = 1
+    for i in range(100):
+        index.add_definition(f"Tag{i}", f"file{i}.md", f"file{i}.md#Tag{i}")
+    index.save()
+
+    migrated = TagIndex(str(temp_dir))
+    assert migrated.match_tags("tag42") == {"Tag42"}
+    migrated.save()
+    with open(temp_dir / TagIndex.SHARDS_DIRNAME / ShardedStorage.MANIFEST) as f:
+        assert json.load(f)["version"] == ShardedStorage.VERSION
+
+    with recording() as recorder:
+        reloaded = TagIndex(str(temp_dir))
+        reloaded.set_file_references("notes.md", None, {"tag1", "TAG2", "none"})
+    # the shards of the three names and of notes.md
+    assert recorder.counters["index_shards_read"] <= 4
+    assert reloaded.get_referenced_tags("notes.md") == {"Tag1", "Tag2"}
+    reloaded.save()
+    assert TagIndex(str(temp_dir)).get_referenced_files("Tag2") == {"notes.md"}
+
+
+def test_convert_index(temp_dir, tag_index_path):
+    """
+    Tests converting the JSON index to SQLite, to shards and back without
+    losing data.
+    """
+    from autolink import convert_index
+
+    index = TagIndex(str(temp_dir))
+    index.add_definition("tag1", "fileA.md", "fileA.md#tag1")
+    index.update_file_references("fileB.md", {"tag1"}, "[tag1][tag1]")
+    index.save()
+
+    convert_index(str(temp_dir), "sqlite")
+    assert not tag_index_path.exists()
+    converted = TagIndex(str(temp_dir))
+    assert converted.backend == "sqlite"
+    assert converted.get_referenced_files("tag1") == {"fileB.md"}
+    converted.close()
+
+    convert_index(str(temp_dir), "sharded")
+    assert not (temp_dir / TagIndex.SQLITE_FILENAME).exists()
+    sharded = TagIndex(str(temp_dir))
+    assert sharded.backend == "sharded"
+    assert sharded.get_referenced_files("tag1") == {"fileB.md"}
+
+    convert_index(str(temp_dir), "json")
+    assert not (temp_dir / TagIndex.SHARDS_DIRNAME).exists()
+    restored = TagIndex(str(temp_dir))
+    assert restored.backend == "json"
+    assert restored.get_defining_files("tag1") == {"fileA.md": "fileA.md#tag1"}
+    assert restored.get_referenced_files("tag1") == {"fileB.md"}
+
+
+@pytest.mark.parametrize("backend", TagIndex.BACKENDS)
+def test_tag_index_reference_locations(temp_dir, backend):
+    """
+    Tests that reference locations survive a save and are only handed out
+    while the file still has the content they were found in.
+    """
+    from autolink.tag_index import content_hash
+
+    note = temp_dir / "note.md"
+    note.write_text("[a][a]\n# Head\n[b][b]")
+    index = TagIndex(str(temp_dir), backend=backend)
+    locations = [["a", "note.md", 0], ["b", "note.md#Head", 14]]
+    index.set_reference_locations("note.md", content_hash("x"), locations)
+    assert index.get_reference_locations("note.md") is None
+    index.record_file("note.md", note.read_text(), set())
+    assert index.get_reference_locations("note.md") is None
+    index.set_reference_locations("note.md", content_hash(note.read_text()), locations)
+    assert index.get_reference_locations("note.md") == locations
+    index.save()
+    index.close()
+
+    reloaded = TagIndex(str(temp_dir), backend=backend)
+    assert reloaded.get_reference_locations("note.md") == locations
+    note.write_text("changed")
+    assert reloaded.get_reference_locations("note.md") is None
+    reloaded.close()
@@ -1,7 +1,10 @@
 import pytest
 import json
+import os
+from unittest.mock import patch
 
 import autolink.autolink as autolink
+from autolink import TagIndex
 
 
 def test_get_tags_from_name(tmp_path):
@@ -257,3 +260,387 @@ This note now talks about Tag B.
     # Tag C should be defined in note1.md and have no references
     assert index_data["tags"]["Tag C"]["defining_files"]["note1.md"] == "note1.md#Tag-C"
     assert not index_data["tags"]["Tag C"]["referenced_by_files"]
+
+
+def test_add_links_from_index(tmp_path):
+    index = TagIndex(str(tmp_path))
+    index.add_definition("Alpha", "a.md", "a.md#Alpha")
+    index.add_definition("Alpha Beta", "b.md", "b.md#Alpha-Beta")
+    index.add_definition("c++", "c.md", "c.md")
+    text = (
+        "[tags]:# (Gamma, )\n# Gamma\nalpha beta and Alpha, [[c++]]\n"
+        "[Alpha]: a.md#Alpha (autolink)"
+    )
+    out = autolink.add_links_from_index(text, index)
+    assert out == (
+        "[tags]:# (Gamma, )\n# Gamma\n[Alpha Beta][Alpha Beta] and [Alpha][Alpha], "
+        "[c++][c++]\n"
+        "[Alpha]: a.md#Alpha (autolink)\n"
+        "[Alpha Beta]: b.md#Alpha-Beta (autolink)\n"
+        "[c++]: c.md (autolink)"
+    )
+
+
+def test_update_tags_on_files_batch(tmp_path):
+    """
+    A batch update loads and saves the index once and leaves the directory
+    in the same state as updating the files one by one.
+    """
+    (tmp_path / "a.md").write_text("# Alpha\ncontent, Beta")
+    (tmp_path / "b.md").write_text("# Beta\ncontent with Alpha")
+    autolink.initialize_tagging(str(tmp_path))
+    (tmp_path / "a.md").write_text("# Alpha\n# Gamma\ncontent, Beta")
+    (tmp_path / "b.md").write_text("# Beta\nGamma and Alpha")
+
+    with patch.object(
+        TagIndex, "save", autospec=True, side_effect=TagIndex.save
+    ) as save:
+        timings = autolink.update_tags_on_files(
+            str(tmp_path), [str(tmp_path / "a.md"), str(tmp_path / "b.md")]
+        )
+    assert save.call_count == 1
+    assert set(timings) == {"load", "update", "relink", "save"}
+
+    text_b = (tmp_path / "b.md").read_text()
+    assert "[Gamma][Gamma]" in text_b
+    assert "[Gamma]: a.md#Gamma (autolink)" in text_b
+    assert "[Gamma](a.md#Gamma);" in (tmp_path / "linklist.md").read_text()
+    assert TagIndex(str(tmp_path)).get_defined_tags("a.md") == {"Alpha", "Gamma"}
+
+
+def test_linklist_rendered_from_index(tmp_path, monkeypatch):
+    """
+    linklist.md lists the canonical location of every tag in sorted order and
+    is left alone by updates that do not change any tag or location.
+    """
+    assert autolink.render_linklist({"b": "x.md#b", "a": "y.md"}) == (
+        "[tags]:# (a, b, )\n[a](y.md); \n\n[b](x.md#b); \n\n"
+    )
+    (tmp_path / "b.md").write_text("# Beta\ncontent")
+    (tmp_path / "a.md").write_text("# Alpha\n# Beta\ncontent")
+    autolink.initialize_tagging(str(tmp_path))
+    linklist = tmp_path / "linklist.md"
+    assert linklist.read_text() == autolink.render_linklist(
+        {"Alpha": "a.md#Alpha", "Beta": "a.md#Beta"}
+    )
+
+    writes = []
+    monkeypatch.setattr(autolink, "write_atomic", lambda *args: writes.append(args))
+    (tmp_path / "b.md").write_text("# Beta\nother content")
+    autolink.update_tags_on_file(str(tmp_path / "b.md"))
+    assert writes == []
+    (tmp_path / "b.md").write_text("# Beta\n# Gamma\nother content")
+    autolink.update_tags_on_file(str(tmp_path / "b.md"))
+    assert [os.path.basename(path) for path, _ in writes] == ["linklist.md"]
+    assert "[Gamma](b.md#Gamma); " in writes[0][1]
+
+
+def test_dead_tags_cleaned_once_per_file(tmp_path):
+    """
+    Tags that die in the same update are unlinked in a referencing file with
+    a single rewrite, and dropped from the index and the linklist.
+    """
+    (tmp_path / "a.md").write_text("# Alpha\n# Beta\ncontent")
+    (tmp_path / "b.md").write_text("# Gamma\nAlpha and Beta")
+    autolink.initialize_tagging(str(tmp_path))
+    (tmp_path / "a.md").write_text("content")
+
+    with patch.object(
+        autolink,
+        "_remove_tags_references_from_file",
+        side_effect=autolink._remove_tags_references_from_file,
+    ) as remove:
+        autolink.update_tags_on_file(str(tmp_path / "a.md"))
+
+    assert [call.args[1] for call in remove.call_args_list] == [
+        os.path.join(str(tmp_path), "b.md")
+    ]
+    text_b = (tmp_path / "b.md").read_text()
+    assert "Alpha and Beta" in text_b
+    assert "[Alpha]" not in text_b and "[Beta]" not in text_b
+    linklist = (tmp_path / "linklist.md").read_text()
+    assert "Alpha" not in linklist and "Beta" not in linklist
+    assert "[tags]:# (Gamma, )" in linklist
+    assert TagIndex(str(tmp_path)).get_all_tags() == {"Gamma"}
+
+
+def test_collect_garbage(tmp_path, capsys):
+    """gc forgets deleted files and removes the tags only they defined."""
+    (tmp_path / "a.md").write_text("# Alpha\n# Beta\ncontent")
+    (tmp_path / "b.md").write_text("# Gamma\nAlpha and Beta")
+    autolink.initialize_tagging(str(tmp_path))
+    os.remove(tmp_path / "a.md")
+
+    autolink.terminal_operation(["gc", str(tmp_path)])
+
+    assert "Removed 2 dead tags: Alpha, Beta" in capsys.readouterr().out
+    text_b = (tmp_path / "b.md").read_text()
+    assert "Alpha and Beta" in text_b and "(autolink)" not in text_b
+    tag_index = TagIndex(str(tmp_path))
+    assert tag_index.get_all_tags() == {"Gamma"}
+    assert tag_index.get_files() == {"b.md"}
+    assert "Alpha" not in (tmp_path / "linklist.md").read_text()
+    assert autolink.collect_garbage(str(tmp_path)) == set()
+
+
+def test_initialize_tagging_skips_unchanged_files(tmp_path):
+    """
+    A second init leaves unchanged files alone and only relinks the files
+    mentioning a tag that was added in the meantime.
+    """
+    a = tmp_path / "a.md"
+    b = tmp_path / "b.md"
+    c = tmp_path / "c.md"
+    a.write_text("# Alpha\ncontent")
+    b.write_text("# Beta\nAlpha and Gamma")
+    c.write_text("# Delta\nnothing here")
+    autolink.initialize_tagging(str(tmp_path))
+    old_ns = 1_000_000_000_000_000_000
+    for f in (a, b, c):
+        os.utime(f, ns=(old_ns, old_ns))
+
+    a.write_text("[tags]:# (Alpha, )\n# Alpha\ncontent\n# Gamma\nmore")
+    autolink.initialize_tagging(str(tmp_path))
+
+    assert c.stat().st_mtime_ns == old_ns
+    assert "[Gamma][Gamma]" in b.read_text()
+    assert "[Gamma]: a.md#Gamma (autolink)" in b.read_text()
+
+    # forcing reprocesses every file, but identical content is not rewritten
+    text_c = c.read_text()
+    autolink.initialize_tagging(str(tmp_path), force=True)
+    assert c.read_text() == text_c
+    assert c.stat().st_mtime_ns == old_ns
+
+
+def test_initialize_tagging_writes_once(tmp_path, monkeypatch):
+    """
+    Every file is written at most once per init, also when its text does not
+    fit into the memory budget, and the index is saved once.
+    """
+    (tmp_path / "a.md").write_text("# Alpha\ncontent, Beta")
+    (tmp_path / "b.md").write_text("# Beta\ncontent with Alpha")
+    writes = []
+    real_open = open
+
+    def counting_open(file, mode="r", *args, **kwargs):
+        if "w" in mode:
+            writes.append(os.path.basename(file))
+        return real_open(file, mode, *args, **kwargs)
+
+    def counting_write_atomic(file_path, text):
+        writes.append(os.path.basename(file_path))
+        real_write_atomic(file_path, text)
+
+    real_write_atomic = autolink.write_atomic
+    monkeypatch.setattr("builtins.open", counting_open)
+    monkeypatch.setattr(autolink, "write_atomic", counting_write_atomic)
+    monkeypatch.setattr("autolink.storage.write_atomic", counting_write_atomic)
+    with patch.object(
+        TagIndex, "save", autospec=True, side_effect=TagIndex.save
+    ) as save:
+        autolink.initialize_tagging(str(tmp_path), memory_budget=30)
+    assert sorted(writes) == ["a.md", "autolink_index.json", "b.md", "linklist.md"]
+    assert save.call_count == 1
+    assert "[Alpha][Alpha]" in (tmp_path / "b.md").read_text()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_initialize_tagging_unlinks_dead_tags_in_changed_files(
+    tmp_path, monkeypatch, jobs
+):
+    """
+    A changed file that references a tag which lost its definition is
+    unlinked on the text it is linked from, and written once.
+    """
+    (tmp_path / "a.md").write_text("# Xray\ncontent")
+    (tmp_path / "b.md").write_text("about Xray here")
+    autolink.initialize_tagging(str(tmp_path))
+    assert "[Xray][Xray]" in (tmp_path / "b.md").read_text()
+
+    (tmp_path / "a.md").write_text("# Yankee\ncontent")
+    (tmp_path / "b.md").write_text(
+        (tmp_path / "b.md").read_text().replace("here", "here, edited")
+    )
+    writes = []
+    real_open = open
+
+    def counting_open(file, mode="r", *args, **kwargs):
+        if "w" in mode or "+" in mode:
+            writes.append(os.path.basename(file))
+        return real_open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    autolink.initialize_tagging(str(tmp_path), jobs=jobs)
+    monkeypatch.undo()
+    text = (tmp_path / "b.md").read_text()
+    assert "about Xray here, edited" in text
+    assert "[Xray]" not in text
+    if jobs == 1:
+        assert writes.count("b.md") == 1
+    assert "Xray" not in TagIndex(str(tmp_path)).get_all_tags()
+
+
+def test_initialize_tagging_parallel(tmp_path):
+    """
+    Running init on a process pool gives the same files and index as a
+    sequential run.
+    """
+    notes = {
+        "a.md": "# Alpha\ncontent, Beta and [[Delta]]",
+        "b.md": "# Beta\ncontent with Alpha\n## Gamma\nmore",
+        "c.md": "# Gamma\nAlpha and Beta appear here",
+        "d.md": "no headers, but Gamma",
+    }
+    results = []
+    for jobs in (1, 2):
+        vault = tmp_path / f"jobs{jobs}"
+        vault.mkdir()
+        for name, text in notes.items():
+            (vault / name).write_text(text)
+        autolink.initialize_tagging(str(vault), jobs=jobs)
+        index = TagIndex(str(vault))
+        results.append(
+            (
+                {name: (vault / name).read_text() for name in notes},
+                (vault / "linklist.md").read_text(),
+                {
+                    tag: (
+                        index.get_defining_files(tag),
+                        index.get_referenced_files(tag),
+                    )
+                    for tag in index.get_all_tags()
+                },
+            )
+        )
+    assert results[0] == results[1]
+
+
+def test_get_tag_headers():
+    text = (
+        "[tags]:# (Alpha, )\n\nAlpha first\n# Header One\nab and c++\n"
+        "## Sub Header\nabc\n# ab\nzzz"
+    )
+    tags = {"Alpha", "abc", "c++", "ab", "none"}
+    tag_paths = autolink.get_tag_headers(tags, text, "d/f.md")
+    assert tag_paths == {
+        "Alpha": "d/f.md",
+        "Header One": "d/f.md#Header-One",
+        "Sub Header": "d/f.md#Sub-Header",
+        "ab": "d/f.md#ab",
+        "abc": "d/f.md#Sub-Header",
+        "c++": "d/f.md#Header-One",
+        "none": "d/f.md",
+    }
+    # a tag has to lie within one section, header lines do not count
+    assert autolink.get_tag_headers({"One\nab"}, text, "f.md") == {
+        "Header One": "f.md#Header-One",
+        "Sub Header": "f.md#Sub-Header",
+        "ab": "f.md#ab",
+        "One\nab": "f.md",
+    }
+
+
+def test_section_map():
+    from autolink.sections import SectionMap
+
+    sections = SectionMap("intro\n# One\nbody\n### Two Words\nmore")
+    assert sections.titles == ["One", "Two Words"]
+    assert sections.levels == [1, 3]
+    assert sections.anchors == ["One", "Two-Words"]
+    assert sections.section(0, 5) == 0
+    assert sections.section(7, 9) is None
+    assert sections.section(12, 16) == 1
+    assert sections.section(12, 20) is None
+    assert sections.link("f.md", 2) == "f.md#Two-Words"
+    assert sections.locate({"more", "o", "x"}) == {"more": 2, "o": 0, "x": 0}
+
+
+def test_links_target_the_header_of_a_tag(tmp_path):
+    """
+    Every file carrying a tag defines it, but links go to the header named
+    after the tag rather than to the first defining file.
+    """
+    (tmp_path / "a.md").write_text("See [[Xray]] first")
+    (tmp_path / "c.md").write_text("# Xray\nthe definition")
+    (tmp_path / "d.md").write_text("mentions Xray")
+    autolink.initialize_tagging(str(tmp_path))
+    index = TagIndex(str(tmp_path))
+    assert set(index.get_defining_files("Xray")) == {"a.md", "c.md"}
+    assert index.get_tag_links()["Xray"] == "c.md#Xray"
+    assert "[Xray]: c.md#Xray (autolink)" in (tmp_path / "a.md").read_text()
+    assert "[Xray]: c.md#Xray (autolink)" in (tmp_path / "d.md").read_text()
+
+    (tmp_path / "c.md").write_text("the definition is gone")
+    autolink.update_tags_on_file(str(tmp_path / "c.md"))
+    assert "[Xray]: a.md (autolink)" in (tmp_path / "d.md").read_text()
+
+
+def test_update_after_removing_a_header_matches_init(tmp_path):
+    """
+    A file that drops the header of a tag but keeps the tag no longer holds
+    the link target of it; updating gives the same index and links as a
+    full initialization.
+    """
+    for mode in ("update", "init"):
+        vault = tmp_path / mode
+        vault.mkdir()
+        (vault / "a.md").write_text("# Alpha\ntext")
+        (vault / "b.md").write_text("# Alpha\nmore")
+        (vault / "c.md").write_text("about Alpha")
+        autolink.initialize_tagging(str(vault))
+        assert TagIndex(str(vault)).get_tag_links()["Alpha"] == "a.md#Alpha"
+        text = (vault / "a.md").read_text().replace("# Alpha\n", "")
+        assert "[tags]:# (Alpha, )" in text
+        (vault / "a.md").write_text(text)
+    autolink.update_tags_on_file(str(tmp_path / "update" / "a.md"))
+    autolink.initialize_tagging(str(tmp_path / "init"), force=True)
+    updated = TagIndex(str(tmp_path / "update"))
+    assert updated.get_tag_links()["Alpha"] == "b.md#Alpha"
+    assert updated.get_defining_files("Alpha") == TagIndex(
+        str(tmp_path / "init")
+    ).get_defining_files("Alpha")
+    for name in ("a.md", "b.md", "c.md", "linklist.md"):
+        assert (tmp_path / "update" / name).read_text() == (
+            tmp_path / "init" / name
+        ).read_text()
+
+
+def test_find_links_to_tag(tmp_path):
+    (tmp_path / "a.md").write_text("[C++][c++]\n# Head\n[c++][c++] x\n")
+    (tmp_path / "b.md").write_text("# [c++][c++]\ntext")
+    assert autolink.find_links_to_tag("c++", str(tmp_path)) == ["a.md", "a.md#Head"]
+
+
+def test_queries_from_index(tmp_path, monkeypatch):
+    (tmp_path / "a.md").write_text("# Alpha\n\ntext")
+    (tmp_path / "b.md").write_text("intro Alpha\n# Beta\nAlpha again\n")
+    autolink.initialize_tagging(str(tmp_path))
+    index = TagIndex(str(tmp_path))
+    assert index.get_reference_locations("b.md") == [
+        ["Alpha", "b.md", 24],
+        ["Alpha", "b.md#Beta", 46],
+    ]
+    expected = ["b.md", "b.md#Beta"]
+    assert autolink.find_links_to_tag("alpha", str(tmp_path)) == expected
+    assert autolink.get_origin("Beta", str(tmp_path)).endswith("b.md")
+
+    # unchanged files are answered without reading them, once they were
+    # checked outside of the racy window
+    monkeypatch.setattr("autolink.tag_index.RACY_WINDOW_NS", -(10**9))
+    real_open = open
+
+    def open_only_c(file_path, *args, **kwargs):
+        assert not str(file_path).endswith((".md", ".json")) or str(
+            file_path
+        ).endswith("c.md")
+        return real_open(file_path, *args, **kwargs)
+
+    (tmp_path / "c.md").write_text("[tags]:# (Gamma, )\n[Alpha][Alpha]")
+    monkeypatch.setattr("builtins.open", open_only_c)
+    assert autolink.find_links_to_tag("Alpha", str(tmp_path), index) == [
+        "b.md",
+        "b.md#Beta",
+        "c.md",
+    ]
+    assert autolink.get_origin("Gamma", str(tmp_path), index).endswith("c.md")
@@ -0,0 +1,70 @@
+import json
+
+from autolink import terminal_operation
+from autolink.bench import VaultSpec, compare_results, generate_vault, run_benchmarks
+
+
+SPEC = VaultSpec(files=6, tags=8, size=200, directories=2, seed=3)
+
+
+def _read(path):
+    return {p.relative_to(path): p.read_text() for p in path.rglob("*.md")}
+
+
+def test_generate_vault_is_reproducible(tmp_path):
+    names = generate_vault(str(tmp_path / "a"), SPEC)
+    generate_vault(str(tmp_path / "b"), SPEC)
+    assert len(names) == 6
+    assert names[1] == "dir_001/note_00001.md"
+    assert _read(tmp_path / "a") == _read(tmp_path / "b")
+    generate_vault(str(tmp_path / "c"), VaultSpec(files=6, tags=8, size=200, seed=4))
+    assert _read(tmp_path / "c").values() != _read(tmp_path / "a").values()
+    assert "[[" in (tmp_path / "a" / names[0]).read_text()
+
+
+def test_run_benchmarks(tmp_path):
+    results = run_benchmarks(SPEC, repeat=2, directory=str(tmp_path))
+    assert set(results["results"]) == {
+        "init",
+        "update_file",
+        "update_directory",
+        "rename",
+        "link",
+    }
+    for result in results["results"].values():
+        assert len(result["runs"]) == 2
+        assert result["min"] <= result["median"]
+    assert results["spec"]["files"] == 6
+    # the vaults are cleaned up
+    assert list(tmp_path.iterdir()) == []
+    json.dumps(results)
+
+
+def test_compare_results():
+    def results(init, rename):
+        return {
+            "spec": {"files": 1},
+            "results": {"init": {"median": init}, "rename": {"median": rename}},
+        }
+
+    assert compare_results(results(1.0, 1.0), results(1.1, 0.5)) == []
+    regressions = compare_results(results(1.0, 1.0), results(1.5, 1.0))
+    assert regressions == ["init: 1.000s -> 1.500s (+50%)"]
+    assert compare_results(results(1.0, 1.0), results(1.5, 1.0), threshold=0.6) == []
+    mismatch = {"spec": {"files": 2}, "results": {}}
+    assert compare_results(mismatch, results(1.0, 1.0)) == [
+        "baseline was measured on a different vault spec"
+    ]
+
+
+def test_terminal_operation_bench(capsys, tmp_path):
+    output = tmp_path / "results.json"
+    arguments = ["bench", "--files", "4", "--tags", "5", "--size", "100"]
+    terminal_operation(arguments + ["-r", "1", "--scenario", "init", "-o", str(output)])
+    assert set(json.loads(output.read_text())["results"]) == {"init"}
+    terminal_operation(
+        arguments + ["-r", "1", "--scenario", "init", "-c", str(output), "-t", "1000"]
+    )
+    captured = capsys.readouterr()
+    assert "init" in captured.out
+    assert f"No regressions against {output}" in captured.out
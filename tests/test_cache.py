@@ -0,0 +1,66 @@
+import os
+
+import autolink.autolink as autolink
+from autolink.cache import DocumentCache, documents
+from autolink.instrument import recording
+
+
+def test_document_cache_hits_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr("autolink.cache.RACY_WINDOW_NS", -(10**18))
+    note = tmp_path / "a.md"
+    note.write_text("# Alpha\n[[Beta]] and [Gamma][Gamma]")
+    cache = DocumentCache()
+    document = cache.get(str(note))
+    assert document.tags == {"Alpha", "Beta"}
+    assert document.references("a.md") == (
+        {"Beta", "Gamma"},
+        [["Gamma", "a.md#Alpha", 21]],
+    )
+    assert cache.get(str(note)) is document
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    note.write_text("# Delta")
+    assert cache.get(str(note)).tags == {"Delta"}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_document_cache_compares_racy_entries(tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("# Alpha")
+    stat = os.stat(note)
+    cache = DocumentCache()
+    cache.get(str(note))
+    # same size and mtime, but modified within the same timestamp tick
+    note.write_text("# Omega")
+    os.utime(note, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(str(note)).tags == {"Omega"}
+    assert cache.get(str(note)).tags == {"Omega"}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_document_cache_evicts_least_recently_used(tmp_path):
+    for name in "abcd":
+        (tmp_path / f"{name}.md").write_text(name * 10)
+    cache = DocumentCache(max_entries=3, max_bytes=25)
+    for name in "abc":
+        cache.get(str(tmp_path / f"{name}.md"))
+    assert cache.stats()["entries"] == 2  # 30 bytes do not fit
+    cache.get(str(tmp_path / "b.md"))
+    cache.get(str(tmp_path / "d.md"))
+    assert cache.stats()["evictions"] == 2
+    cache.get(str(tmp_path / "c.md"))
+    assert cache.hits == 1 and cache.misses == 5
+
+
+def test_update_reuses_cached_documents(tmp_path):
+    """Files written by one operation are not read again by the next."""
+    (tmp_path / "a.md").write_text("# Alpha\ncontent")
+    (tmp_path / "b.md").write_text("# Beta\nabout Alpha")
+    documents.clear()
+    autolink.initialize_tagging(str(tmp_path))
+    (tmp_path / "a.md").write_text("# Alpha\n# Gamma\ncontent")
+    with recording() as recorder:
+        autolink.update_tags_on_file(str(tmp_path / "a.md"))
+        autolink.find_links_to_tag("Alpha", str(tmp_path))
+    assert recorder.counters["document_cache_misses"] == 1
+    assert recorder.counters["document_cache_hits"] >= 1
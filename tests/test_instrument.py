@@ -0,0 +1,97 @@
+import json
+import pstats
+
+from autolink import initialize_tagging, terminal_operation, update_tags_on_files
+from autolink.instrument import Laps, count, recording, span, timed
+
+
+def test_spans_and_counters():
+    @timed("outer")
+    def outer():
+        laps = Laps("first")
+        with span("inner"):
+            count("things", 2)
+        laps.next("second")
+        count("things")
+        laps.stop()
+        return laps.seconds
+
+    with recording() as recorder:
+        seconds = outer()
+        outer()
+    assert list(recorder.spans) == [
+        "outer",
+        "outer/first",
+        "outer/first/inner",
+        "outer/second",
+    ]
+    assert [calls for _, calls in recorder.spans.values()] == [2, 2, 2, 2]
+    assert set(seconds) == {"first", "second"}
+    assert recorder.counters == {"things": 6}
+    report = recorder.as_dict()
+    assert report["spans"]["outer/first/inner"]["calls"] == 2
+    assert "    inner" in recorder.format()
+    # nothing is recorded without a recorder
+    outer()
+    assert recorder.counters == {"things": 6}
+
+
+def test_span_closes_children_on_error():
+    with recording() as recorder:
+        try:
+            with span("outer"):
+                Laps("phase")
+                raise ValueError
+        except ValueError:
+            pass
+        with span("after"):
+            pass
+    assert "after" in recorder.spans
+    assert recorder.spans["outer/phase"][1] == 0
+
+
+def test_update_counters(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\n\ntext")
+    (tmp_path / "b.md").write_text("about Alpha")
+    initialize_tagging(str(tmp_path))
+    (tmp_path / "b.md").write_text("about Alpha\n# Beta\n")
+    with recording() as recorder:
+        timings = update_tags_on_files(str(tmp_path), [str(tmp_path / "b.md")])
+    assert set(timings) == {"load", "update", "relink", "save"}
+    assert "update_tags_on_files/update/update_file/link" in recorder.spans
+    assert "update_tags_on_files/save/index_save" in recorder.spans
+    assert recorder.counters["files_written"] >= 2
+    assert recorder.counters["tags_linked"] >= 1
+    assert recorder.counters["regex_passes"] >= 4
+
+
+def test_terminal_operation_instrumented(capsys, tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\n\ntext")
+    profile = tmp_path / "init.prof"
+    options = ["--timings", "--trace-memory", "--profile", str(profile)]
+    terminal_operation(["init", *options, str(tmp_path)])
+    captured = capsys.readouterr()
+    assert "initialize_tagging" in captured.out
+    assert "files_read" in captured.out
+    assert "Memory: peak" in captured.out
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+    terminal_operation(["update", "--timings", "--json", str(tmp_path / "a.md")])
+    report = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert report["spans"]["update_tags_on_files"]["calls"] == 1
+    assert "counters" in report
+
+
+def test_update_directory_reports_timings_once(capsys, tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\n\ntext")
+    terminal_operation(["update", "--timings", str(tmp_path)])
+    out = capsys.readouterr().out
+    assert "Timings: load" not in out
+    assert "update_tags_on_files" in out
+
+    terminal_operation(["update", "--json", str(tmp_path)])
+    out = capsys.readouterr().out
+    assert "Timings: load" not in out
+    terminal_operation(["update", "--timings", "--json", str(tmp_path)])
+    report = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert "update_tags_on_files" in report["spans"]
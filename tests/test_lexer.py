@@ -0,0 +1,81 @@
+import autolink.autolink as autolink
+from autolink import TagIndex
+from autolink.lexer import (
+    CODE,
+    COMMENT,
+    DEFINITION,
+    HEADER,
+    REFERENCE,
+    TEXT,
+    WIKILINK,
+    PieceLexer,
+    tokenize,
+)
+from autolink.linker import Linker
+
+
+TEXT_WITH_CODE = (
+    "[tags]:# (Alpha, )\n"
+    "# Alpha\n"
+    "Beta and [[Gamma]] with `Beta [[Delta]]`\n"
+    "```python\n"
+    "# Epsilon\n"
+    "Beta [[Zeta]] [Beta][Beta]\n"
+    "```\n"
+    "[Beta][beta]\n"
+    "[Beta]: b.md (autolink)\n"
+)
+
+
+def test_tokenize():
+    tokens = list(tokenize(TEXT_WITH_CODE))
+    assert "".join(TEXT_WITH_CODE[t.start : t.end] for t in tokens) == TEXT_WITH_CODE
+    assert [(t.kind, t.value) for t in tokens if t.kind != TEXT] == [
+        (COMMENT, "Alpha, "),
+        (HEADER, "Alpha"),
+        (WIKILINK, "Gamma"),
+        (CODE, ""),
+        (CODE, ""),
+        (REFERENCE, "Beta"),
+        (DEFINITION, "Beta"),
+    ]
+
+
+def test_piece_lexer_carries_open_fence():
+    lexer = PieceLexer()
+    first = list(lexer.tokenize("text\n~~~\n[[a]]\n"))
+    assert first[-1].kind == CODE and lexer.fence == "~~~"
+    second = list(lexer.tokenize("[[b]]\n~~~\n[[c]]\n"))
+    assert [t.kind for t in second] == [CODE, TEXT, WIKILINK, TEXT]
+    assert lexer.fence is None
+
+
+def test_code_is_skipped():
+    assert autolink.get_tags_from_text(TEXT_WITH_CODE) == {"Alpha", "Gamma"}
+    linked = Linker({"Beta", "Zeta"}).link(TEXT_WITH_CODE, lambda tag: "b.md")
+    assert linked == (
+        "[tags]:# (Alpha, )\n"
+        "# Alpha\n"
+        "[Beta][Beta] and [[Gamma]] with `Beta [[Delta]]`\n"
+        "```python\n"
+        "# Epsilon\n"
+        "Beta [[Zeta]] [Beta][Beta]\n"
+        "```\n"
+        "[Beta][Beta]\n"
+        "[Beta]: b.md (autolink)"
+    )
+    assert autolink.find_reference_names(linked) == {"Beta", "Gamma"}
+
+
+def test_stale_definition_with_space_is_replaced(tmp_path):
+    """Repeated updates keep a single definition for a tag with a space."""
+    (tmp_path / "a.md").write_text("# Old Tag\ntext")
+    (tmp_path / "b.md").write_text("mentions Old Tag")
+    autolink.initialize_tagging(str(tmp_path))
+    for _ in range(2):
+        with open(tmp_path / "b.md", "a") as f:
+            f.write("\nmore text")
+        autolink.update_tags_on_file(str(tmp_path / "b.md"))
+    content = (tmp_path / "b.md").read_text()
+    assert content.count("[Old Tag]: a.md#Old-Tag (autolink)") == 1
+    assert TagIndex(str(tmp_path)).get_referenced_tags("b.md") == {"Old Tag"}
@@ -0,0 +1,138 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import autolink.autolink as autolink
+from autolink.instrument import recording
+from autolink.lock import IndexLock
+from autolink.tag_index import TagIndex
+
+fcntl = pytest.importorskip("fcntl")
+
+
+def _try_lock(file_path):
+    fd = os.open(file_path, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def test_index_lock_is_exclusive_and_reentrant(tmp_path):
+    lock = TagIndex.lock_for(str(tmp_path))
+    assert lock is IndexLock.for_file(str(tmp_path / TagIndex.LOCK_FILENAME))
+    with lock:
+        with lock:
+            assert _try_lock(lock.file_path) is False
+        # the inner release keeps the file locked
+        assert _try_lock(lock.file_path) is False
+    assert not lock.held
+    assert _try_lock(lock.file_path) is True
+
+
+@pytest.mark.parametrize("backend", TagIndex.BACKENDS)
+def test_concurrent_saves_are_merged(tmp_path, backend):
+    index = TagIndex(str(tmp_path), backend=backend)
+    index.add_definition("shared", "s.md", "s.md#shared")
+    index.save()
+    index.close()
+
+    first = TagIndex(str(tmp_path))
+    second = TagIndex(str(tmp_path))
+    first.add_definition("one", "a.md", "a.md#one")
+    first.update_file_references("a.md", {"shared", "one"}, "[shared][shared]")
+    second.add_definition("two", "b.md", "b.md#two")
+    second.remove_file("s.md")
+    first.save()
+    with recording() as recorder:
+        second.save()
+    assert recorder.counters["index_merges"] == 1
+    # the merged index is kept in memory as well
+    assert second.get_all_tags() == {"one", "two"}
+    first.close()
+    second.close()
+
+    reloaded = TagIndex(str(tmp_path))
+    assert reloaded.get_defining_files("one") == {"a.md": "a.md#one"}
+    assert reloaded.get_defining_files("two") == {"b.md": "b.md#two"}
+    # the definition removed by the second save is gone
+    assert "shared" not in reloaded.get_all_tags()
+    assert reloaded.get_referenced_tags("a.md") == set()
+    assert reloaded._data["generation"] == 3
+    reloaded.close()
+
+
+def test_json_index_is_written_atomically(tmp_path):
+    index = TagIndex(str(tmp_path))
+    index.add_definition("tag1", "a.md", "a.md#tag1")
+    index.save()
+    inode = os.stat(index.index_file_path).st_ino
+    index.save()
+    assert os.stat(index.index_file_path).st_ino != inode
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    with open(index.index_file_path) as f:
+        assert f.read().startswith('{\n  "generation": 2,')
+
+
+def test_update_refreshes_resident_index(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\ntext")
+    (tmp_path / "b.md").write_text("nothing yet")
+    autolink.initialize_tagging(str(tmp_path))
+    resident = TagIndex(str(tmp_path))
+    (tmp_path / "c.md").write_text("# Gamma\ntext")
+    autolink.update_tags_on_file(str(tmp_path / "c.md"))
+    (tmp_path / "b.md").write_text("Alpha and Gamma")
+    autolink.update_tags_on_files(str(tmp_path), [str(tmp_path / "b.md")], resident)
+    assert (tmp_path / "b.md").read_text().count("][") == 2
+    assert resident.get_referenced_files("Gamma") == {"b.md"}
+
+
+def _update(file_path):
+    autolink.update_tags_on_file(file_path, optimistic=True)
+
+
+def test_parallel_optimistic_updates(tmp_path):
+    names = [f"note{i}.md" for i in range(8)]
+    for name in names:
+        (tmp_path / name).write_text("plain text")
+    autolink.initialize_tagging(str(tmp_path))
+    for i, name in enumerate(names):
+        (tmp_path / name).write_text(f"# Tag {i}\ntext")
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_update, [str(tmp_path / name) for name in names]))
+    index = TagIndex(str(tmp_path))
+    assert index.get_all_tags() == {f"Tag {i}" for i in range(8)}
+    with open(index.index_file_path) as f:
+        assert json.load(f)["generation"] == 1 + len(names)
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        autolink.initialize_tagging,
+        autolink.collect_garbage,
+        lambda path: autolink.rename_tags(path, {"Alpha": "Beta"}),
+    ],
+)
+def test_operations_lock_the_index_from_load_to_save(tmp_path, monkeypatch, operation):
+    (tmp_path / "a.md").write_text("# Alpha\ntext")
+    (tmp_path / "b.md").write_text("about Alpha")
+    autolink.initialize_tagging(str(tmp_path))
+    lock = TagIndex.lock_for(str(tmp_path))
+    held = []
+    for method in ("_load", "save"):
+        original = getattr(TagIndex, method)
+
+        def checked(self, original=original):
+            held.append(lock.held)
+            return original(self)
+
+        monkeypatch.setattr(TagIndex, method, checked)
+    operation(str(tmp_path))
+    assert held and all(held)
+    assert not lock.held
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import autolink.autolink as autolink
+from autolink import TagIndex, query_index, terminal_operation
+
+
+@pytest.fixture
+def vault(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\n# Beta\ntext about Gamma")
+    (tmp_path / "b.md").write_text("# Gamma\nAlpha and Beta, [Zeta][Zeta]")
+    (tmp_path / "c.md").write_text("# Delta\nGamma again")
+    (tmp_path / "d.md").write_text("# Omega\nnothing")
+    autolink.initialize_tagging(str(tmp_path))
+    return tmp_path
+
+
+def test_query_index(vault, monkeypatch):
+    index = TagIndex(str(vault))
+
+    # answered from the index alone
+    def no_io(*args, **kwargs):
+        raise AssertionError("a query read the file system")
+
+    monkeypatch.setattr("builtins.open", no_io)
+    monkeypatch.setattr("os.stat", no_io)
+    assert query_index(index, "backlinks", "gamma") == ["a.md", "c.md"]
+    assert query_index(index, "unreferenced") == ["Delta", "Omega"]
+    assert query_index(index, "undefined") == {"Zeta": ["b.md"]}
+    assert query_index(index, "top", limit=2) == [["Gamma", 2], ["Alpha", 1]]
+    assert query_index(index, "cooccurring", "Gamma") == [
+        ["Alpha", 2],
+        ["Beta", 2],
+        ["Delta", 1],
+    ]
+    assert query_index(index, "backlinks", "missing") == []
+    with pytest.raises(ValueError):
+        query_index(index, "backlinks")
+    with pytest.raises(ValueError):
+        query_index(index, "orphans")
+
+
+def test_query_undefined_after_definition_removed(vault):
+    (vault / "c.md").write_text("# Epsilon\nGamma again")
+    autolink.update_tags_on_file(str(vault / "c.md"))
+    (vault / "b.md").unlink()
+    index = TagIndex(str(vault))
+    index.remove_file("b.md")
+    assert query_index(index, "undefined") == {
+        "Gamma": ["a.md", "c.md"],
+    }
+
+
+def test_terminal_operation_query(vault, capsys):
+    terminal_operation(["query", "-n", "1", "top", str(vault)])
+    assert capsys.readouterr().out == "2\tGamma\n"
+    terminal_operation(
+        ["query", "--tag", "Gamma", "--format", "json", "backlinks", str(vault)]
+    )
+    assert json.loads(capsys.readouterr().out) == ["a.md", "c.md"]
+    terminal_operation(["query", "cooccurring", str(vault)])
+    assert capsys.readouterr().out == "Error: 'cooccurring' needs a tag\n"
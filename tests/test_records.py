@@ -0,0 +1,57 @@
+from autolink.records import RecordCodec, add_id, discard_id, id_array
+from autolink.tag_index import TagIndex
+
+
+def test_id_arrays_stay_sorted_and_unique():
+    ids = id_array([5, 1, 5, 3])
+    assert list(ids) == [1, 3, 5]
+    add_id(ids, 4)
+    add_id(ids, 3)
+    discard_id(ids, 1)
+    discard_id(ids, 2)
+    discard_id(ids, None)
+    assert list(ids) == [3, 4, 5]
+
+
+def test_codec_round_trips_and_interns_names():
+    data = {
+        "tags": {
+            "tag1": {
+                "defining_files": {"a.md": "a.md#tag1"},
+                "referenced_by_files": ["c.md", "b.md"],
+            }
+        },
+        "last_updated": None,
+    }
+    codec = RecordCodec()
+    records = codec.from_json(data)
+    # the reverse map of an older index is derived from the tag entries
+    assert codec.to_json(records) == {
+        "generation": 0,
+        "tags": {
+            "tag1": {
+                "defining_files": {"a.md": "a.md#tag1"},
+                "referenced_by_files": ["b.md", "c.md"],
+            }
+        },
+        "files": {
+            "a.md": {"defines": ["tag1"], "references": []},
+            "b.md": {"defines": [], "references": ["tag1"]},
+            "c.md": {"defines": [], "references": ["tag1"]},
+        },
+        "last_updated": None,
+    }
+    tag = next(iter(records["tags"]))
+    assert tag is codec.tags.intern("tag1")
+
+
+def test_tag_index_keeps_ids_consistent_across_renames(tmp_path):
+    index = TagIndex(str(tmp_path))
+    index.add_definition("old", "a.md", "a.md#old")
+    index.update_file_references("b.md", {"old"}, "[old][old]")
+    index.rename_tags_in_index({"old": "new"})
+    assert index.get_defined_tags("a.md") == {"new"}
+    assert index.get_referenced_tags("b.md") == {"new"}
+    assert index.get_referenced_files("new") == {"b.md"}
+    index.remove_tag_from_index("new")
+    assert index.get_files() == set()
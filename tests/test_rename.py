@@ -4,7 +4,14 @@ Tests for the autolink functionality, specifically for renaming tags.
 
 import os
 import json
-from autolink import initialize_tagging, rename_tag, update_tags_on_file
+from autolink import (
+    TagIndex,
+    initialize_tagging,
+    rename_tag,
+    rename_tags,
+    terminal_operation,
+    update_tags_on_file,
+)
 
 
 def test_rename_tag_successfully(tmp_path):
@@ -110,3 +117,138 @@ def test_rename_tag_already_exists(tmp_path, capsys):
 
     captured = capsys.readouterr()
     assert "Error: Tag 'new_tag' already exists. Cannot rename." in captured.out
+
+
+def test_rename_tag_defined_by_wikilink(tmp_path):
+    """
+    A file that only defines the tag through a wikilink gets the file itself
+    as location of the renamed tag.
+    """
+    (tmp_path / "file1.md").write_text("# old tag\n\ntext\n")
+    (tmp_path / "file2.md").write_text("see [[old tag]]\n")
+    initialize_tagging(tmp_path)
+
+    rename_tag(tmp_path, "old tag", "new tag")
+
+    defining_files = TagIndex(tmp_path).get_defining_files("new tag")
+    assert defining_files["file2.md"] == "file2.md"
+    assert "# new tag" in (tmp_path / "file1.md").read_text()
+
+
+def test_rename_tags_in_one_pass(tmp_path):
+    """
+    rename_tags renames several tags at once, including two tags that swap
+    their names, and every affected file ends up linked to the new names.
+    """
+    (tmp_path / "a.md").write_text("# alpha\n\ntext about beta\n")
+    (tmp_path / "b.md").write_text("# beta\n\ntext about alpha and gamma\n")
+    (tmp_path / "c.md").write_text("# gamma\n\ntext about alpha\n")
+    initialize_tagging(tmp_path)
+
+    assert rename_tags(tmp_path, {"alpha": "beta", "beta": "alpha", "gamma": "delta"})
+
+    a = (tmp_path / "a.md").read_text()
+    b = (tmp_path / "b.md").read_text()
+    c = (tmp_path / "c.md").read_text()
+    assert "# beta" in a and "[alpha][alpha]" in a
+    assert "[alpha]: b.md#alpha" in a
+    assert "# alpha" in b and "[beta][beta]" in b and "[delta][delta]" in b
+    assert "# delta" in c and "[beta]: a.md#beta" in c
+    tag_index = TagIndex(tmp_path)
+    assert tag_index.get_all_tags() == {"alpha", "beta", "delta"}
+    assert tag_index.get_defining_files("delta") == {"c.md": "c.md#delta"}
+    linklist = (tmp_path / "linklist.md").read_text()
+    assert "[delta](c.md#delta)" in linklist
+    assert "gamma" not in linklist
+
+
+def test_rename_tags_rejects_conflicts(tmp_path, capsys):
+    """Nothing is renamed if any pair of the mapping is invalid."""
+    (tmp_path / "f.md").write_text("# alpha\nbody\n# beta\n")
+    initialize_tagging(tmp_path)
+    before = (tmp_path / "f.md").read_text()
+
+    renamed = rename_tags(
+        tmp_path, {"alpha": "omega", "beta": "alpha", "missing": "x", "y": "omega"}
+    )
+
+    out = capsys.readouterr().out
+    assert not renamed
+    assert "Error: Tag 'missing' not found in the index." in out
+    assert "Error: Several tags would be renamed to 'omega'." in out
+    assert (tmp_path / "f.md").read_text() == before
+    assert TagIndex(tmp_path).get_all_tags() == {"alpha", "beta"}
+
+
+def test_rename_map_from_cli(tmp_path, capsys, monkeypatch):
+    """`autolink rename --map` reads the pairs from a CSV file."""
+    (tmp_path / "f.md").write_text("# alpha\n\n# beta\n\nalpha and beta\n")
+    initialize_tagging(tmp_path)
+    mapping = tmp_path / "renames.csv"
+    mapping.write_text("old,new\n# comment\n\nalpha,first\nbeta, second\n")
+    monkeypatch.setattr(
+        "sys.argv", ["autolink", "rename", "--map", str(mapping), str(tmp_path)]
+    )
+
+    terminal_operation()
+
+    assert "Successfully renamed 2 tags." in capsys.readouterr().out
+    text = (tmp_path / "f.md").read_text()
+    assert "# first" in text and "# second" in text
+    assert "[first][first] and [second][second]" in text
+
+
+def test_rename_leaves_other_content_untouched(tmp_path):
+    """
+    Renaming patches only the spans that name the tag: text the index would
+    link otherwise, spacing and other definitions stay as they are, and the
+    definitions in referencing files are updated in place.
+    """
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "a.md").write_text("# old tag\n\ntext\n")
+    (tmp_path / "b.md").write_text("# other\n\nsee old tag\n")
+    (tmp_path / "notes" / "c.md").write_text("about old tag and other\n")
+    initialize_tagging(tmp_path)
+    # edits that were not updated yet
+    with open(tmp_path / "b.md", "a") as f:
+        f.write("\n\nmore about other\n\n\n")
+    b_before = (tmp_path / "b.md").read_text()
+    c_before = (tmp_path / "notes" / "c.md").read_text()
+
+    rename_tag(tmp_path, "old tag", "new tag")
+
+    def renamed(text, prefix=""):
+        text = text.replace("[old tag][old tag]", "[new tag][new tag]")
+        return text.replace(
+            f"[old tag]: {prefix}a.md#old-tag (autolink)",
+            f"[new tag]: {prefix}a.md#new-tag (autolink)",
+        )
+
+    assert (tmp_path / "b.md").read_text() == renamed(b_before)
+    c = (tmp_path / "notes" / "c.md").read_text()
+    assert c == renamed(c_before, "../")
+    assert c != c_before
+
+
+def test_rename_touches_whole_headers_outside_code(tmp_path):
+    """
+    Only header lines that are the tag itself are renamed, not headers that
+    start with its name, and nothing inside code blocks changes.
+    """
+    text = (
+        "# Alpha\n\n## Alphabet soup\n\n"
+        "```\n# Alpha\n[Alpha][Alpha]\n```\n\nmore `[Alpha][Alpha]`\n"
+    )
+    (tmp_path / "a.md").write_text(text)
+    initialize_tagging(tmp_path)
+    before = (tmp_path / "a.md").read_text()
+
+    assert rename_tags(tmp_path, {"Alpha": "Omega"})
+    after = (tmp_path / "a.md").read_text()
+    assert after.startswith("[tags]:# (Alphabet soup, Omega, )\n# Omega\n")
+    assert "## Alphabet soup\n" in after
+    code_start = before.index("```")
+    code_end = before.index("`[Alpha][Alpha]`") + len("`[Alpha][Alpha]`")
+    assert before[code_start:code_end] in after
+    index = TagIndex(str(tmp_path))
+    assert index.get_defined_tags("a.md") == {"Omega", "Alphabet soup"}
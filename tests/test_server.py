@@ -0,0 +1,151 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future
+
+import pytest
+
+import autolink.autolink as autolink
+from autolink.server import AutolinkServer, BackendClient, serve_stdio, serve_unix
+
+
+def _request(request_id, method, params=None):
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if params is not None:
+        request["params"] = params
+    return request
+
+
+@pytest.fixture
+def vault(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\ncontent")
+    (tmp_path / "b.md").write_text("# Beta\nsomething about Gamma")
+    autolink.initialize_tagging(str(tmp_path))
+    return tmp_path
+
+
+def test_server_handle(vault):
+    server = AutolinkServer(str(vault))
+    (vault / "a.md").write_text("# Alpha\n# Gamma\ncontent")
+    response = server.handle(_request(1, "update", {"paths": [str(vault / "a.md")]}))
+    assert response["id"] == 1
+    assert set(response["result"]) == {"load", "update", "relink", "save"}
+    assert "[Gamma][Gamma]" in (vault / "b.md").read_text()
+    assert server.tag_index.get_defined_tags("a.md") == {"Alpha", "Gamma"}
+
+    response = server.handle(_request(2, "rename", ["Gamma", "Delta"]))
+    assert response == {"jsonrpc": "2.0", "id": 2, "result": None}
+    assert "Delta" in server.tag_index.get_all_tags()
+
+    assert server.handle(_request(3, "nope"))["error"]["code"] == -32601
+    assert server.handle(_request(4, "update"))["error"]["code"] == -32602
+    response = server.handle(_request(5, "update", {"paths": ["/elsewhere/x.md"]}))
+    assert response["error"]["code"] == -32603
+    assert server.handle({"jsonrpc": "2.0", "method": "init"}) is None
+    stats = server.handle(_request(6, "stats"))["result"]
+    assert {"hits", "misses", "evictions", "entries", "bytes"} <= set(stats)
+    response = server.handle(_request(7, "query", ["backlinks", "Delta"]))
+    assert response["result"] == ["b.md"]
+    server.close()
+
+
+def test_server_type_error_inside_operation_is_internal(vault, monkeypatch):
+    server = AutolinkServer(str(vault))
+
+    def failing_update(*args, **kwargs):
+        raise TypeError("broken inside")
+
+    monkeypatch.setattr("autolink.server.update_tags_on_files", failing_update)
+    response = server.handle(_request(1, "update", {"paths": []}))
+    assert response["error"]["code"] == -32603
+    assert server.handle(_request(2, "update", ["a", "b"]))["error"]["code"] == -32602
+    assert server.handle(_request(3, "update", "x"))["error"]["code"] == -32602
+    server.close()
+
+
+def test_server_reloads_changed_index(vault):
+    server = AutolinkServer(str(vault))
+    (vault / "c.md").write_text("# Gamma\ntext")
+    autolink.initialize_tagging(str(vault))
+    server.handle(_request(1, "update", {"paths": []}))
+    assert "Gamma" in server.tag_index.get_all_tags()
+    server.close()
+
+
+def test_serve_stdio(vault):
+    requests = [
+        _request(1, "init", {"force": True}),
+        _request(2, "shutdown"),
+        _request(3, "init"),
+    ]
+    stdin = io.StringIO("not json\n" + "".join(json.dumps(r) + "\n" for r in requests))
+    stdout = io.StringIO()
+    server = AutolinkServer(str(vault))
+    serve_stdio(server, stdin, stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [r.get("id") for r in responses] == [None, 1, 2]
+    assert responses[0]["error"]["code"] == -32700
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_serve_unix(vault, tmp_path_factory):
+    socket_path = str(tmp_path_factory.mktemp("sock") / "autolink.sock")
+    server = AutolinkServer(str(vault))
+    thread = threading.Thread(target=serve_unix, args=(server, socket_path))
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.01)
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(socket_path)
+        stream = client.makefile("rw")
+        for request_id, method in ((1, "init"), (2, "shutdown")):
+            stream.write(json.dumps(_request(request_id, method)) + "\n")
+            stream.flush()
+            assert json.loads(stream.readline())["id"] == request_id
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not os.path.exists(socket_path)
+
+
+def test_backend_client(vault, monkeypatch):
+    src = os.path.dirname(os.path.dirname(autolink.__file__))
+    monkeypatch.setenv("PYTHONPATH", src)
+    client = BackendClient(str(vault), python=sys.executable)
+    (vault / "a.md").write_text("# Alpha\n# Gamma\ncontent")
+    future = client.request("update", {"paths": [str(vault / "a.md")]})
+    failing = client.request("rename")
+    assert set(future.result(timeout=10)) == {"load", "update", "relink", "save"}
+    with pytest.raises(RuntimeError):
+        failing.result(timeout=10)
+    client.close()
+    assert "[Gamma][Gamma]" in (vault / "b.md").read_text()
+
+
+def test_backend_client_serves_directory_without_index(tmp_path, monkeypatch):
+    src = os.path.dirname(os.path.dirname(autolink.__file__))
+    monkeypatch.setenv("PYTHONPATH", src)
+    (tmp_path / "a.md").write_text("# Alpha\ncontent")
+    client = BackendClient(str(tmp_path), python=sys.executable)
+    assert client.request("stats").result(timeout=10)["hits"] == 0
+    assert client.request("init").result(timeout=10) is None
+    client.close()
+    assert (tmp_path / "linklist.md").exists()
+
+
+
+def test_backend_client_skips_lines_that_are_not_responses():
+    client = BackendClient.__new__(BackendClient)
+    client._lock = threading.Lock()
+    future = Future()
+    client._pending = {1: future}
+    lines = ["No index file found\n", '{"jsonrpc": "2.0", "id": 1, "result": 2}\n']
+    client._process = types.SimpleNamespace(stdout=iter(lines))
+    client._read_responses()
+    assert future.result(timeout=0) == 2
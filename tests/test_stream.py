@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+import autolink.autolink as autolink
+import autolink.stream as stream
+from autolink import TagIndex
+from autolink.linker import Linker
+from autolink.stream import StreamWriter, read_pieces
+
+
+def test_read_pieces(tmp_path, monkeypatch):
+    monkeypatch.setattr(stream, "CHUNK_SIZE", 4)
+    file_path = tmp_path / "a.md"
+    file_path.write_text("one\ntwo lines\n\nthree")
+    pieces = list(read_pieces(str(file_path)))
+    assert "".join(pieces) == "one\ntwo lines\n\nthree"
+    assert all(piece.endswith("\n") for piece in pieces[:-1])
+
+
+def test_stream_writer(tmp_path):
+    file_path = tmp_path / "a.md"
+    file_path.write_text("old")
+    with StreamWriter(str(file_path), autolink.content_hash("old")) as out:
+        out.write("o")
+        out.write("ld")
+    assert not out.changed
+    assert sorted(os.listdir(tmp_path)) == ["a.md"]
+
+    lines = []
+    with StreamWriter(str(file_path), on_lines=[lines.append]) as out:
+        out.write("new\ncontent")
+    assert out.changed
+    assert out.hash == autolink.content_hash("new\ncontent")
+    assert file_path.read_text() == "new\ncontent"
+    assert "".join(lines) == "new\ncontent"
+    assert sorted(os.listdir(tmp_path)) == ["a.md"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "[tags]:# (Alpha, )\nAlpha and Beta Ray\n[Beta Ray][Beta Ray]\n",
+        "  \n[tags]:# (x, )\n# Alpha\nmulti\nline and [[Alpha]]\n"
+        "[Alpha]: a.md (autolink)\n\n",
+        "no comment, Alpha stays\n",
+        "[tags]:# ()\nAlpha\n```\nAlpha and [[Alpha]]\n\n```\nBeta Ray `Alpha`\n"
+        "~~~~\nAlpha\n~~~\n",
+    ],
+)
+def test_link_stream(text):
+    linker = Linker({"Alpha", "Beta Ray", "multi\nline"})
+    expected = linker.link(text, lambda tag: tag.lower() + ".md")
+    for size in (1, 3, 100):
+        pieces = [text[i : i + size] for i in range(0, len(text), size)]
+        out = []
+        linker.link_stream(
+            stream.align_pieces(pieces), lambda tag: tag.lower() + ".md", out.append
+        )
+        assert "".join(out) == expected
+
+
+def _vault(path):
+    (path / "sub").mkdir(parents=True)
+    (path / "a.md").write_text("# Alpha\n\nnotes on Beta and [[Wiki\nlink]]")
+    (path / "b.md").write_text("[tags]:# (Extra, )\n# Beta\nAlpha, Alpha.\n")
+    (path / "sub" / "c.md").write_text(
+        "  \n## Gamma Ray\nBeta meets Alpha\n```\n# Code\nBeta\n```\n"
+    )
+
+
+def _contents(path):
+    return {
+        name: (path / name).read_text()
+        for name in ("a.md", "b.md", "sub/c.md", "linklist.md")
+    }
+
+
+def test_streaming_matches_in_memory(tmp_path, monkeypatch):
+    """
+    Large files are tagged and linked in pieces with the same result as
+    in memory, for initialization and for updates.
+    """
+    for mode in ("memory", "stream"):
+        _vault(tmp_path / mode)
+    autolink.initialize_tagging(str(tmp_path / "memory"))
+    monkeypatch.setattr(stream, "STREAM_THRESHOLD", -1)
+    monkeypatch.setattr(stream, "CHUNK_SIZE", 5)
+    autolink.initialize_tagging(str(tmp_path / "stream"))
+    assert _contents(tmp_path / "stream") == _contents(tmp_path / "memory")
+
+    for mode in ("memory", "stream"):
+        threshold = -1 if mode == "stream" else 1 << 30
+        monkeypatch.setattr(stream, "STREAM_THRESHOLD", threshold)
+        (tmp_path / mode / "b.md").write_text("# Beta\n# Delta\nAlpha and Gamma Ray")
+        autolink.update_tags_on_file(str(tmp_path / mode / "b.md"))
+    assert _contents(tmp_path / "stream") == _contents(tmp_path / "memory")
+    index = TagIndex(str(tmp_path / "stream"))
+    assert index.get_defined_tags("b.md") == {"Beta", "Delta"}
+    assert index.get_referenced_tags("b.md") == TagIndex(
+        str(tmp_path / "memory")
+    ).get_referenced_tags("b.md")
+    assert index.is_file_unchanged("sub/c.md")
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_tag_header_scanner_matches_get_tag_headers(size):
+    text = (
+        "[tags]:# (Alpha, )\n\nAlpha first\n# Header One\nab and c++\n"
+        "## Sub Header\nabc\n# ab\nzzz Gamma Ray"
+    )
+    tags = {"Alpha", "abc", "c++", "ab", "Gamma", "Gamma Ray", "none", ""}
+    pieces, piece = [], ""
+    for line in text.splitlines(keepends=True):
+        piece += line
+        if len(piece) >= size:
+            pieces.append(piece)
+            piece = ""
+    pieces.append(piece)
+    scanner = autolink._TagHeaderScanner(tags, "d/f.md")
+    for piece in pieces:
+        scanner.feed(piece)
+    assert scanner.result() == autolink.get_tag_headers(tags, text, "d/f.md")
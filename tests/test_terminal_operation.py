@@ -37,7 +37,9 @@ def test_terminal_operation_init_directory(capsys, temp_markdown_files, monkeypa
         terminal_operation(["init"])
 
         # args.path will be '.', so realpath will resolve to temp_markdown_files
-        mock_initialize_tagging.assert_called_once_with(str(temp_markdown_files))
+        mock_initialize_tagging.assert_called_once_with(
+            str(temp_markdown_files), force=False, jobs=1
+        )
         captured = capsys.readouterr()
         assert f"Initializing directory: {temp_markdown_files}" in captured.out
 
@@ -68,7 +70,9 @@ def test_terminal_operation_update_file(capsys, temp_markdown_files):
     with patch("autolink.autolink.update_tags_on_file") as mock_update_tags_on_file:
         terminal_operation(["update", str(file_path)])
 
-        mock_update_tags_on_file.assert_called_once_with(resolved_path)
+        mock_update_tags_on_file.assert_called_once_with(
+            resolved_path, optimistic=False
+        )
         captured = capsys.readouterr()
         assert f"Updating file: {resolved_path}" in captured.out
 
@@ -79,13 +83,21 @@ def test_terminal_operation_update_directory(capsys, temp_markdown_files, monkey
     """
     monkeypatch.chdir(temp_markdown_files)
 
-    with patch("autolink.autolink.update_tags_on_file") as mock_update_tags_on_file:
+    with patch(
+        "autolink.autolink.update_tags_on_files",
+        return_value={"load": 0.0, "update": 0.0, "relink": 0.0, "save": 0.0},
+    ) as mock_update_tags_on_files:
         terminal_operation(["update"])  # Use default path '.'
 
-        assert mock_update_tags_on_file.call_count == 2
-        # The order of listdir is not guaranteed, so use assert_any_call
-        mock_update_tags_on_file.assert_any_call(str(temp_markdown_files / "file1.md"))
-        mock_update_tags_on_file.assert_any_call(str(temp_markdown_files / "file2.md"))
+        # All files are handed over as one batch
+        mock_update_tags_on_files.assert_called_once_with(
+            str(temp_markdown_files),
+            [
+                str(temp_markdown_files / "file1.md"),
+                str(temp_markdown_files / "file2.md"),
+            ],
+            optimistic=False,
+        )
 
         captured = capsys.readouterr()
         resolved_path = str(temp_markdown_files.resolve())
@@ -98,6 +110,7 @@ def test_terminal_operation_update_directory(capsys, temp_markdown_files, monkey
         assert (
             "  - Updating not_a_markdown.txt" not in captured.out
         )  # non-md should be skipped
+        assert "Timings: load" in captured.out
 
 
 def test_terminal_operation_update_non_existent_path(capsys, temp_markdown_files):
@@ -114,3 +127,30 @@ def test_terminal_operation_update_non_existent_path(capsys, temp_markdown_files
 
     captured = capsys.readouterr()
     assert f"Error: Path not found - {resolved_path}" in captured.out
+
+
+def test_terminal_operation_watch_directory(capsys, temp_markdown_files):
+    """
+    Tests the 'watch' command hands its options to watch_directory.
+    """
+    resolved_path = str(temp_markdown_files.resolve())
+    with patch("autolink.autolink.watch_directory") as mock_watch:
+        terminal_operation(["watch", "--poll", "-d", "0.2", str(temp_markdown_files)])
+
+        mock_watch.assert_called_once_with(
+            resolved_path, debounce=0.2, interval=1.0, polling=True
+        )
+        captured = capsys.readouterr()
+        assert f"Watching directory: {resolved_path}" in captured.out
+
+
+def test_terminal_operation_serve_directory(temp_markdown_files):
+    """
+    Tests the 'serve' command hands the socket path to serve_directory.
+    """
+    resolved_path = str(temp_markdown_files.resolve())
+    with patch("autolink.autolink.serve_directory") as mock_serve:
+        terminal_operation(
+            ["serve", "--socket", "/tmp/a.sock", str(temp_markdown_files)]
+        )
+        mock_serve.assert_called_once_with(resolved_path, "/tmp/a.sock")
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+import autolink.autolink as autolink
+from autolink import TagIndex
+from autolink.vault import (
+    find_vault_root,
+    is_ignored,
+    relative_link,
+    walk_vault,
+)
+
+
+@pytest.fixture
+def vault(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha\ncontent about Gamma")
+    (tmp_path / "linklist.md").write_text("")
+    (tmp_path / "image.png").write_bytes(b"")
+    (tmp_path / "notes" / "deep").mkdir(parents=True)
+    (tmp_path / "notes" / "b.md").write_text("# Beta\nsomething about Alpha")
+    (tmp_path / "notes" / "deep" / "c.md").write_text("# Gamma\nBeta and Alpha")
+    (tmp_path / "attachments").mkdir()
+    (tmp_path / "attachments" / "x.md").write_text("# Ignored")
+    (tmp_path / "drafts").mkdir()
+    (tmp_path / "drafts" / "draft.md").write_text("# Draft")
+    (tmp_path / "drafts" / "keep.md").write_text("# Keep")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD.md").write_text("")
+    (tmp_path / ".gitignore").write_text("attachments/\n")
+    (tmp_path / "drafts" / ".autolinkignore").write_text("*.md\n!keep.md\n")
+    return tmp_path
+
+
+def test_walk_vault(vault):
+    assert sorted(walk_vault(str(vault))) == [
+        "a.md",
+        "drafts/keep.md",
+        "notes/b.md",
+        "notes/deep/c.md",
+    ]
+    directories = []
+    assert sorted(walk_vault(str(vault), "notes", directories)) == [
+        "notes/b.md",
+        "notes/deep/c.md",
+    ]
+    assert directories == ["notes", "notes/deep"]
+    assert is_ignored(str(vault), "attachments/x.md")
+    assert is_ignored(str(vault), "drafts/draft.md")
+    assert not is_ignored(str(vault), "drafts/keep.md")
+    assert is_ignored(str(vault), ".git/HEAD.md")
+
+
+def test_walk_vault_ignore_patterns(tmp_path):
+    for rel_path in ("a.md", "tmp/b.md", "x/tmp/c.md", "x/y/d.md", "x/e.md"):
+        (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_path).write_text("")
+    (tmp_path / ".autolinkignore").write_text("# comment\n\n/tmp\nx/**/d.md\n[ab].md\n")
+    assert sorted(walk_vault(str(tmp_path))) == ["x/e.md", "x/tmp/c.md"]
+
+
+def test_walk_vault_symlink_loop(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.md").write_text("")
+    try:
+        os.symlink(tmp_path, tmp_path / "sub" / "loop")
+    except OSError:
+        pytest.skip("symlinks are not supported")
+    assert list(walk_vault(str(tmp_path))) == ["sub/a.md"]
+
+
+def test_find_vault_root(vault):
+    assert find_vault_root(str(vault / "notes" / "deep" / "c.md")) == str(vault)
+    assert find_vault_root(str(vault / "notes")) == str(vault)
+
+
+def test_find_vault_root_of_sharded_index(tmp_path):
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "notes" / "b.md").write_text("# Beta\ntext")
+    index = TagIndex(str(tmp_path), backend="sharded")
+    index.add_definition("Beta", "notes/b.md", "notes/b.md#Beta")
+    index.save()
+    assert not (tmp_path / "linklist.md").exists()
+    assert find_vault_root(str(tmp_path / "notes" / "b.md")) == str(tmp_path)
+
+
+def test_relative_link():
+    assert relative_link("a.md#Alpha", "b.md") == "a.md#Alpha"
+    assert relative_link("a.md#Alpha", "notes/deep/c.md") == "../../a.md#Alpha"
+    assert relative_link("notes/b.md", "notes/deep/c.md") == "../b.md"
+
+
+def test_initialize_tagging_nested_vault(vault):
+    autolink.initialize_tagging(str(vault))
+    tag_index = TagIndex(str(vault))
+    assert tag_index.get_files() == {
+        "a.md",
+        "drafts/keep.md",
+        "notes/b.md",
+        "notes/deep/c.md",
+    }
+    assert tag_index.get_defining_files("Gamma") == {
+        "notes/deep/c.md": "notes/deep/c.md#Gamma"
+    }
+    text_a = (vault / "a.md").read_text()
+    assert "[Gamma]: notes/deep/c.md#Gamma (autolink)" in text_a
+    text_c = (vault / "notes" / "deep" / "c.md").read_text()
+    assert "[Alpha]: ../../a.md#Alpha (autolink)" in text_c
+    assert "[Beta]: ../b.md#Beta (autolink)" in text_c
+    assert "[Gamma](notes/deep/c.md#Gamma);" in (vault / "linklist.md").read_text()
+    assert "[tags]" not in (vault / "attachments" / "x.md").read_text()
+
+    # a nested file is updated against the index at the vault root
+    (vault / "notes" / "b.md").write_text("# Beta\n# Delta\nsomething about Alpha")
+    autolink.update_tags_on_file(str(vault / "notes" / "b.md"))
+    assert "[Delta]" not in (vault / "a.md").read_text()
+    assert TagIndex(str(vault)).get_defined_tags("notes/b.md") == {"Beta", "Delta"}
+    assert "[Alpha]: ../a.md#Alpha (autolink)" in (vault / "notes" / "b.md").read_text()
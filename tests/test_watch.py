@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+import autolink.autolink as autolink
+from autolink import TagIndex
+from autolink.watch import DirectoryWatch, InotifyWatcher, PollingWatcher
+
+
+def _touch_later(path, text):
+    """Writes a file with an mtime that differs from the previous write."""
+    time.sleep(0.01)
+    path.write_text(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_polling_watcher(tmp_path):
+    (tmp_path / "a.md").write_text("# Alpha")
+    (tmp_path / "b.md").write_text("# Beta")
+    watcher = PollingWatcher(str(tmp_path), interval=0.01)
+    assert watcher.read(0) == set()
+
+    _touch_later(tmp_path / "a.md", "# Alpha\nchanged")
+    (tmp_path / "b.md").unlink()
+    (tmp_path / "notes.txt").write_text("ignored")
+    (tmp_path / "linklist.md").write_text("ignored")
+    assert watcher.read(0.1) == {"a.md", "b.md"}
+    assert watcher.read(0) == set()
+
+
+def test_inotify_watcher(tmp_path):
+    try:
+        watcher = InotifyWatcher(str(tmp_path))
+    except (OSError, AttributeError, TypeError):
+        pytest.skip("inotify is not available")
+    (tmp_path / "a.md").write_text("# Alpha")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert watcher.read(1.0) == {"a.md"}
+    (tmp_path / "a.md").rename(tmp_path / "b.md")
+    assert watcher.read(1.0) == {"a.md", "b.md"}
+    watcher.close()
+
+
+def test_directory_watch_ignores_own_writes(tmp_path):
+    """
+    A batch relinks the changed file and its dependents; the writes made
+    while doing so are not reported as changes afterwards.
+    """
+    (tmp_path / "a.md").write_text("# Alpha\ncontent")
+    (tmp_path / "b.md").write_text("# Beta\nsomething about Gamma")
+    autolink.initialize_tagging(str(tmp_path))
+    watch = DirectoryWatch(str(tmp_path), debounce=0.05, interval=0.01, polling=True)
+
+    _touch_later(tmp_path / "a.md", "# Alpha\n# Gamma\ncontent")
+    names = watch.collect(timeout=1.0)
+    assert names == ["a.md"]
+    watch.process(names)
+
+    assert "[Gamma][Gamma]" in (tmp_path / "b.md").read_text()
+    assert watch.collect(timeout=0.1) == []
+    assert TagIndex(str(tmp_path)).get_defined_tags("a.md") == {"Alpha", "Gamma"}
+
+    (tmp_path / "a.md").unlink()
+    names = watch.collect(timeout=1.0)
+    assert names == ["a.md"]
+    watch.process(names)
+    watch.close()
+
+    text_b = (tmp_path / "b.md").read_text()
+    assert "[Gamma][Gamma]" not in text_b
+    assert "Gamma" in text_b
+    assert "Alpha" not in TagIndex(str(tmp_path)).get_all_tags()
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watchers_nested_directories(tmp_path, polling):
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "ignored").mkdir()
+    (tmp_path / ".autolinkignore").write_text("ignored/\n")
+    if polling:
+        watcher = PollingWatcher(str(tmp_path), interval=0.01)
+    else:
+        try:
+            watcher = InotifyWatcher(str(tmp_path))
+        except (OSError, AttributeError, TypeError):
+            pytest.skip("inotify is not available")
+    (tmp_path / "notes" / "a.md").write_text("# Alpha")
+    (tmp_path / "ignored" / "b.md").write_text("# Beta")
+    assert watcher.read(1.0) == {"notes/a.md"}
+    (tmp_path / "notes" / "deep").mkdir()
+    (tmp_path / "notes" / "deep" / "c.md").write_text("# Gamma")
+    changed = set()
+    while more := watcher.read(0.2):
+        changed |= more
+    assert changed == {"notes/deep/c.md"}
+    watcher.close()